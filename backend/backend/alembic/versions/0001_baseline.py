@@ -0,0 +1,88 @@
+"""Baseline schema: users, leaderboard, live_players, rpg_leaderboard
+
+Databases created by ``Base.metadata.create_all`` before migrations existed
+already have these tables, so only missing ones are created.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+GAME_MODE = sa.Enum("PASS_THROUGH", "WALLS", name="gamemodeenum")
+GAME_STATUS = sa.Enum("IDLE", "PLAYING", "PAUSED", "GAME_OVER", name="gamestatusenum")
+
+
+def has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if not has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not has_table("leaderboard"):
+        op.create_table(
+            "leaderboard",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("score", sa.Integer(), nullable=False),
+            sa.Column("mode", GAME_MODE, nullable=False),
+            sa.Column("date", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_leaderboard_id", "leaderboard", ["id"])
+
+    if not has_table("live_players"):
+        op.create_table(
+            "live_players",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("score", sa.Integer(), nullable=True),
+            sa.Column("mode", GAME_MODE, nullable=False),
+            sa.Column("snake", sa.JSON(), nullable=False),
+            sa.Column("food", sa.JSON(), nullable=False),
+            sa.Column("direction", sa.String(), nullable=False),
+            sa.Column("status", GAME_STATUS, nullable=True),
+            sa.Column("last_updated", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_live_players_id", "live_players", ["id"])
+
+    if not has_table("rpg_leaderboard"):
+        op.create_table(
+            "rpg_leaderboard",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("level_id", sa.Integer(), nullable=False),
+            sa.Column("score", sa.Integer(), nullable=False),
+            sa.Column("time_seconds", sa.Float(), nullable=False),
+            sa.Column("completed_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_rpg_leaderboard_id", "rpg_leaderboard", ["id"])
+        op.create_index("ix_rpg_leaderboard_user_id", "rpg_leaderboard", ["user_id"])
+        op.create_index("ix_rpg_leaderboard_level_id", "rpg_leaderboard", ["level_id"])
+        op.create_index("ix_rpg_leaderboard_completed_at", "rpg_leaderboard", ["completed_at"])
+
+
+def downgrade() -> None:
+    for table in ("rpg_leaderboard", "live_players", "leaderboard", "users"):
+        op.drop_table(table)
+    GAME_STATUS.drop(op.get_bind(), checkfirst=True)
+    GAME_MODE.drop(op.get_bind(), checkfirst=True)
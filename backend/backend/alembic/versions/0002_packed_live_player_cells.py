@@ -0,0 +1,42 @@
+"""Packed snake/food cells on live_players
+
+Adds ``snake_cells`` and ``food_cell`` (see ``snake_codec``) and makes the
+JSON ``snake``/``food`` columns nullable, since new rows only fill the packed
+columns.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def columns(table: str) -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    existing = columns("live_players")
+    with op.batch_alter_table("live_players") as batch:
+        if "snake_cells" not in existing:
+            batch.add_column(sa.Column("snake_cells", sa.LargeBinary(), nullable=True))
+        if "food_cell" not in existing:
+            batch.add_column(sa.Column("food_cell", sa.Integer(), nullable=True))
+        batch.alter_column("snake", existing_type=sa.JSON(), nullable=True)
+        batch.alter_column("food", existing_type=sa.JSON(), nullable=True)
+
+
+def downgrade() -> None:
+    # Rows written since only have packed cells; they can't be kept
+    op.execute("DELETE FROM live_players WHERE snake IS NULL OR food IS NULL")
+    with op.batch_alter_table("live_players") as batch:
+        batch.alter_column("food", existing_type=sa.JSON(), nullable=False)
+        batch.alter_column("snake", existing_type=sa.JSON(), nullable=False)
+        batch.drop_column("food_cell")
+        batch.drop_column("snake_cells")
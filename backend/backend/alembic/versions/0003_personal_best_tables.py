@@ -0,0 +1,58 @@
+"""Personal-best tables for the leaderboard and RPG leaderboard
+
+The tables are filled from the score history by the application on startup
+(``crud.rebuild_personal_bests``) when they are empty.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+GAME_MODE = sa.Enum("PASS_THROUGH", "WALLS", name="gamemodeenum", create_type=False)
+
+
+def has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if not has_table("leaderboard_best"):
+        op.create_table(
+            "leaderboard_best",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("score", sa.Integer(), nullable=False),
+            sa.Column("mode", GAME_MODE, nullable=False),
+            sa.Column("entry_id", sa.Integer(), nullable=False),
+            sa.Column("date", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("user_id", "mode"),
+        )
+        op.create_index("ix_leaderboard_best_id", "leaderboard_best", ["id"])
+
+    if not has_table("rpg_leaderboard_best"):
+        op.create_table(
+            "rpg_leaderboard_best",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("level_id", sa.Integer(), nullable=False),
+            sa.Column("score", sa.Integer(), nullable=False),
+            sa.Column("time_seconds", sa.Float(), nullable=False),
+            sa.Column("entry_id", sa.Integer(), nullable=False),
+            sa.Column("completed_at", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("user_id", "level_id"),
+        )
+        op.create_index("ix_rpg_leaderboard_best_id", "rpg_leaderboard_best", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("rpg_leaderboard_best")
+    op.drop_table("leaderboard_best")
@@ -0,0 +1,45 @@
+"""Indexes matching the ranking queries
+
+- rpg_leaderboard (level_id, score DESC, time_seconds): per-level boards are
+  read in index order instead of sorting the whole level. It replaces the
+  single-column level_id index, which is its prefix.
+- leaderboard (mode, score DESC, id): boards per mode and keyset pages.
+- leaderboard (mode, date, score): day/week boards.
+- live_players (last_updated): finding stale games.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_rpg_leaderboard_level_score_time", "rpg_leaderboard", ["level_id", sa.text("score DESC"), "time_seconds"]),
+    ("ix_leaderboard_mode_score_id", "leaderboard", ["mode", sa.text("score DESC"), "id"]),
+    ("ix_leaderboard_mode_date_score", "leaderboard", ["mode", "date", "score"]),
+    ("ix_live_players_last_updated", "live_players", ["last_updated"]),
+]
+
+
+def indexes(table: str) -> set:
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        if name not in indexes(table):
+            op.create_index(name, table, columns)
+    if "ix_rpg_leaderboard_level_id" in indexes("rpg_leaderboard"):
+        op.drop_index("ix_rpg_leaderboard_level_id", table_name="rpg_leaderboard")
+
+
+def downgrade() -> None:
+    op.create_index("ix_rpg_leaderboard_level_id", "rpg_leaderboard", ["level_id"])
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,27 @@
+"""Single-use seeds for verified score submissions
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("replay_seeds"):
+        op.create_table(
+            "replay_seeds",
+            sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("seed", sa.BigInteger(), primary_key=True, autoincrement=False),
+            sa.Column("issued_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("replay_seeds")
@@ -0,0 +1,31 @@
+"""Flag live players simulated by the server
+
+Adds ``server`` to live_players, so server-driven games keep refusing client
+updates on every worker and are recognised when recovered on startup.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def columns(table: str) -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    if "server" not in columns("live_players"):
+        with op.batch_alter_table("live_players") as batch:
+            batch.add_column(sa.Column("server", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("live_players") as batch:
+        batch.drop_column("server")
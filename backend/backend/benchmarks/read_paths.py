@@ -0,0 +1,116 @@
+"""
+Benchmark: ORM instances against Core tuple rows on the leaderboard reads.
+
+    python benchmarks/read_paths.py --entries 20000 --limit 100
+
+Fills a scratch SQLite database, then compares loading pages (and the whole
+table, as the rank index does on startup) as ORM ``LeaderboardEntry``
+instances with ``crud.get_leaderboard``'s column select into
+``LeaderboardRow`` tuples. Reports wall time per call and, from tracemalloc,
+the bytes allocated and still held per loaded row.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, desc, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import crud  # noqa: E402
+import db_models  # noqa: E402
+from database import Base  # noqa: E402
+from models import GameMode  # noqa: E402
+
+
+def orm_page(db, limit):
+    entry = db_models.LeaderboardEntry
+    return (
+        db.query(entry).filter(entry.mode == GameMode.WALLS.value)
+        .order_by(desc(entry.score), entry.id).limit(limit).all()
+    )
+
+
+def core_page(db, limit):
+    return crud.get_leaderboard(db, GameMode.WALLS, limit)
+
+
+def orm_all(db, limit):
+    return list(db.query(db_models.LeaderboardEntry).yield_per(1000))
+
+
+def core_all(db, limit):
+    return crud._fetch_rows(db, crud.LeaderboardRow, crud._select_row(crud.LeaderboardRow, db_models.LeaderboardEntry))
+
+
+def measure(Session, read, limit, repeat):
+    with Session() as db:
+        read(db, limit)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        with Session() as db:
+            read(db, limit)
+    seconds = (time.perf_counter() - started) / repeat
+
+    with Session() as db:
+        tracemalloc.start()
+        rows = read(db, limit)
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        count = len(rows)
+    return seconds, count, held / count, peak / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        now = datetime.now()
+        with engine.begin() as connection:
+            connection.execute(insert(db_models.LeaderboardEntry), [
+                {
+                    "user_id": n % 1000,
+                    "username": f"player{n % 1000}",
+                    "score": rng.randrange(100000),
+                    "mode": rng.choice(["WALLS", "PASS_THROUGH"]),
+                    "date": now - timedelta(minutes=n),
+                }
+                for n in range(args.entries)
+            ])
+        Session = sessionmaker(bind=engine)
+
+        cases = [
+            (f"page of {args.limit}", orm_page, core_page, args.repeat),
+            (f"all {args.entries} rows", orm_all, core_all, max(args.repeat // 10, 1)),
+        ]
+        for title, orm_read, core_read, repeat in cases:
+            print(title)
+            results = {}
+            for name, read in (("ORM", orm_read), ("Core tuples", core_read)):
+                seconds, count, held, peak = measure(Session, read, args.limit, repeat)
+                results[name] = (seconds, peak)
+                print(
+                    f"{name:>12}: {seconds * 1000:8.2f} ms/call "
+                    f"{peak:8.0f} B/row allocated {held:8.0f} B/row held"
+                )
+            (orm_seconds, orm_peak), (core_seconds, core_peak) = results.values()
+            print(f"{'saving':>12}: {orm_seconds / core_seconds:8.1f}x time {orm_peak / core_peak:8.1f}x memory")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: the fast JSON path against FastAPI's response_model encoding.
+
+    python benchmarks/serialization.py --players 1000 --entries 100
+
+For a live player list and a leaderboard page, compares the CPU time per
+response of building Pydantic models, validating them against the response
+model and running ``jsonable_encoder`` plus ``json.dumps`` (what FastAPI does
+for a handler returning models) with encoding the plain dicts straight to
+bytes through ``fast_json`` (orjson when installed) and the stdlib fallback.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import fast_json  # noqa: E402
+from live_state import LivePlayerState  # noqa: E402
+from models import GRID_SIZE, LeaderboardEntry, LivePlayer  # noqa: E402
+
+
+def make_players(count: int, rng: random.Random) -> List[LivePlayerState]:
+    players = []
+    for n in range(count):
+        length = rng.randint(3, 60)
+        snake = [(rng.randrange(GRID_SIZE), rng.randrange(GRID_SIZE)) for _ in range(length)]
+        players.append(LivePlayerState(
+            str(n), f"player{n}", length * 10, "walls", snake,
+            (rng.randrange(GRID_SIZE), rng.randrange(GRID_SIZE)), "UP", "playing"
+        ))
+    return players
+
+
+def make_entries(count: int, rng: random.Random) -> List[dict]:
+    today = date.today().isoformat()
+    return [
+        {"id": str(n), "username": f"player{n}", "score": rng.randrange(10000), "mode": "walls", "date": today}
+        for n in range(count)
+    ]
+
+
+def response_model_path(model, build):
+    adapter = TypeAdapter(List[model])
+
+    def encode():
+        # Handler builds models, FastAPI validates them and encodes the result
+        models = [model(**item) for item in build()]
+        validated = adapter.validate_python(models, from_attributes=True)
+        return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+    return encode
+
+
+def stdlib_path(build):
+    return lambda: json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(build):
+    return lambda: fast_json.dumps(build())
+
+
+def time_per_call(encode, repeat: int) -> float:
+    encode()
+    started = time.process_time()
+    for _ in range(repeat):
+        encode()
+    return (time.process_time() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--entries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    players = make_players(args.players, rng)
+    entries = make_entries(args.entries, rng)
+    cases = [
+        (f"GET /live-players ({args.players} players)", LivePlayer, lambda: [p.to_dict() for p in players]),
+        (f"GET /leaderboard ({args.entries} entries)", LeaderboardEntry, lambda: entries),
+    ]
+    encoder = "orjson" if fast_json.orjson is not None else "json (orjson not installed)"
+    print(f"fast_json encoder: {encoder}")
+    for title, model, build in cases:
+        reference = response_model_path(model, build)
+        assert json.loads(reference()) == json.loads(fast_path(build)())
+        baseline = time_per_call(reference, args.repeat)
+        print(title)
+        for name, encode in (
+            ("response_model", reference), ("stdlib json", stdlib_path(build)), ("fast_json", fast_path(build))
+        ):
+            seconds = time_per_call(encode, args.repeat)
+            print(f"{name:>16}: {seconds * 1e6:10.0f} us CPU/response {baseline / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
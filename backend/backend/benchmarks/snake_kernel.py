@@ -0,0 +1,84 @@
+"""
+Benchmark: vectorized ``BatchSimulation`` against per-game ``SnakeGame`` steps.
+
+    python benchmarks/snake_kernel.py --games 10000 --ticks 200
+
+Both run the same pass-through games with the same random turns; the report
+is the mean time per tick and how many game steps that is per second.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_engine import SnakeGame  # noqa: E402
+from snake_kernel import BatchSimulation  # noqa: E402
+
+TURNS = ["UP", "DOWN", "LEFT", "RIGHT"]
+
+
+def make_games(count: int, seed: int):
+    return [
+        SnakeGame.new(str(n), user_id=n, username="bench", mode="pass-through", seed=seed + n)
+        for n in range(count)
+    ]
+
+
+def make_turns(count: int, ticks: int, seed: int, rate: float = 0.05):
+    rng = random.Random(seed)
+    return [
+        [(n, rng.choice(TURNS)) for n in rng.sample(range(count), int(count * rate))]
+        for _ in range(ticks)
+    ]
+
+
+def bench_reference(games, turns):
+    started = time.perf_counter()
+    for tick_turns in turns:
+        for n, direction in tick_turns:
+            games[n].turn(direction)
+        for game in games:
+            game.step()
+    return time.perf_counter() - started
+
+
+def bench_kernel(games, turns, seed: int):
+    sim = BatchSimulation(capacity=len(games), seed=seed)
+    slots = [
+        sim.add(game.state.mode, list(game.state.snake), game.state.direction, game.state.food)
+        for game in games
+    ]
+    started = time.perf_counter()
+    for tick_turns in turns:
+        for n, direction in tick_turns:
+            sim.turn(slots[n], direction)
+        sim.step()
+    return time.perf_counter() - started, sim.running
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    turns = make_turns(args.games, args.ticks, args.seed)
+    kernel_seconds, running = bench_kernel(make_games(args.games, args.seed), turns, args.seed)
+    reference_seconds = bench_reference(make_games(args.games, args.seed), turns)
+
+    print(f"{args.games} games x {args.ticks} ticks ({running} still running at the end)")
+    for name, seconds in (("SnakeGame", reference_seconds), ("BatchSimulation", kernel_seconds)):
+        per_tick = seconds / args.ticks
+        print(
+            f"{name:>16}: {per_tick * 1000:8.2f} ms/tick "
+            f"{args.games * args.ticks / seconds:14,.0f} game steps/s"
+        )
+    print(f"{'speedup':>16}: {reference_seconds / kernel_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
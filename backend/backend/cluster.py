@@ -0,0 +1,120 @@
+"""
+Broadcasts between the API's worker processes.
+
+State that each worker keeps in memory (live players, leaderboard caches and
+rank index, revoked tokens) is changed by whichever worker handled the
+request. ``cluster.broadcast`` tells the other workers about it over the
+pub/sub bus configured by ``PUBSUB_URL``, and the handlers registered with
+``cluster.on`` apply it there:
+
+- empty (the default): an in-process bus, for a single worker;
+- ``unix:///path/to.sock``: the local broker (``python pubsub.py URL``), for
+  several workers on one host;
+- ``redis://[:password@]host:port``: a Redis server, for workers on several
+  hosts behind a load balancer.
+
+Messages carry the id of the worker that sent them, and each worker ignores
+its own, so the changes it made are never applied twice.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import fast_json
+from pubsub import Bus, LocalBus, create_bus
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_URL = os.getenv("PUBSUB_URL", "")
+# Lets several deployments share one Redis server
+PUBSUB_PREFIX = os.getenv("PUBSUB_PREFIX", "snake-showdown:")
+
+Handler = Callable[[dict], None]
+
+
+class Cluster:
+    def __init__(self, prefix: str = PUBSUB_PREFIX):
+        self.prefix = prefix
+        self.worker_id = uuid.uuid4().hex
+        self.bus: Bus = LocalBus()
+        self._handlers: Dict[str, Handler] = {}
+        self._resync: List[Callable[[], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent = 0
+        self.received = 0
+
+    def on(self, channel: str, handler: Handler) -> None:
+        """Apply messages other workers broadcast on ``channel``."""
+        self._handlers[channel] = handler
+
+    def on_resync(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` after reconnecting, as broadcasts may have been missed."""
+        self._resync.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    async def start(self, url: str = PUBSUB_URL, bus: Optional[Bus] = None) -> None:
+        """Connect to the bus; must be called from the event loop."""
+        self.bus = bus or create_bus(url)
+        for channel, handler in self._handlers.items():
+            self.bus.subscribe(self.prefix + channel, self._receiver(handler))
+        self.bus.on_reconnect = self._resynced
+        self._loop = asyncio.get_running_loop()
+        await self.bus.start()
+
+    async def stop(self) -> None:
+        self._loop = None
+        await self.bus.close()
+
+    def broadcast(self, channel: str, payload: dict) -> None:
+        """Send ``payload`` to the other workers; safe to call from any thread.
+
+        A no-op until ``start``: with no bus there is nobody to tell.
+        """
+        loop = self._loop
+        if loop is None:
+            return
+        data = fast_json.dumps({"worker": self.worker_id, "payload": payload})
+        self.sent += 1
+        loop.call_soon_threadsafe(self.bus.publish, self.prefix + channel, data)
+
+    def call_soon(self, callback: Callable[[], None]) -> bool:
+        """Run ``callback`` on the bus' event loop; False if not started."""
+        loop = self._loop
+        if loop is None:
+            return False
+        loop.call_soon_threadsafe(callback)
+        return True
+
+    def _receiver(self, handler: Handler) -> Callable[[bytes], None]:
+        def receive(data: bytes) -> None:
+            message = fast_json.loads(data)
+            if message["worker"] == self.worker_id:
+                return
+            self.received += 1
+            handler(message["payload"])
+        return receive
+
+    def _resynced(self) -> None:
+        for callback in self._resync:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Resync after pub/sub reconnect failed")
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "bus": type(self.bus).__name__,
+            "connected": self.bus.connected,
+            "sent": self.sent,
+            "received": self.received,
+            "dropped": self.bus.dropped,
+        }
+
+
+cluster = Cluster()
@@ -1,18 +1,90 @@
 """
 CRUD operations for database.
 """
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
+from sqlalchemy import and_, desc, delete, exists, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type, Union
 import bcrypt
+import os
 from datetime import datetime
 
 import db_models
+from cluster import cluster
 from models import GameMode
+from leaderboard_cache import cache as leaderboard_cache
+from metrics import scores_submitted
+from rank_index import index as rank_index
+
+# bcrypt cost factor; each step doubles the hashing time
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Read-side rows
+#
+# Read paths select exactly these columns with Core and return plain tuples:
+# no identity map entries, instance state or lazy loaders for rows that are
+# serialized once and dropped. Field names match the ORM attributes, so code
+# reading them doesn't care which one it gets. The ORM stays on write paths.
+class LeaderboardRow(NamedTuple):
+    id: int
+    user_id: int
+    username: str
+    score: int
+    mode: db_models.GameModeEnum
+    date: datetime
+
+class LeaderboardBestRow(NamedTuple):
+    user_id: int
+    username: str
+    score: int
+    mode: db_models.GameModeEnum
+    entry_id: int
+    date: datetime
+
+class RPGLeaderboardRow(NamedTuple):
+    id: int
+    user_id: int
+    username: str
+    level_id: int
+    score: int
+    time_seconds: float
+    completed_at: datetime
+
+class RPGLeaderboardBestRow(NamedTuple):
+    user_id: int
+    username: str
+    level_id: int
+    score: int
+    time_seconds: float
+    entry_id: int
+    completed_at: datetime
+
+class LivePlayerRow(NamedTuple):
+    id: str
+    username: str
+    score: int
+    mode: db_models.GameModeEnum
+    snake: Optional[list]
+    food: Optional[dict]
+    snake_cells: Optional[bytes]
+    food_cell: Optional[int]
+    direction: str
+    status: db_models.GameStatusEnum
+    server: bool
+    last_updated: datetime
+
+def _select_row(row_type: Type[NamedTuple], model):
+    """Select the columns of ``model`` named by ``row_type``'s fields."""
+    return select(*(getattr(model, field) for field in row_type._fields))
+
+def _fetch_rows(db: Session, row_type: Type[NamedTuple], statement) -> list:
+    return list(map(row_type._make, db.execute(statement).tuples()))
 
 # Password hashing using bcrypt directly
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
@@ -25,7 +97,9 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[db_models.User]:
     return db.query(db_models.User).filter(db_models.User.id == user_id).first()
 
 def create_user(db: Session, username: str, email: str, password: str) -> db_models.User:
-    hashed_password = get_password_hash(password)
+    return create_user_with_hash(db, username, email, get_password_hash(password))
+
+def create_user_with_hash(db: Session, username: str, email: str, hashed_password: str) -> db_models.User:
     db_user = db_models.User(
         username=username,
         email=email,
@@ -36,12 +110,130 @@ def create_user(db: Session, username: str, email: str, password: str) -> db_mod
     db.refresh(db_user)
     return db_user
 
+def _upsert(db: Session, model, values: Union[dict, List[dict]], conflict: List[str], improves) -> None:
+    """INSERT ... ON CONFLICT DO UPDATE, only replacing rows ``improves`` beats.
+
+    ``values`` is one row or several with distinct conflict keys.
+    ``improves(excluded)`` builds the condition from the proposed row.
+    """
+    rows = [values] if isinstance(values, dict) else values
+    dialect = db.get_bind().dialect.name
+    insert_for_dialect = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    statement = insert_for_dialect(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=conflict,
+        set_={column: statement.excluded[column] for column in rows[0] if column not in conflict},
+        where=improves(statement.excluded)
+    )
+    db.execute(statement)
+
+def _record_leaderboard_bests(db: Session, entries: List[db_models.LeaderboardEntry]) -> None:
+    if not entries:
+        return
+    # One row per (user, mode): a statement may not upsert the same key twice
+    bests: Dict[Tuple[int, str], db_models.LeaderboardEntry] = {}
+    for entry in entries:
+        key = (entry.user_id, entry.mode)
+        if key not in bests or entry.score > bests[key].score:
+            bests[key] = entry
+    _upsert(
+        db,
+        db_models.LeaderboardBest,
+        [
+            {
+                "user_id": entry.user_id,
+                "mode": entry.mode,
+                "username": entry.username,
+                "score": entry.score,
+                "entry_id": entry.id,
+                "date": entry.date,
+            }
+            for entry in bests.values()
+        ],
+        ["user_id", "mode"],
+        lambda excluded: excluded.score > db_models.LeaderboardBest.score
+    )
+
+def _record_rpg_best(db: Session, entry: db_models.RPGLeaderboard) -> None:
+    best = db_models.RPGLeaderboardBest
+    _upsert(
+        db,
+        best,
+        {
+            "user_id": entry.user_id,
+            "level_id": entry.level_id,
+            "username": entry.username,
+            "score": entry.score,
+            "time_seconds": entry.time_seconds,
+            "entry_id": entry.id,
+            "completed_at": entry.completed_at,
+        },
+        ["user_id", "level_id"],
+        lambda excluded: or_(
+            excluded.score > best.score,
+            and_(excluded.score == best.score, excluded.time_seconds < best.time_seconds)
+        )
+    )
+
+def rebuild_personal_bests(db: Session) -> None:
+    """Backfill the personal-best tables from the full score history."""
+    db.execute(delete(db_models.LeaderboardBest))
+    db.execute(delete(db_models.RPGLeaderboardBest))
+    history = db.scalars(select(db_models.LeaderboardEntry).execution_options(yield_per=1000))
+    for entries in history.partitions():
+        _record_leaderboard_bests(db, entries)
+    for entry in db.query(db_models.RPGLeaderboard).yield_per(1000):
+        _record_rpg_best(db, entry)
+    db.commit()
+
+def personal_bests_missing(db: Session) -> bool:
+    """True if there is score history but the personal-best tables are empty."""
+    return bool(db.scalar(select(
+        or_(
+            and_(exists(select(db_models.LeaderboardEntry.id)),
+                 ~exists(select(db_models.LeaderboardBest.id))),
+            and_(exists(select(db_models.RPGLeaderboard.id)),
+                 ~exists(select(db_models.RPGLeaderboardBest.id)))
+        )
+    )))
+
 # Leaderboard operations
-def get_leaderboard(db: Session, mode: Optional[GameMode] = None, limit: int = 100) -> List[db_models.LeaderboardEntry]:
-    query = db.query(db_models.LeaderboardEntry)
+def get_leaderboard(
+    db: Session,
+    mode: Optional[GameMode] = None,
+    limit: int = 100,
+    after: Optional[Tuple[int, int]] = None,
+    since: Optional[datetime] = None
+) -> List[LeaderboardRow]:
+    """A page of scores, best first, ranked below the ``(score, id)`` cursor
+    ``after`` and optionally only those played ``since`` a given time."""
+    entry = db_models.LeaderboardEntry
+    query = _select_row(LeaderboardRow, entry)
     if mode:
-        query = query.filter(db_models.LeaderboardEntry.mode == mode.value)
-    return query.order_by(desc(db_models.LeaderboardEntry.score)).limit(limit).all()
+        query = query.where(entry.mode == mode.value)
+    if since:
+        query = query.where(entry.date >= since)
+    if after:
+        score, entry_id = after
+        query = query.where(or_(entry.score < score, and_(entry.score == score, entry.id > entry_id)))
+    return _fetch_rows(db, LeaderboardRow, query.order_by(desc(entry.score), entry.id).limit(limit))
+
+def get_leaderboard_bests(
+    db: Session,
+    mode: Optional[GameMode] = None,
+    limit: int = 100,
+    after: Optional[Tuple[int, int]] = None
+) -> List[LeaderboardBestRow]:
+    """Top personal bests: at most one row per user (per mode), paged by a
+    ``(score, entry_id)`` cursor."""
+    best = db_models.LeaderboardBest
+    query = _select_row(LeaderboardBestRow, best)
+    if mode:
+        query = query.where(best.mode == mode.value)
+    if after:
+        score, entry_id = after
+        query = query.where(or_(best.score < score, and_(best.score == score, best.entry_id > entry_id)))
+    return _fetch_rows(db, LeaderboardBestRow, query.order_by(desc(best.score), best.entry_id).limit(limit))
 
 def create_leaderboard_entry(
     db: Session,
@@ -50,20 +242,53 @@ def create_leaderboard_entry(
     score: int,
     mode: GameMode
 ) -> db_models.LeaderboardEntry:
-    entry = db_models.LeaderboardEntry(
-        user_id=user_id,
-        username=username,
-        score=score,
-        mode=mode.value
-    )
-    db.add(entry)
+    return create_leaderboard_entries(
+        db, [{"user_id": user_id, "username": username, "score": score, "mode": mode}]
+    )[0]
+
+def create_leaderboard_entries(db: Session, submissions: List[dict]) -> List[db_models.LeaderboardEntry]:
+    """Insert several scores and their personal bests in one transaction.
+
+    Each submission is a dict of ``user_id``, ``username``, ``score`` and
+    ``mode``; entries are returned in the same order.
+    """
+    if not submissions:
+        return []
+    rows = [
+        {
+            "user_id": submission["user_id"],
+            "username": submission["username"],
+            "score": submission["score"],
+            "mode": GameMode(submission["mode"]).value,
+            "date": datetime.utcnow(),
+        }
+        for submission in submissions
+    ]
+    entries = list(db.scalars(
+        insert(db_models.LeaderboardEntry).returning(db_models.LeaderboardEntry, sort_by_parameter_order=True),
+        rows
+    ))
+    _record_leaderboard_bests(db, entries)
     db.commit()
-    db.refresh(entry)
-    return entry
+    _index_leaderboard_entries(entries)
+    cluster.broadcast("leaderboard", {"entries": [
+        [entry.id, entry.user_id, entry.username, entry.score, row["mode"], entry.date.isoformat()]
+        for entry, row in zip(entries, rows)
+    ]})
+    for row in rows:
+        scores_submitted.inc(row["mode"])
+    return entries
+
+def _index_leaderboard_entries(entries: list) -> None:
+    """Drop the cached boards new entries change and add them to the rank index."""
+    for mode in {entry.mode for entry in entries}:
+        leaderboard_cache.invalidate(mode.value if hasattr(mode, "value") else mode)
+    for entry in entries:
+        rank_index.add_leaderboard_entry(entry)
 
 # Live players operations
-def get_live_players(db: Session) -> List[db_models.LivePlayer]:
-    return db.query(db_models.LivePlayer).all()
+def get_live_players(db: Session) -> List[LivePlayerRow]:
+    return _fetch_rows(db, LivePlayerRow, _select_row(LivePlayerRow, db_models.LivePlayer))
 
 def get_live_player(db: Session, player_id: str) -> Optional[db_models.LivePlayer]:
     return db.query(db_models.LivePlayer).filter(db_models.LivePlayer.id == player_id).first()
@@ -123,6 +348,69 @@ def delete_live_player(db: Session, player_id: str) -> bool:
         return True
     return False
 
+def save_live_players(db: Session, rows: List[dict], deleted_ids: List[str]) -> None:
+    """Write a batch of live player states in a single transaction.
+
+    Existing rows are updated by primary key and new ones inserted with one
+    executemany each, so the cost is a handful of statements per batch rather
+    than per player.
+    """
+    if rows:
+        ids = [row["id"] for row in rows]
+        existing = set(db.scalars(select(db_models.LivePlayer.id).where(db_models.LivePlayer.id.in_(ids))))
+        updates = [row for row in rows if row["id"] in existing]
+        inserts = [row for row in rows if row["id"] not in existing]
+        if updates:
+            db.execute(update(db_models.LivePlayer), updates)
+        if inserts:
+            db.execute(insert(db_models.LivePlayer), inserts)
+    if deleted_ids:
+        db.execute(delete(db_models.LivePlayer).where(db_models.LivePlayer.id.in_(deleted_ids)))
+    db.commit()
+
+def delete_stale_live_players(db: Session, cutoff: datetime) -> int:
+    """Delete live player rows not updated since ``cutoff`` in one statement.
+
+    Served by the index on ``last_updated``.
+    """
+    result = db.execute(
+        delete(db_models.LivePlayer).where(db_models.LivePlayer.last_updated < cutoff)
+    )
+    db.commit()
+    return result.rowcount
+
+# Verified game seeds
+def issue_replay_seed(db: Session, user_id: int, seed: int, expired_before: datetime) -> None:
+    """Record a seed issued to a user, dropping the user's expired ones."""
+    seed_model = db_models.ReplaySeed
+    db.execute(
+        delete(seed_model)
+        .where(seed_model.user_id == user_id, seed_model.issued_at < expired_before)
+    )
+    db.add(seed_model(user_id=user_id, seed=seed, issued_at=datetime.utcnow()))
+    db.commit()
+
+def _unexpired_seed(user_id: int, seed: int, issued_after: datetime):
+    seed_model = db_models.ReplaySeed
+    return and_(
+        seed_model.user_id == user_id,
+        seed_model.seed == seed,
+        seed_model.issued_at >= issued_after
+    )
+
+def replay_seed_issued(db: Session, user_id: int, seed: int, issued_after: datetime) -> bool:
+    return db.scalar(select(exists().where(_unexpired_seed(user_id, seed, issued_after))))
+
+def claim_replay_seed(db: Session, user_id: int, seed: int, issued_after: datetime) -> bool:
+    """Use up an issued seed; False if it was never issued, expired or already used.
+
+    The delete is the claim, so of two concurrent submissions of the same
+    game only one succeeds.
+    """
+    result = db.execute(delete(db_models.ReplaySeed).where(_unexpired_seed(user_id, seed, issued_after)))
+    db.commit()
+    return result.rowcount == 1
+
 # RPG Leaderboard operations
 def create_rpg_leaderboard_entry(
     db: Session,
@@ -140,23 +428,108 @@ def create_rpg_leaderboard_entry(
         time_seconds=time_seconds
     )
     db.add(entry)
+    db.flush()
+    _record_rpg_best(db, entry)
     db.commit()
     db.refresh(entry)
+    rank_index.add_rpg_entry(entry)
+    cluster.broadcast("rpg-leaderboard", {"entry": [
+        entry.id, entry.user_id, entry.username, entry.level_id,
+        entry.score, entry.time_seconds, entry.completed_at.isoformat()
+    ]})
     return entry
 
 def get_rpg_leaderboard(
     db: Session,
     level_id: int,
     limit: int = 10
-) -> List[db_models.RPGLeaderboard]:
+) -> List[RPGLeaderboardRow]:
     """Get top scores for a specific level, ordered by score DESC, then time ASC"""
-    return (
-        db.query(db_models.RPGLeaderboard)
-        .filter(db_models.RPGLeaderboard.level_id == level_id)
-        .order_by(
-            desc(db_models.RPGLeaderboard.score),
-            db_models.RPGLeaderboard.time_seconds.asc()
-        )
+    entry = db_models.RPGLeaderboard
+    return _fetch_rows(
+        db,
+        RPGLeaderboardRow,
+        _select_row(RPGLeaderboardRow, entry)
+        .where(entry.level_id == level_id)
+        .order_by(desc(entry.score), entry.time_seconds.asc())
+        .limit(limit)
+    )
+
+def get_rpg_leaderboard_bests(
+    db: Session,
+    level_id: int,
+    limit: int = 10
+) -> List[RPGLeaderboardBestRow]:
+    """Top personal bests for a level, one row per user"""
+    best = db_models.RPGLeaderboardBest
+    return _fetch_rows(
+        db,
+        RPGLeaderboardBestRow,
+        _select_row(RPGLeaderboardBestRow, best)
+        .where(best.level_id == level_id)
+        .order_by(desc(best.score), best.time_seconds.asc())
         .limit(limit)
-        .all()
     )
+
+# Entries other workers wrote
+#
+# Each worker caches boards and keeps its own rank index, so entries written
+# elsewhere are applied here as if inserted locally. If broadcasts may have
+# been missed, both are rebuilt from the tables on the next read.
+def _leaderboard_entries_added(payload: dict) -> None:
+    _index_leaderboard_entries([
+        LeaderboardRow(
+            entry_id, user_id, username, score,
+            db_models.GameModeEnum(mode), datetime.fromisoformat(date)
+        )
+        for entry_id, user_id, username, score, mode, date in payload["entries"]
+    ])
+
+def _rpg_leaderboard_entry_added(payload: dict) -> None:
+    entry_id, user_id, username, level_id, score, time_seconds, completed_at = payload["entry"]
+    rank_index.add_rpg_entry(RPGLeaderboardRow(
+        entry_id, user_id, username, level_id, score, time_seconds, datetime.fromisoformat(completed_at)
+    ))
+
+def _resync_leaderboards() -> None:
+    leaderboard_cache.clear()
+    rank_index.reset()
+
+cluster.on("leaderboard", _leaderboard_entries_added)
+cluster.on("rpg-leaderboard", _rpg_leaderboard_entry_added)
+cluster.on_resync(_resync_leaderboards)
+
+# Async variants
+#
+# Each one runs the sync operation above through AsyncSession.run_sync, so the
+# ORM code is shared while the database I/O is awaited on the event loop
+# (asyncpg / aiosqlite) instead of blocking a threadpool worker.
+def _async_variant(operation):
+    async def run(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(operation, *args, **kwargs)
+    run.__name__ = f"async_{operation.__name__}"
+    run.__qualname__ = run.__name__
+    run.__doc__ = operation.__doc__
+    return run
+
+async_get_user_by_email = _async_variant(get_user_by_email)
+async_get_user_by_id = _async_variant(get_user_by_id)
+async_create_user_with_hash = _async_variant(create_user_with_hash)
+async_rebuild_personal_bests = _async_variant(rebuild_personal_bests)
+async_personal_bests_missing = _async_variant(personal_bests_missing)
+async_get_leaderboard = _async_variant(get_leaderboard)
+async_get_leaderboard_bests = _async_variant(get_leaderboard_bests)
+async_create_leaderboard_entry = _async_variant(create_leaderboard_entry)
+async_create_leaderboard_entries = _async_variant(create_leaderboard_entries)
+async_get_live_players = _async_variant(get_live_players)
+async_get_live_player = _async_variant(get_live_player)
+async_create_live_player = _async_variant(create_live_player)
+async_update_live_player = _async_variant(update_live_player)
+async_delete_live_player = _async_variant(delete_live_player)
+async_save_live_players = _async_variant(save_live_players)
+async_issue_replay_seed = _async_variant(issue_replay_seed)
+async_replay_seed_issued = _async_variant(replay_seed_issued)
+async_claim_replay_seed = _async_variant(claim_replay_seed)
+async_create_rpg_leaderboard_entry = _async_variant(create_rpg_leaderboard_entry)
+async_get_rpg_leaderboard = _async_variant(get_rpg_leaderboard)
+async_get_rpg_leaderboard_bests = _async_variant(get_rpg_leaderboard_bests)
@@ -1,7 +1,7 @@
 """
 SQLAlchemy database models.
 """
-from sqlalchemy import Column, String, Integer, Float, DateTime, Enum as SQLEnum, JSON
+from sqlalchemy import BigInteger, Boolean, Column, String, Integer, Float, DateTime, Enum as SQLEnum, Index, JSON, LargeBinary, UniqueConstraint
 from datetime import datetime
 from database import Base
 import enum
@@ -35,6 +35,29 @@ class LeaderboardEntry(Base):
     mode = Column(SQLEnum(GameModeEnum), nullable=False)
     date = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pages: ORDER BY score DESC, id after a (score, id) cursor
+        Index("ix_leaderboard_mode_score_id", "mode", score.desc(), "id"),
+        # Time-windowed boards
+        Index("ix_leaderboard_mode_date_score", "mode", "date", "score"),
+    )
+
+class LeaderboardBest(Base):
+    """Best score per user per mode, upserted on every submission."""
+    __tablename__ = "leaderboard_best"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    username = Column(String, nullable=False)
+    score = Column(Integer, nullable=False)
+    mode = Column(SQLEnum(GameModeEnum), nullable=False)
+    entry_id = Column(Integer, nullable=False)  # leaderboard row of the best game
+    date = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'mode'),
+    )
+
 class LivePlayer(Base):
     __tablename__ = "live_players"
 
@@ -42,11 +65,14 @@ class LivePlayer(Base):
     username = Column(String, nullable=False)
     score = Column(Integer, default=0)
     mode = Column(SQLEnum(GameModeEnum), nullable=False)
-    snake = Column(JSON, nullable=False)  # Array of positions
-    food = Column(JSON, nullable=False)   # Single position
+    snake = Column(JSON, nullable=True)   # Array of positions (legacy rows)
+    food = Column(JSON, nullable=True)    # Single position (legacy rows)
+    snake_cells = Column(LargeBinary, nullable=True)  # Packed cell indexes, see snake_codec
+    food_cell = Column(Integer, nullable=True)        # Packed cell index
     direction = Column(String, nullable=False)
     status = Column(SQLEnum(GameStatusEnum), default=GameStatusEnum.PLAYING)
-    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    server = Column(Boolean, nullable=False, default=False)  # Simulated by game_engine
+    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
 class RPGLeaderboard(Base):
     __tablename__ = "rpg_leaderboard"
@@ -54,13 +80,37 @@ class RPGLeaderboard(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False, index=True)
     username = Column(String, nullable=False)
-    level_id = Column(Integer, nullable=False, index=True)  # 1-20
+    level_id = Column(Integer, nullable=False)  # 1-20
     score = Column(Integer, nullable=False)  # Total score achieved
     time_seconds = Column(Float, nullable=False)  # Time to complete
     completed_at = Column(DateTime, default=datetime.utcnow, index=True)
-    
-    # Composite index for fast queries per level
+
+    __table_args__ = (
+        # Top scores per level in board order, without a sort
+        Index("ix_rpg_leaderboard_level_score_time", "level_id", score.desc(), "time_seconds"),
+    )
+
+class RPGLeaderboardBest(Base):
+    """Best result per user per RPG level, upserted on every submission."""
+    __tablename__ = "rpg_leaderboard_best"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    username = Column(String, nullable=False)
+    level_id = Column(Integer, nullable=False)
+    score = Column(Integer, nullable=False)
+    time_seconds = Column(Float, nullable=False)
+    entry_id = Column(Integer, nullable=False)  # rpg_leaderboard row of the best run
+    completed_at = Column(DateTime, nullable=False)
+
     __table_args__ = (
-        # Index for getting top scores per level
-        {'mysql_index': [('level_id', 'score', 'time_seconds')]},
+        UniqueConstraint('user_id', 'level_id'),
     )
+
+class ReplaySeed(Base):
+    """A seed issued for one verified game, deleted when the game is submitted."""
+    __tablename__ = "replay_seeds"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    seed = Column(BigInteger, primary_key=True, autoincrement=False)
+    issued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
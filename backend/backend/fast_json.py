@@ -0,0 +1,37 @@
+"""
+JSON encoding for the hot read endpoints.
+
+Responses that are already plain dicts and lists (leaderboard pages, live
+players, RPG boards) are encoded straight to bytes here instead of being
+validated against ``response_model`` and walked by ``jsonable_encoder``
+first. ``orjson`` is used when installed (``pip install backend[fast]``);
+otherwise the standard library produces the same compact UTF-8 output.
+"""
+import json
+from typing import Any
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+MEDIA_TYPE = "application/json"
+
+
+if orjson is not None:
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    loads = orjson.loads
+else:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+
+
+def json_response(value: Any, status_code: int = 200, headers: dict = None) -> Response:
+    """A JSON response that skips response_model validation and re-encoding."""
+    return Response(dumps(value), status_code=status_code, media_type=MEDIA_TYPE, headers=headers)
@@ -0,0 +1,340 @@
+"""
+Server-authoritative snake simulation.
+
+Games started through ``POST /games`` are simulated here rather than in the
+browser: clients only send direction changes, and a fixed-tick scheduler
+advances every running game in one batch per tick. Each game's state lives in
+the live player store, so spectators, the REST endpoints and the write-behind
+flush see server-driven games exactly like client-reported ones.
+
+The rules follow ``frontend/src/lib/gameLogic.ts``: walls end the game in
+``walls`` mode and wrap around in ``pass-through`` mode, hitting any body
+segment ends it, and each food is worth 10 points. Unlike the frontend's list
+scans, each game keeps a ``Board`` of occupied cells next to its snake, so
+collision checks and food placement are O(1) however long the snake gets.
+
+A game runs on the worker that started it. Turns and stops another worker
+accepts for it are broadcast and applied here by ``apply_command``.
+
+Server games are flagged (``LivePlayerState.server``, stored with the row and
+replicated to every worker), so clients can't ``PUT`` or ``PATCH`` them, even
+once they have finished and until they are removed or reaped. Games running
+when the API restarts are recovered finished: no worker simulates them.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+from cluster import cluster
+from live_hub import LivePlayerHub, hub
+from live_state import Cell, LivePlayerState, LivePlayerStore, store
+from models import GRID_SIZE
+
+# Seconds per tick; 0.1 matches the frontend's "normal" difficulty
+GAME_TICK_INTERVAL = float(os.getenv("GAME_TICK_INTERVAL", "0.1"))
+# Games with no turn from their player for this many seconds are ended (an
+# abandoned pass-through game would otherwise wrap around forever), then
+# reaped like any other idle live player
+GAME_IDLE_TIMEOUT = float(os.getenv("GAME_IDLE_TIMEOUT", "30"))
+# Server games one user may run at a time on a worker
+MAX_GAMES_PER_USER = int(os.getenv("MAX_GAMES_PER_USER", "3"))
+
+INITIAL_SNAKE_LENGTH = 3
+FOOD_POINTS = 10
+# Direction changes buffered between ticks, so a quick "up, left" isn't lost
+MAX_QUEUED_TURNS = 2
+
+STEPS = {"UP": (0, -1), "DOWN": (0, 1), "LEFT": (-1, 0), "RIGHT": (1, 0)}
+OPPOSITES = {"UP": "DOWN", "DOWN": "UP", "LEFT": "RIGHT", "RIGHT": "LEFT"}
+
+
+class Board:
+    """Occupied cells of a grid plus an index of the free ones.
+
+    ``_occupied`` answers "is this cell taken" in O(1). ``_free`` lists every
+    free cell and ``_position`` maps a cell to its index in that list (-1 when
+    occupied), so occupying or releasing a cell is a swap with the last entry
+    and picking a uniformly random free cell is a single index.
+    """
+
+    __slots__ = ("_occupied", "_free", "_position")
+
+    def __init__(self, cells: Iterable[Cell] = ()):
+        self._occupied = bytearray(GRID_SIZE * GRID_SIZE)
+        self._free = list(range(GRID_SIZE * GRID_SIZE))
+        self._position = list(range(GRID_SIZE * GRID_SIZE))
+        for cell in cells:
+            self.occupy(cell)
+
+    def __contains__(self, cell: Cell) -> bool:
+        return self._occupied[cell[1] * GRID_SIZE + cell[0]] == 1
+
+    def __len__(self) -> int:
+        return GRID_SIZE * GRID_SIZE - len(self._free)
+
+    @property
+    def free_cells(self) -> int:
+        return len(self._free)
+
+    def occupy(self, cell: Cell) -> None:
+        index = cell[1] * GRID_SIZE + cell[0]
+        if self._occupied[index]:
+            return
+        self._occupied[index] = 1
+        position = self._position[index]
+        last = self._free.pop()
+        if last != index:
+            self._free[position] = last
+            self._position[last] = position
+        self._position[index] = -1
+
+    def release(self, cell: Cell) -> None:
+        index = cell[1] * GRID_SIZE + cell[0]
+        if not self._occupied[index]:
+            return
+        self._occupied[index] = 0
+        self._position[index] = len(self._free)
+        self._free.append(index)
+
+    def random_free(self, rng: random.Random) -> Optional[Cell]:
+        """A uniformly random free cell, or None if the board is full."""
+        if not self._free:
+            return None
+        index = self._free[rng.randrange(len(self._free))]
+        return (index % GRID_SIZE, index // GRID_SIZE)
+
+
+class SnakeGame:
+    """One simulated game, advancing the ``LivePlayerState`` it owns."""
+
+    __slots__ = ("state", "user_id", "rng", "board", "last_input", "_turns")
+
+    def __init__(self, state: LivePlayerState, user_id: int, rng: random.Random):
+        self.state = state
+        self.user_id = user_id
+        self.rng = rng
+        # Mirrors state.snake; step() keeps both in sync
+        self.board = Board(state.snake)
+        # Monotonic time of the player's last command; unlike
+        # state.last_updated, ticks don't move it
+        self.last_input = time.monotonic()
+        self._turns: Deque[str] = deque()
+
+    @classmethod
+    def new(
+        cls,
+        game_id: str,
+        user_id: int,
+        username: str,
+        mode: str,
+        seed: Optional[int] = None
+    ) -> "SnakeGame":
+        center = GRID_SIZE // 2
+        snake = [(center - i, center) for i in range(INITIAL_SNAKE_LENGTH)]
+        rng = random.Random(seed)
+        state = LivePlayerState(
+            id=game_id,
+            username=username,
+            score=0,
+            mode=mode,
+            snake=snake,
+            food=(0, 0),
+            direction="RIGHT",
+            status="playing"
+        )
+        state.server = True
+        game = cls(state, user_id, rng)
+        state.food = game.place_food()
+        return game
+
+    def turn(self, direction: str) -> bool:
+        """Queue a direction change for the coming ticks.
+
+        Reversals onto the snake's own neck and turns beyond the buffer are
+        ignored (though they still count as the player being there);
+        returns whether the turn was accepted.
+        """
+        self.last_input = time.monotonic()
+        current = self._turns[-1] if self._turns else self.state.direction
+        if direction == current or direction == OPPOSITES[current]:
+            return False
+        if len(self._turns) >= MAX_QUEUED_TURNS:
+            return False
+        self._turns.append(direction)
+        return True
+
+    def place_food(self) -> Cell:
+        """A random cell not covered by the snake."""
+        cell = self.board.random_free(self.rng)
+        return cell if cell is not None else self.state.snake[0]
+
+    def step(self) -> bool:
+        """Advance one tick; returns False if the game is not running."""
+        state = self.state
+        if state.status != "playing":
+            return False
+        if self._turns:
+            state.direction = self._turns.popleft()
+
+        snake = state.snake
+        dx, dy = STEPS[state.direction]
+        x, y = snake[0][0] + dx, snake[0][1] + dy
+        if state.mode == "pass-through":
+            x, y = x % GRID_SIZE, y % GRID_SIZE
+        elif not (0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE):
+            state.status = "game-over"
+            return True
+
+        head = (x, y)
+        # Like the client, the tail still counts even though it is about to move
+        if head in self.board:
+            state.status = "game-over"
+            return True
+
+        snake.appendleft(head)
+        self.board.occupy(head)
+        if head == state.food:
+            state.score += FOOD_POINTS
+            if not self.board.free_cells:
+                state.status = "game-over"  # Board full
+            else:
+                state.food = self.place_food()
+        else:
+            self.board.release(snake.pop())
+        return True
+
+
+class GameEngine:
+    """Running server-side games and the tick loop that advances them."""
+
+    def __init__(self, store: LivePlayerStore, hub: LivePlayerHub):
+        self._store = store
+        self._hub = hub
+        self._games: Dict[str, SnakeGame] = {}
+        self.ticks = 0
+        self.ticks_skipped = 0
+        self.idle_ended = 0
+
+    def start(
+        self, user_id: int, username: str, mode: str, seed: Optional[int] = None
+    ) -> SnakeGame:
+        """Create a game and add its state to the live player store."""
+        game = SnakeGame.new(uuid.uuid4().hex, user_id, username, mode, seed)
+        self._store.create(game.state)
+        self._games[game.state.id] = game
+        self._hub.publish(game.state.to_dict())
+        return game
+
+    def get(self, game_id: str) -> Optional[SnakeGame]:
+        return self._games.get(game_id)
+
+    def owns(self, player_id: str) -> bool:
+        """True if the live player is (or, once finished, was) driven by the
+        server, on this worker or another."""
+        player = self._store.get(player_id)
+        return player is not None and player.server
+
+    def end_orphaned(self) -> List[str]:
+        """Finish recovered server games that no tick loop is advancing.
+
+        Called on startup, after the store is loaded from the table.
+        """
+        orphaned = [
+            player for player in self._store.all()
+            if player.server and player.status == "playing" and player.id not in self._games
+        ]
+        with self._store.batch() as touch:
+            for player in orphaned:
+                player.status = "game-over"
+                touch(player)
+        return [player.id for player in orphaned]
+
+    def stop(self, game_id: str) -> bool:
+        """End a game and remove it from the live player store."""
+        if self._games.pop(game_id, None) is None:
+            return False
+        if self._store.delete(game_id):
+            self._hub.remove(game_id)
+        return True
+
+    def apply_command(self, command: dict) -> None:
+        """Turn (or, with no direction, stop) a game another worker was asked to."""
+        game = self._games.get(command["game_id"])
+        if game is None or game.user_id != command["user_id"]:
+            return
+        if command["direction"] is None:
+            self.stop(command["game_id"])
+        else:
+            game.turn(command["direction"])
+
+    def reset(self) -> None:
+        self._games.clear()
+
+    @property
+    def active_games(self) -> int:
+        return len(self._games)
+
+    def games_of(self, user_id: int) -> int:
+        """Games this worker is running for ``user_id``."""
+        return sum(1 for game in self._games.values() if game.user_id == user_id)
+
+    def tick(self) -> List[LivePlayerState]:
+        """Advance every running game by one step and publish the changes.
+
+        Games idle for ``GAME_IDLE_TIMEOUT`` are ended instead of advanced.
+        """
+        changed = []
+        finished = []
+        idle_since = time.monotonic() - GAME_IDLE_TIMEOUT
+        with self._store.batch() as touch:
+            for game_id, game in self._games.items():
+                if game.last_input < idle_since and game.state.status == "playing":
+                    game.state.status = "game-over"
+                    self.idle_ended += 1
+                    if touch(game.state):
+                        changed.append(game.state)
+                    finished.append(game_id)
+                elif not game.step():
+                    finished.append(game_id)
+                elif not touch(game.state):
+                    finished.append(game_id)  # Removed through the REST API
+                else:
+                    changed.append(game.state)
+                    if game.state.status != "playing":
+                        finished.append(game_id)
+            # Serialize under the lock: the flush thread may be reading too
+            updates = [state.to_dict() for state in changed]
+        for game_id in finished:
+            self._games.pop(game_id, None)
+        for update in updates:
+            self._hub.publish(update)
+        self.ticks += 1
+        return changed
+
+    async def run(self, interval: float = GAME_TICK_INTERVAL) -> None:
+        """Tick on a fixed schedule until cancelled.
+
+        Ticks are scheduled against the loop clock rather than by sleeping a
+        fixed interval, so slow ticks don't make the game drift; if the loop
+        falls a whole tick behind, the missed ticks are skipped rather than
+        run back to back.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + interval
+        while True:
+            await asyncio.sleep(max(deadline - loop.time(), 0))
+            self.tick()
+            deadline += interval
+            behind = loop.time() - deadline
+            if behind > 0:
+                missed = int(behind // interval) + 1
+                self.ticks_skipped += missed
+                deadline += missed * interval
+
+
+engine = GameEngine(store, hub)
+cluster.on("games", engine.apply_command)
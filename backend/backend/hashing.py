@@ -0,0 +1,96 @@
+"""
+Bounded executor for bcrypt password hashing and verification.
+
+bcrypt is deliberately slow (tens to hundreds of milliseconds per call). Running
+it on the shared request threadpool lets a login burst starve every other
+endpoint, so hashing gets its own small pool instead. bcrypt releases the GIL
+while it works, so threads give real parallelism without the start-up and
+pickling cost of a process pool.
+
+Once ``workers + max_queue`` calls are outstanding new ones fail fast with
+``HasherBusy``, which the API turns into a 503.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import crud
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "32"))
+
+
+class HasherBusy(Exception):
+    """Too many hashing calls are already queued."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(crud.get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(crud.verify_password, password, hashed_password)
+
+    async def _submit(self, operation, *args):
+        with self._lock:
+            if self._outstanding >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HasherBusy()
+            self._outstanding += 1
+        future = self._executor.submit(self._timed, time.perf_counter(), operation, *args)
+        # Released when the call finishes (or is dropped from the queue), not
+        # when the caller stops waiting: a cancelled request's hash still
+        # occupies a worker
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self._outstanding -= 1
+
+    def _timed(self, submitted: float, operation, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self.wait_seconds_total += started - submitted
+        try:
+            return operation(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self.hash_seconds_total += elapsed
+                self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._running,
+                "queue_depth": self._outstanding - self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.wait_seconds_total,
+                "hash_seconds_total": self.hash_seconds_total,
+                "hash_seconds_max": self.hash_seconds_max,
+            }
+
+
+password_hasher = PasswordHasher()
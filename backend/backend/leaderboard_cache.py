@@ -0,0 +1,80 @@
+"""
+Cache of serialized leaderboard responses.
+
+``GET /leaderboard`` is the most-read endpoint but only changes when a score is
+submitted. The encoded top-N response for each game mode (and for all modes
+combined), both over every game and over personal bests only, is kept here
+together with an ETag, and dropped by ``crud.create_leaderboard_entry``
+whenever a new entry could change it.
+"""
+import hashlib
+import threading
+from typing import Dict, Optional
+
+ALL_MODES = "all"
+
+
+def board_key(mode: Optional[str], best: bool = False) -> str:
+    key = mode or ALL_MODES
+    return f"best:{key}" if best else key
+
+
+class CachedBoard:
+    __slots__ = ("body", "etag", "next_cursor")
+
+    def __init__(self, body: bytes, next_cursor: Optional[str] = None):
+        self.body = body
+        self.next_cursor = next_cursor
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an ``If-None-Match`` header value covers this response."""
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(
+            tag.removeprefix("W/") == self.etag for tag in candidates
+        )
+
+
+class LeaderboardCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards: Dict[str, CachedBoard] = {}
+        # Bumped on every invalidation so a board built from a query that raced
+        # with a new submission is never stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedBoard]:
+        board = self._boards.get(key)
+        if board is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return board
+
+    def put(self, key: str, body: bytes, generation: int, next_cursor: Optional[str] = None) -> CachedBoard:
+        """Store a board built when ``generation`` was current."""
+        board = CachedBoard(body, next_cursor)
+        with self._lock:
+            if generation == self.generation:
+                self._boards[key] = board
+        return board
+
+    def invalidate(self, mode: str) -> None:
+        """Drop the boards a new entry in ``mode`` can affect."""
+        with self._lock:
+            self.generation += 1
+            for affected in (mode, ALL_MODES):
+                for best in (False, True):
+                    self._boards.pop(board_key(affected, best), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._boards.clear()
+
+
+cache = LeaderboardCache()
@@ -0,0 +1,165 @@
+"""
+In-process fan-out of live player state to WebSocket spectators.
+
+Publishing a change only records it in each subscriber's pending map (keyed
+by player id, so repeated updates to the same player coalesce) and wakes the
+subscriber's event loop. Spectators therefore never touch the database: one
+snapshot of the live player store on connect, then only the players that
+changed.
+
+Spectators of a single game use a ``GameChannel`` instead. A channel keeps
+only the latest encoded frame of its player and a version number, so
+publishing is O(1) whatever the number of watchers, and memory per game is
+one frame. Each watcher remembers the last version it sent; a watcher that
+is slower than the game simply skips to the newest frame.
+
+Changes made by this worker are also passed to ``relay`` (see
+``live_sync``), which forwards them to the other workers; changes they make
+arrive through ``deliver`` and reach only this worker's spectators.
+"""
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import fast_json
+
+
+class Subscriber:
+    """A single spectator connection waiting for changes."""
+
+    __slots__ = ("_loop", "_event", "_pending")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+        # player id -> latest state, or None if the player was removed
+        self._pending: Dict[str, Optional[dict]] = {}
+
+    def _notify(self) -> None:
+        # Handlers may run in the threadpool, so wake the loop thread-safely
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def next_batch(self, lock: threading.Lock) -> Tuple[List[dict], List[str]]:
+        """Wait for changes and return (updated players, removed player ids)."""
+        while True:
+            await self._event.wait()
+            with lock:
+                self._event.clear()
+                pending, self._pending = self._pending, {}
+            if pending:
+                break
+        updated = [state for state in pending.values() if state is not None]
+        removed = [player_id for player_id, state in pending.items() if state is None]
+        return updated, removed
+
+
+class GameChannel:
+    """Latest frame of one live player, shared by everyone watching it."""
+
+    __slots__ = ("_loop", "_changed", "frame", "version", "watchers")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._changed = asyncio.Event()
+        # Encoded player state, or None once the player was removed
+        self.frame: Optional[str] = None
+        self.version = 0
+        self.watchers = 0
+
+    def _wake(self) -> None:
+        # Wakes everyone waiting now; later waiters get a fresh event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _publish(self, frame: Optional[str]) -> None:
+        self.frame = frame
+        self.version += 1
+        self._loop.call_soon_threadsafe(self._wake)
+
+    async def next_frame(self, seen: int) -> Tuple[int, Optional[str]]:
+        """Wait for a frame newer than version ``seen``.
+
+        Returns (version, frame); frames published in between are skipped.
+        """
+        while self.version == seen:
+            await self._changed.wait()
+        return self.version, self.frame
+
+
+class LivePlayerHub:
+    """Spectators subscribed to live player changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscriber] = set()
+        self._channels: Dict[str, GameChannel] = {}
+        # Called with the id of every player changed on this worker
+        self.relay: Optional[Callable[[str], None]] = None
+
+    def publish(self, player: dict) -> None:
+        """Record a created or updated player and notify subscribers."""
+        self.deliver(player["id"], player)
+        if self.relay is not None:
+            self.relay(player["id"])
+
+    def remove(self, player_id: str) -> None:
+        """Record a removed player and notify subscribers."""
+        self.deliver(player_id, None)
+        if self.relay is not None:
+            self.relay(player_id)
+
+    def deliver(self, player_id: str, player: Optional[dict]) -> None:
+        """Notify this worker's subscribers of a change, without relaying it."""
+        self._dispatch(player_id, player)
+        channel = self._channels.get(player_id)
+        if channel is not None:
+            # Encoded once here rather than once per watcher
+            channel._publish(fast_json.dumps(player).decode() if player is not None else None)
+
+    def _dispatch(self, player_id: str, state: Optional[dict]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber._pending[player_id] = state
+        for subscriber in subscribers:
+            subscriber._notify()
+
+    def subscribe(self) -> Subscriber:
+        """Register a subscriber; must be called from the event loop."""
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def watch(self, player_id: str) -> GameChannel:
+        """Join the channel of one player; must be called from the event loop."""
+        with self._lock:
+            channel = self._channels.get(player_id)
+            if channel is None:
+                channel = self._channels[player_id] = GameChannel(asyncio.get_running_loop())
+            channel.watchers += 1
+            return channel
+
+    def unwatch(self, player_id: str, channel: GameChannel) -> None:
+        with self._lock:
+            channel.watchers -= 1
+            if channel.watchers == 0 and self._channels.get(player_id) is channel:
+                del self._channels[player_id]
+
+    async def next_batch(self, subscriber: Subscriber) -> Tuple[List[dict], List[str]]:
+        return await subscriber.next_batch(self._lock)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def watcher_count(self) -> int:
+        return sum(channel.watchers for channel in list(self._channels.values()))
+
+
+hub = LivePlayerHub()
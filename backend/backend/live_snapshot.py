@@ -0,0 +1,70 @@
+"""
+Shared, pre-encoded snapshots of ``GET /live-players``.
+
+Spectators poll the live player list far more often than it is worth
+re-serializing. Each variant of the list (fields, mode filter, sort order,
+JSON or packed binary) is encoded once into a ``CachedBoard`` with its ETag
+and reused by every poll until the live player store has changed *and* at
+least ``LIVE_SNAPSHOT_INTERVAL`` seconds have passed since it was built, so
+encoding costs O(ticks) rather than O(requests). The gzip variant is
+compressed on first use and shared the same way.
+"""
+import gzip
+import os
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+from leaderboard_cache import CachedBoard
+
+# Seconds a snapshot is served after the store changed; matches the game tick
+LIVE_SNAPSHOT_INTERVAL = float(os.getenv("LIVE_SNAPSHOT_INTERVAL", "0.1"))
+
+# Cheap compression: snapshots are rebuilt every tick under load
+GZIP_LEVEL = 5
+
+
+class Snapshot:
+    __slots__ = ("board", "version", "built_at", "_gzipped")
+
+    def __init__(self, body: bytes, version: int = 0, built_at: float = 0.0):
+        self.board = CachedBoard(body)
+        self.version = version
+        self.built_at = built_at
+        self._gzipped: Optional[CachedBoard] = None
+
+    @property
+    def gzipped(self) -> CachedBoard:
+        if self._gzipped is None:
+            # mtime=0 keeps the bytes, and so the ETag, identical across builds
+            self._gzipped = CachedBoard(gzip.compress(self.board.body, GZIP_LEVEL, mtime=0))
+        return self._gzipped
+
+
+class SnapshotCache:
+    def __init__(self, interval: float = LIVE_SNAPSHOT_INTERVAL, clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self._clock = clock
+        self._snapshots: Dict[Hashable, Snapshot] = {}
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, key: Hashable, version: int, build: Callable[[], bytes]) -> Snapshot:
+        """The snapshot for ``key``, rebuilt with ``build`` if it is out of date.
+
+        ``version`` is the store version the caller sees; an older snapshot is
+        still served until it is ``interval`` seconds old.
+        """
+        now = self._clock()
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and (snapshot.version == version or now - snapshot.built_at < self.interval):
+            self.hits += 1
+            return snapshot
+        snapshot = self._snapshots[key] = Snapshot(build(), version, now)
+        self.builds += 1
+        return snapshot
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+
+
+snapshots = SnapshotCache()
@@ -0,0 +1,430 @@
+"""
+Authoritative in-memory state for live players.
+
+All live player reads and writes are served from process memory. Changed and
+removed players are tracked as dirty and written to the ``live_players`` table
+in batches by ``flush``, which the application calls on a fixed interval. The
+table is only a durability record used to recover state on startup.
+
+With several workers, each keeps a replica of the players the others change
+(``replicate`` and ``forget``, fed by ``live_sync``). Only the worker that
+made a change writes it to the table.
+"""
+import threading
+from bisect import bisect_right
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import crud
+import snake_codec
+from models import GRID_SIZE
+
+Cell = Tuple[int, int]
+
+# Every cell of the board; also keeps snakes within snake_codec's u16 length
+MAX_SNAKE_LENGTH = GRID_SIZE * GRID_SIZE
+
+
+class StaleDelta(Exception):
+    """A delta arrived out of order; the client must resync."""
+
+    def __init__(self, expected: int):
+        super().__init__(f"Expected delta {expected}")
+        self.expected = expected
+
+
+class LivePlayerState:
+    """Current state of one live game."""
+
+    __slots__ = (
+        "id", "username", "score", "mode", "snake", "food",
+        "direction", "status", "last_updated", "seq", "replica", "server",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        username: str,
+        score: int,
+        mode: str,
+        snake: Iterable[Cell],
+        food: Cell,
+        direction: str,
+        status: str,
+        last_updated: Optional[datetime] = None
+    ):
+        self.id = id
+        self.username = username
+        self.score = score
+        self.mode = mode
+        # Head first, so a move is appendleft() plus pop()
+        self.snake: Deque[Cell] = deque(snake)
+        self.food = food
+        self.direction = direction
+        self.status = status
+        self.last_updated = last_updated or datetime.utcnow()
+        # Sequence number of the last applied delta
+        self.seq = 0
+        # Last changed by another worker
+        self.replica = False
+        # Simulated by game_engine, so clients may not change it
+        self.server = False
+
+    @classmethod
+    def from_row(cls, player: crud.LivePlayerRow) -> "LivePlayerState":
+        if player.snake_cells is not None:
+            snake = snake_codec.unpack_cells(player.snake_cells)
+            food = snake_codec.unpack_cell(player.food_cell)
+        else:
+            snake = [(cell["x"], cell["y"]) for cell in player.snake]
+            food = (player.food["x"], player.food["y"])
+        state = cls(
+            id=player.id,
+            username=player.username,
+            score=player.score,
+            mode=player.mode.value,
+            snake=snake,
+            food=food,
+            direction=player.direction,
+            status=player.status.value,
+            last_updated=player.last_updated
+        )
+        state.server = bool(player.server)
+        return state
+
+    @classmethod
+    def from_dict(cls, player: dict) -> "LivePlayerState":
+        """Parse the ``LivePlayer`` wire format produced by ``to_dict``."""
+        return cls(
+            id=player["id"],
+            username=player["username"],
+            score=player["score"],
+            mode=player["mode"],
+            snake=[(cell["x"], cell["y"]) for cell in player["snake"]],
+            food=(player["food"]["x"], player["food"]["y"]),
+            direction=player["direction"],
+            status=player["status"]
+        )
+
+    def to_dict(self) -> dict:
+        """Serialize to the ``LivePlayer`` wire format."""
+        return {
+            "id": self.id,
+            "username": self.username,
+            "score": self.score,
+            "mode": self.mode,
+            "snake": [{"x": x, "y": y} for x, y in self.snake],
+            "food": {"x": self.food[0], "y": self.food[1]},
+            "direction": self.direction,
+            "status": self.status,
+        }
+
+    def to_summary(self) -> dict:
+        """Serialize to the ``LivePlayerSummary`` wire format, without cells."""
+        return {
+            "id": self.id,
+            "username": self.username,
+            "score": self.score,
+            "mode": self.mode,
+            "status": self.status,
+        }
+
+    def to_row(self) -> dict:
+        """Column values for the ``live_players`` table, with packed cells."""
+        return {
+            "id": self.id,
+            "username": self.username,
+            "score": self.score,
+            "mode": self.mode,
+            "snake": None,
+            "food": None,
+            "snake_cells": snake_codec.pack_cells(self.snake),
+            "food_cell": snake_codec.pack_cell(self.food),
+            "direction": self.direction,
+            "status": self.status,
+            "server": self.server,
+            "last_updated": self.last_updated,
+        }
+
+
+class LivePlayerStore:
+    """Thread-safe map of live players with write-behind bookkeeping."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._players: Dict[str, LivePlayerState] = {}
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self.reaped = 0
+        self.stale_rows_deleted = 0
+        # Bumped on every change, so readers can tell whether anything moved
+        self.version = 0
+
+    def load(self, players: List[crud.LivePlayerRow]) -> None:
+        """Replace the in-memory state with rows recovered from the database."""
+        with self._lock:
+            self._players = {player.id: LivePlayerState.from_row(player) for player in players}
+            self._dirty = set()
+            self._deleted = set()
+            self.version += 1
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def all(self) -> List[LivePlayerState]:
+        with self._lock:
+            return list(self._players.values())
+
+    def page(
+        self,
+        mode: Optional[str] = None,
+        by_score: bool = False,
+        after: Optional[tuple] = None,
+        limit: Optional[int] = None
+    ) -> List[LivePlayerState]:
+        """Players ordered by id, or by score (highest first, then id).
+
+        ``after`` is the sort key of the last player of the previous page:
+        ``(id,)``, or ``(score, id)`` when ordering by score.
+        """
+        with self._lock:
+            players = [
+                player for player in self._players.values()
+                if mode is None or player.mode == mode
+            ]
+        if by_score:
+            key = lambda player: (-player.score, player.id)
+            start = (-after[0], after[1]) if after else None
+        else:
+            key = lambda player: (player.id,)
+            start = after
+        players.sort(key=key)
+        if start is not None:
+            players = players[bisect_right(players, start, key=key):]
+        return players if limit is None else players[:limit]
+
+    def get(self, player_id: str) -> Optional[LivePlayerState]:
+        return self._players.get(player_id)
+
+    def create(self, state: LivePlayerState) -> bool:
+        """Add a new player; returns False if the id is already taken."""
+        with self._lock:
+            if state.id in self._players:
+                return False
+            self._players[state.id] = state
+            self._dirty.add(state.id)
+            self._deleted.discard(state.id)
+            self.version += 1
+            return True
+
+    def update(
+        self,
+        player_id: str,
+        score: int,
+        snake: List[Cell],
+        food: Cell,
+        direction: str,
+        status: str,
+        seq: int = 0
+    ) -> Optional[LivePlayerState]:
+        """Replace a player's state with a full one.
+
+        ``seq`` is the last delta the state includes, so deltas continue
+        from ``seq + 1``: a client told its delta was stale resyncs this way.
+        """
+        with self._lock:
+            player = self._players.get(player_id)
+            if player is None:
+                return None
+            player.seq = seq
+            player.score = score
+            player.snake = deque(snake)
+            player.food = food
+            player.direction = direction
+            player.status = status
+            player.last_updated = datetime.utcnow()
+            player.replica = False
+            self._dirty.add(player_id)
+            self.version += 1
+            return player
+
+    def apply_delta(
+        self,
+        player_id: str,
+        seq: int,
+        heads: List[Cell],
+        dropped: int,
+        food: Cell,
+        score: Optional[int] = None,
+        direction: Optional[str] = None,
+        status: Optional[str] = None
+    ) -> Optional[LivePlayerState]:
+        """Apply an incremental update to the stored snake body.
+
+        Deltas must arrive in sequence (``seq`` one above the last applied),
+        otherwise ``StaleDelta`` is raised and the state is left untouched.
+        Raises ``ValueError`` if the delta would leave an empty snake or one
+        longer than the board has cells.
+        """
+        with self._lock:
+            player = self._players.get(player_id)
+            if player is None:
+                return None
+            if seq != player.seq + 1:
+                raise StaleDelta(player.seq + 1)
+            if dropped < 0 or dropped >= len(player.snake) + len(heads):
+                raise ValueError("Delta would leave an empty snake")
+            if len(player.snake) + len(heads) - dropped > MAX_SNAKE_LENGTH:
+                raise ValueError("Delta would grow the snake beyond the board")
+            snake = player.snake
+            snake.extendleft(heads)
+            for _ in range(dropped):
+                snake.pop()
+            player.seq = seq
+            player.food = food
+            if score is not None:
+                player.score = score
+            if direction is not None:
+                player.direction = direction
+            if status is not None:
+                player.status = status
+            player.last_updated = datetime.utcnow()
+            player.replica = False
+            self._dirty.add(player_id)
+            self.version += 1
+            return player
+
+    @contextmanager
+    def batch(self) -> Iterator[Callable[[LivePlayerState], bool]]:
+        """Hold the lock across many in-place changes to stored players.
+
+        Yields ``touch(player)``, which marks a changed player for the next
+        flush and returns False if the player is no longer in the store.
+        """
+        now = datetime.utcnow()
+
+        def touch(player: LivePlayerState) -> bool:
+            if self._players.get(player.id) is not player:
+                return False
+            player.last_updated = now
+            self._dirty.add(player.id)
+            self.version += 1
+            return True
+
+        with self._lock:
+            yield touch
+
+    def delete(self, player_id: str) -> bool:
+        with self._lock:
+            if self._players.pop(player_id, None) is None:
+                return False
+            self._dirty.discard(player_id)
+            self._deleted.add(player_id)
+            self.version += 1
+            return True
+
+    def replicate(self, state: LivePlayerState, seq: int) -> None:
+        """Store a player as changed by another worker.
+
+        The change is not written by this worker's flush (even if it changed
+        the player itself since the last one); the worker that made it
+        writes it.
+        """
+        state.seq = seq
+        state.replica = True
+        with self._lock:
+            self._players[state.id] = state
+            self._dirty.discard(state.id)
+            self._deleted.discard(state.id)
+            self.version += 1
+
+    def forget(self, player_id: str) -> bool:
+        """Drop a player another worker removed, without deleting its row."""
+        with self._lock:
+            if self._players.pop(player_id, None) is None:
+                return False
+            self._dirty.discard(player_id)
+            self.version += 1
+            return True
+
+    def owned(self) -> List[str]:
+        """Ids of the players last changed by this worker."""
+        with self._lock:
+            return [player_id for player_id, player in self._players.items() if not player.replica]
+
+    def export(self, player_ids: Iterable[str]) -> List[Tuple[str, Optional[dict], int, bool]]:
+        """(id, wire state or None if removed, delta sequence, server-driven)
+        of each player."""
+        with self._lock:
+            exported = []
+            for player_id in player_ids:
+                player = self._players.get(player_id)
+                if player is None:
+                    exported.append((player_id, None, 0, False))
+                else:
+                    exported.append((player_id, player.to_dict(), player.seq, player.server))
+            return exported
+
+    def reap(self, cutoff: datetime) -> List[str]:
+        """Remove players not updated since ``cutoff``; returns their ids.
+
+        Reaped players are deleted from the table by the next flush, like
+        players removed through ``delete``.
+        """
+        with self._lock:
+            stale = [player_id for player_id, player in self._players.items() if player.last_updated < cutoff]
+            for player_id in stale:
+                del self._players[player_id]
+                self._dirty.discard(player_id)
+                self._deleted.add(player_id)
+            if stale:
+                self.version += 1
+            self.reaped += len(stale)
+        return stale
+
+    def delete_stale_rows(self, db: Session, cutoff: datetime) -> int:
+        """Delete table rows not updated since ``cutoff``.
+
+        Catches rows the store doesn't hold, such as games left behind by a
+        crashed worker. Rows of players still in the store are written again
+        by their next flush.
+        """
+        deleted = crud.delete_stale_live_players(db, cutoff)
+        self.stale_rows_deleted += deleted
+        return deleted
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._dirty) + len(self._deleted)
+
+    def flush(self, db: Session) -> int:
+        """Write dirty and deleted players in one transaction.
+
+        Returns the number of rows written. On failure the changes are marked
+        dirty again so the next flush retries them.
+        """
+        with self._lock:
+            rows = [self._players[player_id].to_row() for player_id in self._dirty]
+            deleted = list(self._deleted)
+            self._dirty, self._deleted = set(), set()
+        if not rows and not deleted:
+            return 0
+        try:
+            crud.save_live_players(db, rows, deleted)
+        except Exception:
+            with self._lock:
+                for row in rows:
+                    if row["id"] in self._players:
+                        self._dirty.add(row["id"])
+                for player_id in deleted:
+                    if player_id not in self._players:
+                        self._deleted.add(player_id)
+            raise
+        return len(rows) + len(deleted)
+
+
+store = LivePlayerStore()
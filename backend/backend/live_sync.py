@@ -0,0 +1,115 @@
+"""
+Live player changes replicated between workers.
+
+Every player created, updated or removed on this worker is relayed by the hub
+to ``LiveSync.changed``. Changes are coalesced per player and sent once per
+event loop iteration, so a game engine tick moving hundreds of snakes is one
+broadcast carrying each player's latest state (and delta sequence number,
+so ``PATCH`` deltas can continue on any worker, and whether the server
+simulates it, so no worker accepts client updates for it).
+
+Other workers store the players as replicas and deliver them to their own
+spectators, so any worker can take a player's updates and any other can
+serve ``GET /live-players``, the WebSocket and the per-game stream.
+
+Broadcasts sent while a worker is disconnected from the bus are lost, so
+after reconnecting it sends every player it owns as a complete listing and
+asks the other workers to do the same. A complete listing replaces the
+replicas of that worker's players: players it no longer lists were removed.
+"""
+import threading
+from typing import Dict, Set
+
+from cluster import Cluster, cluster
+from live_hub import LivePlayerHub, hub
+from live_state import LivePlayerState, LivePlayerStore, store
+
+CHANNEL = "live-players"
+
+
+class LiveSync:
+    def __init__(self, store: LivePlayerStore, hub: LivePlayerHub, cluster: Cluster):
+        self._store = store
+        self._hub = hub
+        self._cluster = cluster
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._scheduled = False
+        # Worker each replica was last received from
+        self._owners: Dict[str, str] = {}
+        self.applied = 0
+        self.resyncs = 0
+        hub.relay = self.changed
+        cluster.on(CHANNEL, self.apply)
+        cluster.on_resync(self.resync)
+
+    def changed(self, player_id: str) -> None:
+        """Queue a player changed on this worker; safe to call from any thread."""
+        if not self._cluster.running:
+            return
+        with self._lock:
+            self._pending.add(player_id)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        if not self._cluster.call_soon(self._send):
+            with self._lock:
+                self._scheduled = False
+
+    def _send(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._scheduled = False
+        if pending:
+            self._broadcast(self._store.export(pending))
+
+    def _broadcast(self, players: list, **flags) -> None:
+        self._cluster.broadcast(CHANNEL, {"players": players, "owner": self._cluster.worker_id, **flags})
+
+    def resync(self) -> None:
+        """Announce this worker's players and ask the others for theirs."""
+        self.resyncs += 1
+        self._broadcast(self._store.export(self._store.owned()), complete=True, resync=True)
+
+    def apply(self, payload: dict) -> None:
+        """Apply changes another worker broadcast."""
+        owner = payload.get("owner")
+        listed = set()
+        for player_id, player, seq, server in payload["players"]:
+            if player is None:
+                self._store.forget(player_id)
+                self._owners.pop(player_id, None)
+            else:
+                state = LivePlayerState.from_dict(player)
+                state.server = server
+                self._store.replicate(state, seq)
+                self._owners[player_id] = owner
+                listed.add(player_id)
+            self._hub.deliver(player_id, player)
+            self.applied += 1
+        if payload.get("complete"):
+            self._forget_unlisted(owner, listed)
+        elif len(self._owners) > 2 * len(self._store) + 64:
+            # Reaped and locally deleted players aren't removed as they go
+            self._owners = {
+                player_id: player_owner for player_id, player_owner in self._owners.items()
+                if self._store.get(player_id) is not None
+            }
+        if payload.get("resync"):
+            # The sender missed our broadcasts too
+            self._broadcast(self._store.export(self._store.owned()), complete=True)
+
+    def _forget_unlisted(self, owner: str, listed: Set[str]) -> None:
+        removed = [
+            player_id for player_id, player_owner in self._owners.items()
+            if player_owner == owner and player_id not in listed
+        ]
+        for player_id in removed:
+            del self._owners[player_id]
+            player = self._store.get(player_id)
+            # Changed here since, so no longer that worker's to remove
+            if player is not None and player.replica and self._store.forget(player_id):
+                self._hub.deliver(player_id, None)
+
+
+sync = LiveSync(store, hub, cluster)
@@ -1,29 +1,155 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import Body, FastAPI, Query, HTTPException, Depends, Request, Response, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import Annotated, List, Optional, Tuple, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import base64
+import json
+import logging
 import os
+import uuid
 
 from models import (
     User, AuthResponse, UserCreate, UserLogin, 
-    LeaderboardEntry, ScoreSubmit, LivePlayer, GameMode
+    LeaderboardEntry, LeaderboardWindow, ScoreSubmit, VerifiedScoreSubmit, LivePlayer, LivePlayerDelta, GameMode,
+    LivePlayerFields, LivePlayerSort, LivePlayerSummary,
+    GameStart, DirectionChange
 )
-from database import engine, Base, get_db
+from database import async_engine, engine, get_db, get_async_db
 import db_models
 import crud
+import snake_codec
+import fast_json
+from hashing import HasherBusy, password_hasher
+from token_cache import TokenUser, token_cache
+from score_ingest import batcher as score_batcher
+from replay import REPLAY_SEED_TTL, ReplayRejected, VerifierBusy, new_seed, verifier as replay_verifier
+from leaderboard_cache import CachedBoard, board_key, cache as leaderboard_cache
+from live_hub import hub
+from game_engine import MAX_GAMES_PER_USER, SnakeGame, engine as game_engine
+from rank_index import RankedEntry, index as rank_index
+from live_state import LivePlayerState, StaleDelta, store
+from live_snapshot import Snapshot, snapshots as live_snapshots
+from live_sync import sync as live_sync
+from cluster import cluster
+import metrics
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+# Tables are created and upgraded by migrations (python migrations.py)
 
 # JWT configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# Put username/email in the token so authenticated requests skip the user lookup
+JWT_EMBED_PROFILE = os.getenv("JWT_EMBED_PROFILE", "true").lower() == "true"
 
-app = FastAPI(title="Snake Showdown Live API")
+# Entries per GET /leaderboard page (also the largest page allowed)
+LEADERBOARD_PAGE_SIZE = int(os.getenv("LEADERBOARD_PAGE_SIZE", "100"))
+
+# Most scores accepted by one POST /leaderboard/batch
+SCORE_BATCH_LIMIT = int(os.getenv("SCORE_BATCH_LIMIT", "100"))
+
+# Largest page of GET /live-players a client may ask for
+LIVE_PLAYERS_PAGE_SIZE = int(os.getenv("LIVE_PLAYERS_PAGE_SIZE", "500"))
+
+# Seconds between keep-alive comments on idle spectator streams
+LIVE_STREAM_HEARTBEAT = float(os.getenv("LIVE_STREAM_HEARTBEAT", "15"))
+
+# Seconds between write-behind flushes of live player state
+LIVE_PLAYERS_FLUSH_INTERVAL = float(os.getenv("LIVE_PLAYERS_FLUSH_INTERVAL", "1.0"))
+
+# Live players not updated for this many seconds are treated as abandoned
+# (crashed tabs never send DELETE) and removed every reap interval
+LIVE_PLAYERS_TTL = float(os.getenv("LIVE_PLAYERS_TTL", "60"))
+LIVE_PLAYERS_REAP_INTERVAL = float(os.getenv("LIVE_PLAYERS_REAP_INTERVAL", "15"))
+
+@contextmanager
+def background_session():
+    """Open a DB session outside a request, honouring dependency overrides."""
+    provider = app.dependency_overrides.get(get_db, get_db)
+    sessions = provider()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+
+@asynccontextmanager
+async def background_async_session():
+    """Open an async DB session outside a request, honouring dependency overrides."""
+    provider = app.dependency_overrides.get(get_async_db, get_async_db)
+    sessions = provider()
+    try:
+        yield await sessions.__anext__()
+    finally:
+        await sessions.aclose()
+
+def flush_live_players() -> int:
+    with background_session() as db:
+        return store.flush(db)
+
+async def flush_live_players_periodically():
+    while True:
+        await asyncio.sleep(LIVE_PLAYERS_FLUSH_INTERVAL)
+        try:
+            await run_in_threadpool(flush_live_players)
+        except Exception:
+            logger.exception("Failed to flush live players")
+
+def delete_stale_live_players(cutoff: datetime) -> int:
+    with background_session() as db:
+        return store.delete_stale_rows(db, cutoff)
+
+async def reap_live_players() -> List[str]:
+    """Remove live players idle for longer than ``LIVE_PLAYERS_TTL``."""
+    cutoff = datetime.utcnow() - timedelta(seconds=LIVE_PLAYERS_TTL)
+    reaped = store.reap(cutoff)
+    for player_id in reaped:
+        hub.remove(player_id)
+    await run_in_threadpool(delete_stale_live_players, cutoff)
+    return reaped
+
+async def reap_live_players_periodically():
+    while True:
+        await asyncio.sleep(LIVE_PLAYERS_REAP_INTERVAL)
+        try:
+            await reap_live_players()
+        except Exception:
+            logger.exception("Failed to reap stale live players")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recover live games from the durability record, then serve them from memory
+    with background_session() as db:
+        store.load(crud.get_live_players(db))
+        game_engine.end_orphaned()
+        rank_index.load(db)
+        if crud.personal_bests_missing(db):
+            crud.rebuild_personal_bests(db)
+    # Then follow the changes other workers make (PUBSUB_URL)
+    await cluster.start()
+    # A (re)started worker has an empty deny-list; ask the running ones
+    token_cache.resync()
+    flusher = asyncio.create_task(flush_live_players_periodically())
+    reaper = asyncio.create_task(reap_live_players_periodically())
+    ticker = asyncio.create_task(game_engine.run())
+    score_batcher.start(background_async_session)
+    yield
+    await score_batcher.stop()
+    ticker.cancel()
+    reaper.cancel()
+    flusher.cancel()
+    replay_verifier.shutdown()
+    await cluster.stop()
+    await run_in_threadpool(flush_live_players)
+
+app = FastAPI(title="Snake Showdown Live API", lifespan=lifespan)
 
 # Setup CORS
 app.add_middleware(
@@ -32,39 +158,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 security = HTTPBearer()
 
+@app.exception_handler(HasherBusy)
+async def hasher_busy_handler(request: Request, exc: HasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is busy, try again shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(VerifierBusy)
+async def verifier_busy_handler(request: Request, exc: VerifierBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Replay verification is busy, try again shortly"},
+        headers={"Retry-After": "1"}
+    )
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> db_models.User:
+def access_token_claims(user: db_models.User) -> dict:
+    claims = {"sub": str(user.id)}
+    if JWT_EMBED_PROFILE:
+        claims.update({"username": user.username, "email": user.email})
+    return claims
+
+async def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Verified claims of the bearer token, cached until the token expires.
+
+    Async so the cache hit every authenticated request takes runs on the
+    event loop rather than a threadpool hop.
+    """
     token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = None
+        if payload is None or payload.get("sub") is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-    except JWTError:
+        if not token_cache.is_revoked(token, payload):
+            token_cache.put(token, payload)
+    if token_cache.is_revoked(token, payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
+            detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = crud.get_user_by_id(db, user_id=user_id)
+    return payload
+
+async def get_current_user(
+    claims: dict = Depends(get_token_claims),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The authenticated user: from the token claims when they carry the
+    profile, otherwise loaded from the database."""
+    if "username" in claims and "email" in claims:
+        return TokenUser(id=int(claims["sub"]), username=claims["username"], email=claims["email"])
+
+    user = await crud.async_get_user_by_id(db, user_id=int(claims["sub"]))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -73,188 +240,628 @@ def get_current_user(
     return user
 
 @app.post("/auth/login", response_model=AuthResponse)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, credentials.email)
-    if not user or not crud.verify_password(credentials.password, user.hashed_password):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await crud.async_get_user_by_email(db, credentials.email)
+    if not user or not await password_hasher.verify(credentials.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_access_token(data={"sub": str(user.id)})
+    token = create_access_token(data=access_token_claims(user))
     return AuthResponse(
         user=User(id=str(user.id), username=user.username, email=user.email),
         token=token
     )
 
 @app.post("/auth/signup", status_code=201, response_model=AuthResponse)
-def signup(user_data: UserCreate, db: Session = Depends(get_db)):
-    if crud.get_user_by_email(db, user_data.email):
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await crud.async_get_user_by_email(db, user_data.email):
         raise HTTPException(status_code=409, detail="User already exists")
     
-    user = crud.create_user(db, user_data.username, user_data.email, user_data.password)
-    token = create_access_token(data={"sub": str(user.id)})
+    hashed_password = await password_hasher.hash(user_data.password)
+    user = await crud.async_create_user_with_hash(
+        db, user_data.username, user_data.email, hashed_password
+    )
+    token = create_access_token(data=access_token_claims(user))
     return AuthResponse(
         user=User(id=str(user.id), username=user.username, email=user.email),
         token=token
     )
 
 @app.post("/auth/logout")
-def logout(current_user: db_models.User = Depends(get_current_user)):
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    claims: dict = Depends(get_token_claims)
+):
+    token_cache.revoke(credentials.credentials, claims)
     return {"message": "Successfully logged out"}
 
 @app.get("/auth/me", response_model=User)
-def get_me(current_user: db_models.User = Depends(get_current_user)):
+async def get_me(current_user: db_models.User = Depends(get_current_user)):
     return User(
         id=str(current_user.id),
         username=current_user.username,
         email=current_user.email
     )
 
+def leaderboard_entry_response(entry: db_models.LeaderboardEntry) -> LeaderboardEntry:
+    return LeaderboardEntry(
+        id=str(entry.id),
+        username=entry.username,
+        score=entry.score,
+        mode=GameMode(entry.mode),
+        date=entry.date.strftime("%Y-%m-%d")
+    )
+
+def ranked_leaderboard_entry(entry: RankedEntry) -> dict:
+    return {
+        "id": str(entry.id),
+        "username": entry.username,
+        "score": entry.score,
+        "mode": entry.mode,
+        "date": entry.completed_at.strftime("%Y-%m-%d")
+    }
+
+def ranked_rpg_entry(rank: int, entry: RankedEntry) -> dict:
+    return {
+        "rank": rank,
+        "username": entry.username,
+        "score": entry.score,
+        "time_seconds": entry.time_seconds,
+        "completed_at": entry.completed_at.isoformat()
+    }
+
+def encode_cursor(score: int, entry_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{score}:{entry_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        score, entry_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(score), int(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/leaderboard", response_model=List[LeaderboardEntry])
-def get_leaderboard(mode: Optional[GameMode] = None, db: Session = Depends(get_db)):
-    entries = crud.get_leaderboard(db, mode)
-    return [
-        LeaderboardEntry(
-            id=str(entry.id),
-            username=entry.username,
-            score=entry.score,
-            mode=GameMode(entry.mode),
-            date=entry.date.strftime("%Y-%m-%d")
-        )
-        for entry in entries
-    ]
+async def get_leaderboard(
+    request: Request,
+    mode: Optional[GameMode] = None,
+    best: bool = False,
+    window: LeaderboardWindow = LeaderboardWindow.ALL,
+    cursor: Optional[str] = None,
+    limit: int = Query(LEADERBOARD_PAGE_SIZE, ge=1, le=LEADERBOARD_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Top scores; with best=true at most one (personal best) entry per user.
+
+    Pages are chained through the ``X-Next-Cursor`` response header, passed
+    back as ``cursor``. ``window`` limits the board to today's or this week's
+    games (UTC).
+    """
+    if best and window != LeaderboardWindow.ALL:
+        raise HTTPException(status_code=400, detail="Personal bests are only kept for window=all")
+    after = decode_cursor(cursor) if cursor else None
+    # Only the default first page of all-time boards is cached
+    cacheable = after is None and window == LeaderboardWindow.ALL and limit == LEADERBOARD_PAGE_SIZE
+    key = board_key(mode.value if mode else None, best)
+    board = leaderboard_cache.get(key) if cacheable else None
+    if board is None:
+        generation = leaderboard_cache.generation
+        if best:
+            rows = await crud.async_get_leaderboard_bests(db, mode, limit, after)
+            entries = [
+                {
+                    "id": str(entry.entry_id),
+                    "username": entry.username,
+                    "score": entry.score,
+                    "mode": entry.mode.value,
+                    "date": entry.date.strftime("%Y-%m-%d")
+                }
+                for entry in rows
+            ]
+            last = (rows[-1].score, rows[-1].entry_id) if rows else None
+        else:
+            await db.run_sync(rank_index.ensure_loaded)
+            ranked = rank_index.leaderboard_page(
+                mode.value if mode else None, after, limit, window.value
+            )
+            entries = [ranked_leaderboard_entry(entry) for entry in ranked]
+            last = (ranked[-1].score, ranked[-1].id) if ranked else None
+        next_cursor = encode_cursor(*last) if last and len(entries) == limit else None
+        body = fast_json.dumps(entries)
+        if cacheable:
+            board = leaderboard_cache.put(key, body, generation, next_cursor)
+        else:
+            board = CachedBoard(body, next_cursor)
+    headers = {"ETag": board.etag, "Cache-Control": "no-cache"}
+    if board.next_cursor:
+        headers["X-Next-Cursor"] = board.next_cursor
+    if board.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(board.body, media_type="application/json", headers=headers)
+
+@app.get("/leaderboard/users/{user_id}")
+async def get_leaderboard_rank(
+    user_id: int,
+    mode: Optional[GameMode] = None,
+    radius: int = 5,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a user's rank and the entries around their best score"""
+    await db.run_sync(rank_index.ensure_loaded)
+    ranked = rank_index.leaderboard_around(mode.value if mode else None, user_id, max(radius, 0))
+    if ranked is None:
+        raise HTTPException(status_code=404, detail="User has no leaderboard entries")
+    rank, first_rank, entries = ranked
+    return {
+        "rank": rank,
+        "entries": [
+            {"rank": first_rank + offset, **ranked_leaderboard_entry(entry)}
+            for offset, entry in enumerate(entries)
+        ]
+    }
 
 @app.post("/leaderboard", status_code=201, response_model=LeaderboardEntry)
-def submit_score(
+async def submit_score(
     score_data: ScoreSubmit,
     current_user: db_models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    if score_batcher.running:
+        # Group-committed with other submissions arriving at the same time
+        entry = await score_batcher.submit(
+            current_user.id, current_user.username, score_data.score, score_data.mode.value
+        )
+    else:
+        entry = await crud.async_create_leaderboard_entry(
+            db,
+            user_id=current_user.id,
+            username=current_user.username,
+            score=score_data.score,
+            mode=score_data.mode
+        )
+    return leaderboard_entry_response(entry)
+
+@app.post("/leaderboard/batch", status_code=201, response_model=List[LeaderboardEntry])
+async def submit_scores(
+    scores: Annotated[List[ScoreSubmit], Body(min_length=1, max_length=SCORE_BATCH_LIMIT)],
+    current_user: db_models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Submit several finished games at once, e.g. after reconnecting"""
+    entries = await crud.async_create_leaderboard_entries(
+        db,
+        [
+            {
+                "user_id": current_user.id,
+                "username": current_user.username,
+                "score": score_data.score,
+                "mode": score_data.mode.value,
+            }
+            for score_data in scores
+        ]
+    )
+    return [leaderboard_entry_response(entry) for entry in entries]
+
+SEED_UNAVAILABLE = "Seed was not issued to you, has expired or was already used"
+
+@app.post("/leaderboard/verified/seeds", status_code=201)
+async def issue_replay_seed(
+    current_user: db_models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Issue the seed for a verified game; it can be submitted once"""
+    seed = new_seed()
+    expired_before = datetime.utcnow() - timedelta(seconds=REPLAY_SEED_TTL)
+    await crud.async_issue_replay_seed(db, current_user.id, seed, expired_before)
+    return {"seed": seed, "expires_in": REPLAY_SEED_TTL}
+
+@app.post("/leaderboard/verified", status_code=201, response_model=LeaderboardEntry)
+async def submit_verified_score(
+    replay_data: VerifiedScoreSubmit,
+    current_user: db_models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    entry = crud.create_leaderboard_entry(
+    """Submit a game as seed plus input log; the score is recomputed by replay"""
+    issued_after = datetime.utcnow() - timedelta(seconds=REPLAY_SEED_TTL)
+    # Checked before replaying too, so unissued seeds cost no CPU
+    if not await crud.async_replay_seed_issued(db, current_user.id, replay_data.seed, issued_after):
+        raise HTTPException(status_code=409, detail=SEED_UNAVAILABLE)
+    try:
+        result = await replay_verifier.verify(
+            replay_data.mode.value,
+            replay_data.seed,
+            replay_data.ticks,
+            [(tick, direction.value) for tick, direction in replay_data.inputs]
+        )
+    except ReplayRejected as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replay_data.score is not None and replay_data.score != result.score:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "Score does not match replay", "score": result.score}
+        )
+    if not await crud.async_claim_replay_seed(db, current_user.id, replay_data.seed, issued_after):
+        raise HTTPException(status_code=409, detail=SEED_UNAVAILABLE)
+    entry = await crud.async_create_leaderboard_entry(
         db,
         user_id=current_user.id,
         username=current_user.username,
-        score=score_data.score,
-        mode=score_data.mode
-    )
-    return LeaderboardEntry(
-        id=str(entry.id),
-        username=entry.username,
-        score=entry.score,
-        mode=GameMode(entry.mode),
-        date=entry.date.strftime("%Y-%m-%d")
+        score=result.score,
+        mode=replay_data.mode
     )
+    return leaderboard_entry_response(entry)
+
+def wants_binary(request: Request) -> bool:
+    return snake_codec.MEDIA_TYPE in request.headers.get("accept", "")
+
+def encode_live_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
 
-@app.get("/live-players", response_model=List[LivePlayer])
-def get_live_players(db: Session = Depends(get_db)):
-    players = crud.get_live_players(db)
-    return [
-        LivePlayer(
-            id=player.id,
-            username=player.username,
-            score=player.score,
-            mode=GameMode(player.mode),
-            snake=player.snake,
-            food=player.food,
-            direction=player.direction,
-            status=player.status
+def decode_live_cursor(cursor: str, by_score: bool) -> tuple:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if by_score:
+        valid = isinstance(key, list) and len(key) == 2 and isinstance(key[0], int) and isinstance(key[1], str)
+    else:
+        valid = isinstance(key, list) and len(key) == 1 and isinstance(key[0], str)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(key)
+
+def wants_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+def encode_live_players(players: List[LivePlayerState], fields: LivePlayerFields, binary: bool) -> bytes:
+    if binary:
+        return snake_codec.encode_players(players)
+    if fields == LivePlayerFields.SUMMARY:
+        body = [player.to_summary() for player in players]
+    else:
+        body = [player.to_dict() for player in players]
+    return fast_json.dumps(body)
+
+@app.get("/live-players", response_model=Union[List[LivePlayer], List[LivePlayerSummary]])
+async def get_live_players(
+    request: Request,
+    fields: LivePlayerFields = LivePlayerFields.FULL,
+    mode: Optional[GameMode] = None,
+    sort: LivePlayerSort = LivePlayerSort.ID,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=LIVE_PLAYERS_PAGE_SIZE)
+):
+    """Live players ordered by id or by score (highest first).
+
+    ``fields=summary`` leaves out the board (snake, food, direction), which
+    is all the lobby list needs. With ``limit``, pages are chained through
+    the ``X-Next-Cursor`` response header, passed back as ``cursor``.
+    Unpaged lists are served from shared snapshots rebuilt at most once per
+    ``LIVE_SNAPSHOT_INTERVAL``.
+    """
+    by_score = sort == LivePlayerSort.SCORE
+    after = decode_live_cursor(cursor, by_score) if cursor else None
+    mode_value = mode.value if mode else None
+    binary = fields == LivePlayerFields.FULL and wants_binary(request)
+    next_cursor = None
+    if after is None and limit is None:
+        snapshot = live_snapshots.get(
+            (fields, mode_value, by_score, binary),
+            store.version,
+            lambda: encode_live_players(store.page(mode_value, by_score), fields, binary)
         )
-        for player in players
-    ]
+    else:
+        players = store.page(mode_value, by_score, after, limit)
+        if limit is not None and len(players) == limit:
+            last = players[-1]
+            next_cursor = encode_live_cursor((last.score, last.id) if by_score else (last.id,))
+        snapshot = Snapshot(encode_live_players(players, fields, binary))
+    board = snapshot.gzipped if wants_gzip(request) else snapshot.board
+    headers = {"ETag": board.etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if board.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if board is not snapshot.board:
+        headers["Content-Encoding"] = "gzip"
+    media_type = snake_codec.MEDIA_TYPE if binary else "application/json"
+    return Response(board.body, media_type=media_type, headers=headers)
 
 @app.get("/live-players/{player_id}", response_model=LivePlayer)
-def get_live_player(player_id: str, db: Session = Depends(get_db)):
-    player = crud.get_live_player(db, player_id)
+async def get_live_player(player_id: str, request: Request):
+    player = store.get(player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
-    return LivePlayer(
-        id=player.id,
-        username=player.username,
-        score=player.score,
-        mode=GameMode(player.mode),
-        snake=player.snake,
-        food=player.food,
-        direction=player.direction,
-        status=player.status
+    if wants_binary(request):
+        return Response(snake_codec.encode_player(player), media_type=snake_codec.MEDIA_TYPE)
+    return fast_json.json_response(player.to_dict())
+
+async def live_player_events(player_id: str, channel):
+    """Server-sent events for one player: its state, then every change.
+
+    Must be called after joining the player's channel: the state is read
+    only then, so a change or removal since is either in it or on the
+    channel. A slow client is never sent a backlog: each event carries the
+    newest frame published since the previous one was written.
+    """
+    seen = channel.version
+    player = store.get(player_id)
+    if player is None:
+        yield "event: removed\ndata: %s\n\n" % json.dumps(player_id)
+        return
+    yield "event: player\ndata: %s\n\n" % fast_json.dumps(player.to_dict()).decode()
+    while True:
+        try:
+            seen, frame = await asyncio.wait_for(channel.next_frame(seen), LIVE_STREAM_HEARTBEAT)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+            continue
+        if frame is None:
+            yield "event: removed\ndata: %s\n\n" % json.dumps(player_id)
+            return
+        yield "event: player\ndata: %s\n\n" % frame
+
+@app.get("/live-players/{player_id}/stream")
+async def stream_live_player(player_id: str):
+    """Watch one game as it is played (text/event-stream)"""
+    if not store.get(player_id):
+        raise HTTPException(status_code=404, detail="Player not found")
+
+    async def events():
+        # Joined once streaming starts, so a client gone before then leaves nothing behind
+        channel = hub.watch(player_id)
+        try:
+            async for event in live_player_events(player_id, channel):
+                yield event
+        finally:
+            hub.unwatch(player_id, channel)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @app.post("/live-players", status_code=201, response_model=LivePlayer)
-def create_live_player(
-    player_data: LivePlayer,
-    db: Session = Depends(get_db)
-):
+async def create_live_player(player_data: LivePlayer):
     """Create a new live player when game starts"""
-    player = crud.create_live_player(
-        db,
-        player_id=player_data.id,
+    player = LivePlayerState(
+        id=player_data.id,
         username=player_data.username,
         score=player_data.score,
-        mode=player_data.mode,
-        snake=player_data.snake,
-        food=player_data.food,
-        direction=player_data.direction,
-        status=player_data.status
-    )
-    return LivePlayer(
-        id=player.id,
-        username=player.username,
-        score=player.score,
-        mode=GameMode(player.mode),
-        snake=player.snake,
-        food=player.food,
-        direction=player.direction,
-        status=player.status
+        mode=player_data.mode.value,
+        snake=[(position.x, position.y) for position in player_data.snake],
+        food=(player_data.food.x, player_data.food.y),
+        direction=player_data.direction.value,
+        status=player_data.status.value
     )
+    if not store.create(player):
+        raise HTTPException(status_code=409, detail="Player already exists")
+    response = player.to_dict()
+    hub.publish(response)
+    return response
+
+def reject_server_driven(player_id: str) -> None:
+    if game_engine.owns(player_id):
+        raise HTTPException(status_code=409, detail="Game is simulated by the server")
 
 @app.put("/live-players/{player_id}", response_model=LivePlayer)
-def update_live_player(
-    player_id: str,
-    player_data: LivePlayer,
-    db: Session = Depends(get_db)
-):
-    """Update live player state during gameplay"""
-    player = crud.update_live_player(
-        db,
-        player_id=player_id,
+async def update_live_player(player_id: str, player_data: LivePlayer, seq: int = Query(0, ge=0)):
+    """Update live player state during gameplay
+
+    Also restarts the ``PATCH`` deltas: the next one carries ``seq + 1``.
+    """
+    reject_server_driven(player_id)
+    player = store.update(
+        player_id,
         score=player_data.score,
-        snake=player_data.snake,
-        food=player_data.food,
-        direction=player_data.direction,
-        status=player_data.status
+        snake=[(position.x, position.y) for position in player_data.snake],
+        food=(player_data.food.x, player_data.food.y),
+        direction=player_data.direction.value,
+        status=player_data.status.value,
+        seq=seq
     )
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
-    return LivePlayer(
-        id=player.id,
-        username=player.username,
-        score=player.score,
-        mode=GameMode(player.mode),
-        snake=player.snake,
-        food=player.food,
-        direction=player.direction,
-        status=player.status
-    )
+    response = player.to_dict()
+    hub.publish(response)
+    return response
+
+@app.patch("/live-players/{player_id}", status_code=204)
+async def apply_live_player_delta(player_id: str, delta: LivePlayerDelta):
+    """Apply a compact snake delta instead of re-sending the whole body"""
+    reject_server_driven(player_id)
+    try:
+        player = store.apply_delta(
+            player_id,
+            seq=delta.seq,
+            heads=delta.heads,
+            dropped=delta.dropped,
+            food=delta.food,
+            score=delta.score,
+            direction=delta.direction.value if delta.direction else None,
+            status=delta.status.value if delta.status else None
+        )
+    except StaleDelta as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Out-of-order delta", "expected": e.expected}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not player:
+        raise HTTPException(status_code=404, detail="Player not found")
+    hub.publish(player.to_dict())
+    return None
 
 @app.delete("/live-players/{player_id}", status_code=204)
-def delete_live_player(player_id: str, db: Session = Depends(get_db)):
+async def delete_live_player(player_id: str):
     """Remove player when game ends or player disconnects"""
-    success = crud.delete_live_player(db, player_id)
-    if not success:
+    if not store.delete(player_id):
         raise HTTPException(status_code=404, detail="Player not found")
+    hub.remove(player_id)
+    return None
+
+# Server-simulated games: clients send direction changes, the tick loop does the rest
+def get_own_game(game_id: str, current_user) -> SnakeGame:
+    game = game_engine.get(game_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    if game.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not your game")
+    return game
+
+def forward_game_command(game_id: str, current_user, direction: Optional[str]) -> bool:
+    """Send a turn or stop to the worker simulating the game, if it isn't this one.
+
+    The owner checks the user, so a forwarded command is accepted without a
+    403 for someone else's game; it is simply ignored there.
+    """
+    player = store.get(game_id)
+    if game_engine.get(game_id) is not None or player is None or not player.replica:
+        return False
+    cluster.broadcast("games", {"game_id": game_id, "user_id": current_user.id, "direction": direction})
+    return True
+
+@app.post("/games", status_code=201, response_model=LivePlayer)
+async def start_game(
+    game_data: GameStart,
+    current_user: db_models.User = Depends(get_current_user)
+):
+    """Start a game simulated by the server"""
+    if game_engine.games_of(current_user.id) >= MAX_GAMES_PER_USER:
+        raise HTTPException(status_code=429, detail="Too many games running")
+    game = game_engine.start(current_user.id, current_user.username, game_data.mode.value)
+    return game.state.to_dict()
+
+@app.post("/games/{game_id}/direction", status_code=204)
+async def change_direction(
+    game_id: str,
+    change: DirectionChange,
+    current_user: db_models.User = Depends(get_current_user)
+):
+    """Queue a turn, applied on the next tick"""
+    if not forward_game_command(game_id, current_user, change.direction.value):
+        get_own_game(game_id, current_user).turn(change.direction.value)
     return None
 
+@app.delete("/games/{game_id}", status_code=204)
+async def stop_game(game_id: str, current_user: db_models.User = Depends(get_current_user)):
+    """Abandon a running game"""
+    if not forward_game_command(game_id, current_user, None):
+        get_own_game(game_id, current_user)
+        game_engine.stop(game_id)
+    return None
+
+@app.websocket("/ws/live-players")
+async def live_players_ws(websocket: WebSocket):
+    """Push live player state: one snapshot on connect, then only changes"""
+    await websocket.accept()
+    subscriber = hub.subscribe()
+    # Watch for the client going away while we wait for changes
+    receiver = asyncio.ensure_future(websocket.receive())
+    try:
+        await websocket.send_json({
+            "type": "snapshot",
+            "players": [player.to_dict() for player in store.all()]
+        })
+        while True:
+            batch = asyncio.ensure_future(hub.next_batch(subscriber))
+            done, _ = await asyncio.wait({batch, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                batch.cancel()
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+                continue
+            updated, removed = batch.result()
+            await websocket.send_json({"type": "update", "players": updated, "removed": removed})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(subscriber)
+
+@app.get("/stats")
+async def get_stats():
+    """Runtime counters for capacity planning"""
+    return {
+        "password_hashing": password_hasher.stats(),
+        "token_cache": {"hits": token_cache.hits, "misses": token_cache.misses},
+        "game_engine": {
+            "active_games": game_engine.active_games,
+            "ticks": game_engine.ticks,
+            "ticks_skipped": game_engine.ticks_skipped,
+            "idle_ended": game_engine.idle_ended,
+        },
+        "replay_verification": replay_verifier.stats(),
+        "score_ingest": score_batcher.stats(),
+        "live_players": {
+            "active": len(store),
+            "reaped": store.reaped,
+            "stale_rows_deleted": store.stale_rows_deleted,
+            "ttl_seconds": LIVE_PLAYERS_TTL,
+        },
+        "cluster": {
+            **cluster.stats(),
+            "live_players_applied": live_sync.applied,
+            "live_players_resyncs": live_sync.resyncs,
+        },
+    }
+
+# Prometheus metrics: statement timings and pool checkouts on both engines, and
+# the counters the subsystems above already keep, read only when scraped
+db_engines = {"sync": engine, "async": async_engine.sync_engine}
+for name, db_engine in db_engines.items():
+    metrics.instrument_engine(db_engine, name)
+for name, help, collect, kind in [
+    ("db_pool_connections_checked_out", "Pooled connections in use", metrics.pool_checked_out(db_engines), "gauge"),
+    ("live_players_active", "Players in the live player store", lambda: len(store), "gauge"),
+    ("live_players_reaped_total", "Idle live players removed by the reaper", lambda: store.reaped, "counter"),
+    ("live_players_pending_writes", "Live player changes waiting for the next flush", lambda: store.pending_writes, "gauge"),
+    ("live_spectators", "Connected /ws/live-players spectators", lambda: hub.subscriber_count, "gauge"),
+    ("live_snapshot_hits_total", "GET /live-players served from a shared snapshot", lambda: live_snapshots.hits, "counter"),
+    ("live_snapshot_builds_total", "GET /live-players snapshots encoded", lambda: live_snapshots.builds, "counter"),
+    ("live_stream_watchers", "Open /live-players/{id}/stream connections", lambda: hub.watcher_count, "gauge"),
+    ("game_engine_active_games", "Server-simulated games running", lambda: game_engine.active_games, "gauge"),
+    ("game_engine_ticks_total", "Game engine ticks run", lambda: game_engine.ticks, "counter"),
+    ("game_engine_ticks_skipped_total", "Game engine ticks skipped for falling behind", lambda: game_engine.ticks_skipped, "counter"),
+    ("password_hash_seconds_total", "Time spent in bcrypt", lambda: password_hasher.stats()["hash_seconds_total"], "counter"),
+    ("password_hash_wait_seconds_total", "Time bcrypt calls waited for a worker", lambda: password_hasher.stats()["wait_seconds_total"], "counter"),
+    ("password_hash_completed_total", "bcrypt calls completed", lambda: password_hasher.stats()["completed"], "counter"),
+    ("password_hash_rejected_total", "bcrypt calls rejected with 503", lambda: password_hasher.stats()["rejected"], "counter"),
+    ("token_cache_hits_total", "Requests authenticated from the verified token cache", lambda: token_cache.hits, "counter"),
+    ("token_cache_misses_total", "Requests whose token had to be verified", lambda: token_cache.misses, "counter"),
+    ("leaderboard_cache_hits_total", "GET /leaderboard pages served from the cache", lambda: leaderboard_cache.hits, "counter"),
+    ("leaderboard_cache_misses_total", "Cacheable GET /leaderboard pages that had to be built", lambda: leaderboard_cache.misses, "counter"),
+    ("score_ingest_batches_total", "Group commits of score submissions", lambda: score_batcher.batches, "counter"),
+    ("score_ingest_queued", "Score submissions waiting for a group commit", lambda: score_batcher.stats()["queued"], "gauge"),
+    ("replay_completed_total", "Verified submissions replayed", lambda: replay_verifier.completed, "counter"),
+    ("replay_rejected_total", "Verified submissions rejected by replay", lambda: replay_verifier.rejected, "counter"),
+    ("cluster_broadcasts_sent_total", "Changes broadcast to the other workers", lambda: cluster.sent, "counter"),
+    ("cluster_broadcasts_received_total", "Changes applied from other workers", lambda: cluster.received, "counter"),
+    ("cluster_broadcasts_dropped_total", "Broadcasts dropped while the pub/sub bus was unavailable", lambda: cluster.bus.dropped, "counter"),
+    ("cluster_bus_connected", "1 while connected to the pub/sub bus", lambda: int(cluster.bus.connected), "gauge"),
+]:
+    metrics.registry.callback(name, help, collect, kind=kind)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of request, database and game metrics"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # RPG Leaderboard Endpoints
 @app.post("/rpg/leaderboard", status_code=201)
-def submit_rpg_score(
+async def submit_rpg_score(
     level_id: int,
     score: int,
     time_seconds: float,
     current_user: db_models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit RPG leaderboard score for a specific level"""
     if level_id < 1 or level_id > 20:
         raise HTTPException(status_code=400, detail="Level ID must be between 1 and 20")
     
-    entry = crud.create_rpg_leaderboard_entry(
+    entry = await crud.async_create_rpg_leaderboard_entry(
         db,
         user_id=current_user.id,
         username=current_user.username,
@@ -272,23 +879,43 @@ def submit_rpg_score(
     }
 
 @app.get("/rpg/leaderboard/{level_id}")
-def get_rpg_leaderboard(
+async def get_rpg_leaderboard(
     level_id: int,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    best: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get top scores for a specific RPG level"""
     if level_id < 1 or level_id > 20:
         raise HTTPException(status_code=400, detail="Level ID must be between 1 and 20")
     
-    entries = crud.get_rpg_leaderboard(db, level_id, limit)
-    return [
-        {
-            "rank": idx + 1,
-            "username": entry.username,
-            "score": entry.score,
-            "time_seconds": entry.time_seconds,
-            "completed_at": entry.completed_at.isoformat()
-        }
-        for idx, entry in enumerate(entries)
-    ]
+    if best:
+        entries = await crud.async_get_rpg_leaderboard_bests(db, level_id, limit)
+    else:
+        await db.run_sync(rank_index.ensure_loaded)
+        entries = rank_index.rpg_top(level_id, limit)
+    return fast_json.json_response([ranked_rpg_entry(idx + 1, entry) for idx, entry in enumerate(entries)])
+
+@app.get("/rpg/leaderboard/{level_id}/users/{user_id}")
+async def get_rpg_leaderboard_rank(
+    level_id: int,
+    user_id: int,
+    radius: int = 5,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a user's rank on an RPG level and the entries around it"""
+    if level_id < 1 or level_id > 20:
+        raise HTTPException(status_code=400, detail="Level ID must be between 1 and 20")
+
+    await db.run_sync(rank_index.ensure_loaded)
+    ranked = rank_index.rpg_around(level_id, user_id, max(radius, 0))
+    if ranked is None:
+        raise HTTPException(status_code=404, detail="User has no entries for this level")
+    rank, first_rank, entries = ranked
+    return {
+        "rank": rank,
+        "entries": [
+            ranked_rpg_entry(first_rank + offset, entry)
+            for offset, entry in enumerate(entries)
+        ]
+    }
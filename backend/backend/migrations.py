@@ -0,0 +1,34 @@
+"""
+Apply database migrations.
+
+    python migrations.py            # upgrade to the latest revision
+    python migrations.py 0003       # or to a given one
+
+Equivalent to ``alembic upgrade head`` against ``DATABASE_URL``. Databases
+created with ``Base.metadata.create_all`` before migrations existed are
+upgraded in place: each revision only creates what is missing.
+"""
+import os
+import sys
+
+from alembic import command
+from alembic.config import Config
+
+from database import DATABASE_URL
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def alembic_config(database_url: str = DATABASE_URL) -> Config:
+    config = Config(ALEMBIC_INI)
+    # Percent signs in passwords would otherwise be read as interpolation
+    config.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
+    return config
+
+
+def upgrade(database_url: str = DATABASE_URL, revision: str = "head") -> None:
+    command.upgrade(alembic_config(database_url), revision)
+
+
+if __name__ == "__main__":
+    upgrade(revision=sys.argv[1] if len(sys.argv) > 1 else "head")
@@ -1,6 +1,23 @@
 from enum import Enum
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from typing import Annotated, List, Optional, Tuple
+from pydantic import AfterValidator, BaseModel, EmailStr, Field
+
+# Board size, must match GRID_SIZE in frontend/src/lib/gameLogic.ts
+GRID_SIZE = 25
+
+def clamp_to_grid(value: int) -> int:
+    return min(max(value, 0), GRID_SIZE - 1)
+
+# In walls mode an invincible snake (star effect) skips the wall check in
+# gameLogic.ts and leaves the board, so such cells are pinned to the edge
+# rather than rejecting the player's updates
+Coordinate = Annotated[int, AfterValidator(clamp_to_grid)]
+
+# Bounds of the packed live player encoding (snake_codec): i32 score and
+# u16-prefixed id, username and snake
+LiveScore = Annotated[int, Field(ge=0, lt=2**31)]
+LIVE_ID_MAX_LENGTH = 128
+LIVE_USERNAME_MAX_LENGTH = 64
 
 class GameMode(str, Enum):
     PASS_THROUGH = "pass-through"
@@ -12,6 +29,19 @@ class GameStatus(str, Enum):
     PAUSED = "paused"
     GAME_OVER = "game-over"
 
+class LeaderboardWindow(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    ALL = "all"
+
+class LivePlayerFields(str, Enum):
+    SUMMARY = "summary"
+    FULL = "full"
+
+class LivePlayerSort(str, Enum):
+    ID = "id"
+    SCORE = "score"
+
 class Direction(str, Enum):
     UP = "UP"
     DOWN = "DOWN"
@@ -19,8 +49,8 @@ class Direction(str, Enum):
     RIGHT = "RIGHT"
 
 class Position(BaseModel):
-    x: int
-    y: int
+    x: Coordinate
+    y: Coordinate
 
 class User(BaseModel):
     id: str
@@ -32,7 +62,8 @@ class AuthResponse(BaseModel):
     token: str
 
 class UserCreate(BaseModel):
-    username: str
+    # Shown in live player listings, which share their bound
+    username: str = Field(min_length=1, max_length=LIVE_USERNAME_MAX_LENGTH)
     email: EmailStr
     password: str
 
@@ -51,12 +82,46 @@ class ScoreSubmit(BaseModel):
     score: int
     mode: GameMode
 
+class VerifiedScoreSubmit(BaseModel):
+    """A game to replay: its seed, length in ticks and the turns made as
+    (tick, direction) pairs. ``score``, if given, must match the replay."""
+    mode: GameMode
+    seed: int
+    ticks: int = Field(gt=0)
+    inputs: List[Tuple[Annotated[int, Field(ge=0)], Direction]] = []
+    score: Optional[int] = None
+
 class LivePlayer(BaseModel):
+    id: str = Field(min_length=1, max_length=LIVE_ID_MAX_LENGTH)
+    username: str = Field(max_length=LIVE_USERNAME_MAX_LENGTH)
+    score: LiveScore
+    mode: GameMode
+    snake: List[Position] = Field(min_length=1, max_length=GRID_SIZE * GRID_SIZE)
+    food: Position
+    direction: Direction
+    status: GameStatus
+
+class LivePlayerSummary(BaseModel):
+    """Lobby listing of a live player, without the board."""
     id: str
     username: str
     score: int
     mode: GameMode
-    snake: List[Position]
-    food: Position
-    direction: Direction
     status: GameStatus
+
+class GameStart(BaseModel):
+    mode: GameMode = GameMode.WALLS
+
+class DirectionChange(BaseModel):
+    direction: Direction
+
+class LivePlayerDelta(BaseModel):
+    """Incremental live player update: cells entered at the head and the
+    number of cells dropped from the tail since the previous update."""
+    seq: int
+    heads: List[Tuple[Coordinate, Coordinate]] = Field(default=[], max_length=GRID_SIZE * GRID_SIZE)
+    dropped: int = 0
+    food: Tuple[Coordinate, Coordinate]
+    score: Optional[LiveScore] = None
+    direction: Optional[Direction] = None
+    status: Optional[GameStatus] = None
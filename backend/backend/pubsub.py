@@ -0,0 +1,381 @@
+"""
+Publish/subscribe transports connecting the API's worker processes.
+
+Three buses share one small interface (``subscribe`` a handler to a channel,
+``publish`` bytes to it, ``start`` and ``close``):
+
+- ``LocalBus`` delivers within the process. It is the default, for a single
+  worker, and lets tests run several "workers" side by side;
+- ``RedisBus`` speaks the Redis protocol (``SUBSCRIBE`` / ``PUBLISH``) to a
+  Redis server, or anything compatible with it, over TCP or a Unix socket;
+- ``Broker`` is a stand-in for Redis implementing just those commands, for
+  several workers on one host without running Redis. Start it with
+  ``python pubsub.py unix:///tmp/snake-showdown.sock`` and point the workers'
+  ``RedisBus`` at the same URL.
+
+Delivery is at most once: messages published while a bus is disconnected are
+dropped, and ``RedisBus`` reconnects in the background, calling
+``on_reconnect`` (also when the first connection only succeeds after
+``start`` returned) so callers can rebuild whatever they may have missed. A
+subscriber that cannot keep up is disconnected by the broker rather than
+buffered without bound, like Redis' pub/sub output buffer limit.
+
+The protocol is written directly, so there is no dependency on ``redis``.
+"""
+import asyncio
+import logging
+import os
+import sys
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[bytes], None]
+
+# Bytes queued for one connection before it is considered stuck
+BUFFER_LIMIT = 8 * 1024 * 1024
+RECONNECT_DELAY = 0.1
+RECONNECT_DELAY_MAX = 5.0
+
+
+class Bus(ABC):
+    """Channels of byte messages; handlers run on the event loop."""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self.on_reconnect: Optional[Callable[[], None]] = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """Register a handler; must be called before ``start``."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def _deliver(self, channel: str, data: bytes) -> None:
+        self.received += 1
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(data)
+            except Exception:
+                logger.exception("Handler for %s failed", channel)
+
+    @abstractmethod
+    def publish(self, channel: str, data: bytes) -> None:
+        """Send a message to every subscriber, this one included.
+
+        Must be called from the event loop thread; never blocks.
+        """
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalBus(Bus):
+    """Delivers messages to the handlers registered in this process."""
+
+    def publish(self, channel: str, data: bytes) -> None:
+        self.published += 1
+        self._deliver(channel, data)
+
+
+# Redis serialization protocol (RESP2)
+class RespError(Exception):
+    pass
+
+
+def encode_command(*parts) -> bytes:
+    chunks = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        elif isinstance(part, int):
+            part = str(part).encode()
+        chunks.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(chunks)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one reply; error replies are returned as ``RespError`` instances."""
+    line = await reader.readuntil(b"\r\n")
+    kind, value = line[:1], line[1:-2]
+    if kind == b"+":
+        return value.decode()
+    if kind == b"-":
+        return RespError(value.decode())
+    if kind == b":":
+        return int(value)
+    if kind == b"$":
+        length = int(value)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(value)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f"Unexpected reply {line[:32]!r}")
+
+
+def _reply(value) -> bytes:
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(_reply(item) for item in value)
+
+
+def _address(url: str) -> Tuple[Optional[str], Optional[str], int, Optional[str]]:
+    """(unix socket path, host, port, password) of a ``redis://`` or ``unix://`` URL."""
+    parsed = urlparse(url)
+    password = unquote(parsed.password) if parsed.password else None
+    if parsed.scheme == "unix":
+        return parsed.path, None, 0, password
+    if parsed.scheme in ("redis", "tcp"):
+        return None, parsed.hostname or "localhost", parsed.port or 6379, password
+    raise ValueError(f"Unsupported pub/sub URL scheme: {parsed.scheme!r}")
+
+
+async def _open(url: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    path, host, port, password = _address(url)
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    if password:
+        writer.write(encode_command("AUTH", password))
+        reply = await read_reply(reader)
+        if isinstance(reply, RespError):
+            writer.close()
+            raise reply
+    return reader, writer
+
+
+class RedisBus(Bus):
+    """Pub/sub over the Redis protocol.
+
+    Uses two connections, as a subscribed Redis connection accepts no other
+    commands: one subscribed to every registered channel, one for
+    ``PUBLISH``.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self.connections = 0
+        self._publisher: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._publisher is not None
+
+    def publish(self, channel: str, data: bytes) -> None:
+        writer = self._publisher
+        if writer is None or writer.transport.get_write_buffer_size() > BUFFER_LIMIT:
+            self.dropped += 1
+            return
+        writer.write(encode_command("PUBLISH", channel, data))
+        self.published += 1
+
+    async def start(self) -> None:
+        """Connect, retrying in the background until ``close``."""
+        connected = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(connected))
+        # Don't hold up startup for a broker that isn't there yet
+        await asyncio.wait([connected], timeout=1.0)
+        if not connected.done():
+            # Messages are being dropped until then, so connecting later
+            # counts as a reconnect
+            connected.cancel()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, connected: asyncio.Future) -> None:
+        delay = RECONNECT_DELAY
+        while True:
+            writers = []
+            try:
+                sub_reader, sub_writer = await _open(self.url)
+                writers.append(sub_writer)
+                pub_reader, pub_writer = await _open(self.url)
+                writers.append(pub_writer)
+                if self._handlers:
+                    sub_writer.write(encode_command("SUBSCRIBE", *self._handlers))
+                for _ in self._handlers:
+                    reply = await read_reply(sub_reader)
+                    if isinstance(reply, RespError):
+                        raise reply
+                self._publisher = pub_writer
+                self.connections += 1
+                delay = RECONNECT_DELAY
+                if not connected.done():
+                    connected.set_result(None)
+                elif self.on_reconnect is not None:
+                    self.on_reconnect()
+                listeners = [
+                    asyncio.ensure_future(self._receive(sub_reader)),
+                    asyncio.ensure_future(self._drain_replies(pub_reader)),
+                ]
+                try:
+                    done, _ = await asyncio.wait(listeners, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for listener in listeners:
+                        listener.cancel()
+                for listener in done:
+                    listener.result()
+                logger.warning("Pub/sub connection to %s closed", self.url)
+            except (OSError, EOFError, asyncio.IncompleteReadError, RespError) as e:
+                logger.warning("Pub/sub connection to %s failed: %s", self.url, e)
+            finally:
+                self._publisher = None
+                for writer in writers:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def _receive(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            reply = await read_reply(reader)
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                self._deliver(reply[1].decode(), reply[2])
+
+    async def _drain_replies(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            reply = await read_reply(reader)
+            if isinstance(reply, RespError):
+                logger.warning("PUBLISH failed: %s", reply)
+
+
+class Broker:
+    """Relays published messages to the connections subscribed to their channel.
+
+    Understands ``SUBSCRIBE``, ``UNSUBSCRIBE``, ``PUBLISH``, ``PING`` and
+    ``AUTH`` (accepting any password), which is all ``RedisBus`` sends.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.published = 0
+        self.disconnected = 0
+
+    async def start(self, url: str) -> None:
+        path, host, port, _ = _address(url)
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)  # Left behind by a previous run
+            self._server = await asyncio.start_unix_server(self._serve, path)
+        else:
+            self._server = await asyncio.start_server(self._serve, host, port)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    def _send(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        if writer.transport.get_write_buffer_size() > BUFFER_LIMIT:
+            self.disconnected += 1
+            writer.transport.abort()
+            return
+        writer.write(data)
+
+    def _publish(self, channel: bytes, data: bytes) -> int:
+        self.published += 1
+        writers = list(self._subscribers.get(channel, ()))
+        message = _reply([b"message", channel, data])
+        for writer in writers:
+            self._send(writer, message)
+        return len(writers)
+
+    def _execute(self, writer: asyncio.StreamWriter, channels: Set[bytes], command: list) -> None:
+        name = command[0].upper() if command else b""
+        if name == b"PUBLISH" and len(command) == 3:
+            self._send(writer, _reply(self._publish(command[1], command[2])))
+        elif name == b"SUBSCRIBE" and len(command) > 1:
+            for channel in command[1:]:
+                channels.add(channel)
+                self._subscribers.setdefault(channel, set()).add(writer)
+                self._send(writer, _reply([b"subscribe", channel, len(channels)]))
+        elif name == b"UNSUBSCRIBE":
+            for channel in command[1:] or list(channels):
+                channels.discard(channel)
+                self._subscribers.get(channel, set()).discard(writer)
+                self._send(writer, _reply([b"unsubscribe", channel, len(channels)]))
+        elif name == b"PING":
+            self._send(writer, _reply("PONG"))
+        elif name == b"AUTH":
+            self._send(writer, _reply("OK"))
+        else:
+            self._send(writer, _reply(RespError(f"ERR unknown command {name.decode(errors='replace')!r}")))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        channels: Set[bytes] = set()
+        self._clients.add(writer)
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list):
+                    raise RespError("Expected a command array")
+                self._execute(writer, channels, command)
+        except (OSError, asyncio.IncompleteReadError, RespError):
+            pass
+        finally:
+            for channel in channels:
+                self._subscribers.get(channel, set()).discard(writer)
+            self._clients.discard(writer)
+            writer.close()
+
+
+def create_bus(url: str) -> Bus:
+    """A ``LocalBus`` for an empty URL, otherwise a ``RedisBus`` for it."""
+    return RedisBus(url) if url else LocalBus()
+
+
+async def run_broker(url: str) -> None:
+    broker = Broker()
+    await broker.start(url)
+    logger.info("Pub/sub broker listening on %s", url)
+    try:
+        await broker.serve_forever()
+    finally:
+        await broker.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    broker_url = sys.argv[1] if len(sys.argv) > 1 else os.getenv("PUBSUB_URL", "")
+    if not broker_url.startswith("unix://"):
+        # Nothing to run: a single worker, or an external Redis server
+        logger.info("PUBSUB_URL is not a unix:// socket; no local broker needed")
+        sys.exit(0)
+    asyncio.run(run_broker(broker_url))
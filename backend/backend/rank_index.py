@@ -0,0 +1,375 @@
+"""
+In-memory rank index for the leaderboard and RPG leaderboard.
+
+Every board keeps its entries sorted by rank key, plus each user's best key,
+so "top K", "rank of user X" and "entries around user X" are binary searches
+and slices that never touch the database. Entries live in blocks of at most
+``BLOCK_SIZE`` (the layout of ``sortedcontainers.SortedList``), with a
+Fenwick tree over the block lengths, so an insert moves one block's worth of
+entries instead of the whole board and positions are found in O(log n). Boards are loaded from the
+tables once and then kept current by the ``crud`` functions that insert rows.
+
+Leaderboard entries rank by score (ties go to the earlier entry); RPG entries
+rank by score, then by completion time. Pages after a ``(score, id)`` cursor
+are a binary search too, so deep pages cost the same as the first one.
+
+Besides the all-time boards, the leaderboard keeps rollups of the current day
+and week (UTC, weeks starting on Monday). New entries are added to them as
+they arrive; when a period ends, the next period's entries are already in the
+old rollup, so it is filtered in memory rather than reloaded.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import db_models
+
+ALL_MODES = "all"
+ALL_TIME = "all"
+WINDOWS = ("day", "week")
+# Blocks split in two when they grow past this
+BLOCK_SIZE = 512
+
+
+def window_start(window: str, now: datetime) -> datetime:
+    """Start of the day or week (Monday) containing ``now``."""
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day if window == "day" else day - timedelta(days=day.weekday())
+
+
+class RankedEntry(NamedTuple):
+    id: int
+    user_id: int
+    username: str
+    score: int
+    mode: Optional[str]
+    time_seconds: Optional[float]
+    completed_at: datetime
+
+
+class SortedBlocks:
+    """Keys in sorted order, each with a value, split into short blocks.
+
+    ``_maxes`` holds the last key of every block, so finding a key's block is
+    a bisect over the blocks and finding its position is a bisect within one.
+    ``_tree`` is a Fenwick tree of the block lengths, turning a block number
+    into the position of its first entry (and back) in O(log n).
+    """
+
+    def __init__(self):
+        self._keys: List[List[tuple]] = []
+        self._values: List[List[RankedEntry]] = []
+        self._maxes: List[tuple] = []
+        self._tree: List[int] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Tuple[tuple, RankedEntry]]:
+        for keys, values in zip(self._keys, self._values):
+            yield from zip(keys, values)
+
+    def insert(self, key: tuple, value: RankedEntry) -> bool:
+        """Insert ``value`` at ``key``; False if the key is already present."""
+        if not self._maxes:
+            self._keys.append([key])
+            self._values.append([value])
+            self._maxes.append(key)
+            self._rebuild()
+            self._len = 1
+            return True
+        block = bisect_left(self._maxes, key)
+        if block == len(self._maxes):
+            block -= 1
+        keys = self._keys[block]
+        offset = bisect_left(keys, key)
+        if offset < len(keys) and keys[offset] == key:
+            return False
+        keys.insert(offset, key)
+        self._values[block].insert(offset, value)
+        self._maxes[block] = keys[-1]
+        self._len += 1
+        if len(keys) > BLOCK_SIZE:
+            self._split(block)
+        else:
+            self._grow(block, 1)
+        return True
+
+    def append(self, key: tuple, value: RankedEntry) -> None:
+        """Add ``key`` after every key already present."""
+        if not self._keys or len(self._keys[-1]) >= BLOCK_SIZE:
+            self._keys.append([])
+            self._values.append([])
+            self._maxes.append(key)
+            self._tree.append(0)
+            self._rebuild()
+        self._keys[-1].append(key)
+        self._values[-1].append(value)
+        self._maxes[-1] = key
+        self._len += 1
+        self._grow(len(self._keys) - 1, 1)
+
+    def bisect_left(self, key: tuple) -> int:
+        return self._bisect(key, bisect_left)
+
+    def bisect_right(self, key: tuple) -> int:
+        return self._bisect(key, bisect_right)
+
+    def values(self, start: int, stop: int) -> List[RankedEntry]:
+        """Values at positions ``start`` (inclusive) to ``stop`` (exclusive)."""
+        stop = min(stop, self._len)
+        if start >= stop:
+            return []
+        block, offset = self._locate(start)
+        result: List[RankedEntry] = []
+        wanted = stop - start
+        while len(result) < wanted:
+            result.extend(self._values[block][offset:offset + wanted - len(result)])
+            block, offset = block + 1, 0
+        return result
+
+    def _bisect(self, key: tuple, bisect: Callable) -> int:
+        block = bisect(self._maxes, key)
+        if block == len(self._maxes):
+            return self._len
+        return self._before(block) + bisect(self._keys[block], key)
+
+    def _split(self, block: int) -> None:
+        keys, values = self._keys[block], self._values[block]
+        half = len(keys) // 2
+        self._keys[block:block + 1] = [keys[:half], keys[half:]]
+        self._values[block:block + 1] = [values[:half], values[half:]]
+        self._maxes[block:block + 1] = [keys[half - 1], keys[-1]]
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        # Splits are rare (one per BLOCK_SIZE / 2 inserts), so O(blocks) is fine
+        tree = [len(keys) for keys in self._keys]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, block: int, amount: int) -> None:
+        while block < len(self._tree):
+            self._tree[block] += amount
+            block |= block + 1
+
+    def _before(self, block: int) -> int:
+        """Entries in the blocks before ``block``."""
+        total = 0
+        while block > 0:
+            total += self._tree[block - 1]
+            block &= block - 1
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """Block holding ``position``, and the offset within it."""
+        block = 0
+        step = 1 << (len(self._tree).bit_length() - 1) if self._tree else 0
+        while step:
+            candidate = block + step
+            if candidate <= len(self._tree) and self._tree[candidate - 1] <= position:
+                block = candidate
+                position -= self._tree[candidate - 1]
+            step >>= 1
+        return block, position
+
+
+class RankedBoard:
+    """Entries of one board in rank order."""
+
+    def __init__(self):
+        self._entries = SortedBlocks()
+        self._best: Dict[int, tuple] = {}
+
+    @staticmethod
+    def key(entry: RankedEntry) -> tuple:
+        if entry.time_seconds is None:
+            return (-entry.score, entry.id)
+        return (-entry.score, entry.time_seconds, entry.id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: RankedEntry) -> None:
+        key = self.key(entry)
+        if not self._entries.insert(key, entry):
+            return  # Already indexed
+        self._note_best(entry.user_id, key)
+
+    def _note_best(self, user_id: int, key: tuple) -> None:
+        best = self._best.get(user_id)
+        if best is None or key < best:
+            self._best[user_id] = key
+
+    def top(self, limit: int) -> List[RankedEntry]:
+        return self._entries.values(0, limit)
+
+    def page(self, after: Optional[Tuple[int, int]], limit: int) -> List[RankedEntry]:
+        """Up to ``limit`` entries ranked below the ``(score, id)`` cursor."""
+        if after is None:
+            return self._entries.values(0, limit)
+        start = self._entries.bisect_right((-after[0], after[1]))
+        return self._entries.values(start, start + limit)
+
+    def filtered(self, keep: Callable[[RankedEntry], bool]) -> "RankedBoard":
+        board = RankedBoard()
+        for key, entry in self._entries:
+            if keep(entry):
+                board._entries.append(key, entry)
+                board._note_best(entry.user_id, key)
+        return board
+
+    def rank_of(self, user_id: int) -> Optional[int]:
+        """1-based rank of the user's best entry, or None if they have none."""
+        best = self._best.get(user_id)
+        if best is None:
+            return None
+        return self._entries.bisect_left(best) + 1
+
+    def around(self, user_id: int, radius: int) -> Optional[Tuple[int, int, List[RankedEntry]]]:
+        """The user's rank, the rank of the first returned entry and up to
+        ``radius`` entries either side of the user's best one."""
+        rank = self.rank_of(user_id)
+        if rank is None:
+            return None
+        start = max(rank - 1 - radius, 0)
+        return rank, start + 1, self._entries.values(start, rank + radius)
+
+
+class RankIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._leaderboard: Dict[str, RankedBoard] = {}
+        # window -> (period start, boards by mode)
+        self._windows: Dict[str, Tuple[datetime, Dict[str, RankedBoard]]] = {}
+        self._rpg: Dict[int, RankedBoard] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, db: Session) -> None:
+        """(Re)build every board from the database."""
+        with self._lock:
+            self._leaderboard = {}
+            self._rpg = {}
+            now = datetime.utcnow()
+            self._windows = {window: (window_start(window, now), {}) for window in WINDOWS}
+            # Just the indexed columns, without building ORM instances
+            entry = db_models.LeaderboardEntry
+            rows = db.execute(
+                select(entry.id, entry.user_id, entry.username, entry.score, entry.mode, entry.date)
+                .execution_options(yield_per=1000)
+            )
+            for row in rows:
+                self._add_leaderboard(row)
+            rpg = db_models.RPGLeaderboard
+            rows = db.execute(
+                select(rpg.id, rpg.user_id, rpg.username, rpg.level_id, rpg.score, rpg.time_seconds, rpg.completed_at)
+                .execution_options(yield_per=1000)
+            )
+            for row in rows:
+                self._add_rpg(row)
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load(db)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._leaderboard = {}
+            self._windows = {}
+            self._rpg = {}
+
+    def _add_leaderboard(self, row: db_models.LeaderboardEntry) -> None:
+        mode = row.mode.value if hasattr(row.mode, "value") else row.mode
+        entry = RankedEntry(row.id, row.user_id, row.username, row.score, mode, None, row.date)
+        for key in (ALL_MODES, mode):
+            self._leaderboard.setdefault(key, RankedBoard()).add(entry)
+        for start, boards in self._windows.values():
+            if entry.completed_at is not None and entry.completed_at >= start:
+                for key in (ALL_MODES, mode):
+                    boards.setdefault(key, RankedBoard()).add(entry)
+
+    def _window_boards(self, window: str) -> Dict[str, RankedBoard]:
+        """Rollups of the current period, rolling over if the last one ended."""
+        start = window_start(window, datetime.utcnow())
+        previous, boards = self._windows[window]
+        if start != previous:
+            boards = {
+                key: board.filtered(lambda entry: entry.completed_at >= start)
+                for key, board in boards.items()
+            }
+            self._windows[window] = (start, boards)
+        return boards
+
+    def _add_rpg(self, row: db_models.RPGLeaderboard) -> None:
+        entry = RankedEntry(
+            row.id, row.user_id, row.username, row.score, None, row.time_seconds, row.completed_at
+        )
+        self._rpg.setdefault(row.level_id, RankedBoard()).add(entry)
+
+    def add_leaderboard_entry(self, row: db_models.LeaderboardEntry) -> None:
+        """Index a newly inserted row; a no-op until the index is loaded."""
+        with self._lock:
+            if self._loaded:
+                self._add_leaderboard(row)
+
+    def add_rpg_entry(self, row: db_models.RPGLeaderboard) -> None:
+        with self._lock:
+            if self._loaded:
+                self._add_rpg(row)
+
+    # Readers take the lock too: an insert updates a block and the tree
+
+    def leaderboard_top(self, mode: Optional[str], limit: int) -> List[RankedEntry]:
+        with self._lock:
+            board = self._leaderboard.get(mode or ALL_MODES)
+            return board.top(limit) if board else []
+
+    def leaderboard_page(
+        self,
+        mode: Optional[str],
+        after: Optional[Tuple[int, int]],
+        limit: int,
+        window: str = ALL_TIME
+    ) -> List[RankedEntry]:
+        with self._lock:
+            boards = self._leaderboard if window == ALL_TIME else self._window_boards(window)
+            board = boards.get(mode or ALL_MODES)
+            return board.page(after, limit) if board else []
+
+    def leaderboard_around(
+        self, mode: Optional[str], user_id: int, radius: int
+    ) -> Optional[Tuple[int, int, List[RankedEntry]]]:
+        with self._lock:
+            board = self._leaderboard.get(mode or ALL_MODES)
+            return board.around(user_id, radius) if board else None
+
+    def rpg_top(self, level_id: int, limit: int) -> List[RankedEntry]:
+        with self._lock:
+            board = self._rpg.get(level_id)
+            return board.top(limit) if board else []
+
+    def rpg_around(
+        self, level_id: int, user_id: int, radius: int
+    ) -> Optional[Tuple[int, int, List[RankedEntry]]]:
+        with self._lock:
+            board = self._rpg.get(level_id)
+            return board.around(user_id, radius) if board else None
+
+
+index = RankIndex()
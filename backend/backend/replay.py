@@ -0,0 +1,204 @@
+"""
+Verified score submissions by deterministic replay.
+
+A verified submission carries the game's seed, its length in ticks and the
+input log (tick, direction) instead of a score. ``replay`` plays the game
+again with ``game_engine.SnakeGame``, whose food placement is driven only by
+the seed, so the same log always produces the same score.
+
+Replays are CPU-bound, so ``ReplayVerifier`` runs them in a separate process
+pool rather than on the request threads. Each replay stops once it has used
+``REPLAY_CPU_SECONDS`` of CPU time. Results are cached by the hash of the
+replay, so a retried submission is not replayed twice. Like password hashing,
+the pool fails fast with ``VerifierBusy`` once ``workers + max_queue``
+replays are outstanding, and reports throughput for ``/stats``.
+
+Seeds are issued by the server (``new_seed``) and each one is accepted for a
+single submission within ``REPLAY_SEED_TTL`` seconds, so a client can neither
+pick a seed with a favourable food layout nor resubmit the same game.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from game_engine import SnakeGame
+
+REPLAY_WORKERS = int(os.getenv("REPLAY_WORKERS", "2"))
+REPLAY_MAX_QUEUE = int(os.getenv("REPLAY_MAX_QUEUE", "64"))
+REPLAY_CPU_SECONDS = float(os.getenv("REPLAY_CPU_SECONDS", "1.0"))
+REPLAY_MAX_TICKS = int(os.getenv("REPLAY_MAX_TICKS", "200000"))
+REPLAY_CACHE_SIZE = int(os.getenv("REPLAY_CACHE_SIZE", "4096"))
+REPLAY_SEED_TTL = int(os.getenv("REPLAY_SEED_TTL", "3600"))  # seconds
+
+# Ticks between CPU time checks
+CPU_CHECK_INTERVAL = 1024
+
+Inputs = List[Tuple[int, str]]
+
+
+class ReplayResult(NamedTuple):
+    score: int
+    status: str
+    ticks: int
+    cpu_seconds: float
+
+
+class ReplayRejected(Exception):
+    """The replay is malformed or exceeded its CPU budget."""
+
+
+class VerifierBusy(Exception):
+    """Too many replays are already queued."""
+
+
+def new_seed() -> int:
+    # Below 2**53, so JavaScript clients get it back exactly
+    return secrets.randbits(52)
+
+
+def replay_hash(mode: str, seed: int, ticks: int, inputs: Inputs) -> str:
+    canonical = json.dumps([mode, seed, ticks, inputs], separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def replay(
+    mode: str,
+    seed: int,
+    ticks: int,
+    inputs: Inputs,
+    cpu_seconds: float = REPLAY_CPU_SECONDS
+) -> ReplayResult:
+    """Play a game from its seed and input log and return the outcome.
+
+    Inputs are applied before the step of their tick, in order. The replay
+    ends after ``ticks`` steps or when the snake dies, whichever is first.
+    """
+    if ticks > REPLAY_MAX_TICKS:
+        raise ReplayRejected(f"Replays are limited to {REPLAY_MAX_TICKS} ticks")
+    previous = 0
+    for tick, _ in inputs:
+        if tick < previous or tick >= ticks:
+            raise ReplayRejected("Input ticks must be ascending and within the game")
+        previous = tick
+
+    started = time.process_time()
+    game = SnakeGame.new("replay", user_id=0, username="", mode=mode, seed=seed)
+    pending = iter(inputs)
+    next_input = next(pending, None)
+    played = 0
+    while played < ticks and game.state.status == "playing":
+        while next_input is not None and next_input[0] == played:
+            game.turn(next_input[1])
+            next_input = next(pending, None)
+        game.step()
+        played += 1
+        if played % CPU_CHECK_INTERVAL == 0 and time.process_time() - started > cpu_seconds:
+            raise ReplayRejected("Replay exceeded its CPU time limit")
+    return ReplayResult(game.state.score, game.state.status, played, time.process_time() - started)
+
+
+class ReplayVerifier:
+    def __init__(
+        self,
+        workers: int = REPLAY_WORKERS,
+        max_queue: int = REPLAY_MAX_QUEUE,
+        cache_size: int = REPLAY_CACHE_SIZE
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, ReplayResult]" = OrderedDict()
+        self._outstanding = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy = 0
+        self.cache_hits = 0
+        self.ticks_total = 0
+        self.cpu_seconds_total = 0.0
+        self.wall_seconds_total = 0.0
+        self.wall_seconds_max = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use so importing the app doesn't fork workers;
+        # spawn because forking a process with an event loop and threads is unsafe
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def verify(self, mode: str, seed: int, ticks: int, inputs: Inputs) -> ReplayResult:
+        key = replay_hash(mode, seed, ticks, inputs)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            if self._outstanding >= self.workers + self.max_queue:
+                self.busy += 1
+                raise VerifierBusy()
+            self._outstanding += 1
+        future = self._pool().submit(replay, mode, seed, ticks, inputs)
+        # The slot is released when the job finishes, not when the caller
+        # stops waiting: a cancelled request's replay still occupies a worker
+        future.add_done_callback(functools.partial(self._release, time.perf_counter()))
+        try:
+            result = await asyncio.wrap_future(future)
+        except ReplayRejected:
+            with self._lock:
+                self.rejected += 1
+            raise
+        with self._lock:
+            self.completed += 1
+            self.ticks_total += result.ticks
+            self.cpu_seconds_total += result.cpu_seconds
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _release(self, submitted: float, future) -> None:
+        elapsed = time.perf_counter() - submitted
+        with self._lock:
+            self._outstanding -= 1
+            self.wall_seconds_total += elapsed
+            self.wall_seconds_max = max(self.wall_seconds_max, elapsed)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "outstanding": self._outstanding,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "busy": self.busy,
+                "cache_hits": self.cache_hits,
+                "cache_size": len(self._cache),
+                "ticks_total": self.ticks_total,
+                "cpu_seconds_total": self.cpu_seconds_total,
+                "wall_seconds_total": self.wall_seconds_total,
+                "wall_seconds_max": self.wall_seconds_max,
+            }
+
+
+verifier = ReplayVerifier()
@@ -0,0 +1,126 @@
+"""
+Group commit for single score submissions.
+
+Each ``POST /leaderboard`` used to be its own transaction, so under load the
+insert rate was bounded by one commit (and fsync) per score. ``ScoreBatcher``
+queues submissions instead: the first one in an empty queue waits
+``SCORE_BATCH_WINDOW`` seconds for others to arrive (or until
+``SCORE_BATCH_MAX`` are queued), then the whole batch is written with
+``crud.create_leaderboard_entries`` in one transaction and every waiting
+request gets its own entry back. While a batch is being written, new
+submissions queue up for the next one.
+
+If a batch fails, its submissions are retried one by one so a single bad row
+only fails its own request. Everything runs on the event loop, so the queue
+needs no locks.
+"""
+import asyncio
+import os
+from typing import AsyncContextManager, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import db_models
+
+SCORE_BATCH_WINDOW = float(os.getenv("SCORE_BATCH_WINDOW", "0.005"))  # seconds
+SCORE_BATCH_MAX = int(os.getenv("SCORE_BATCH_MAX", "256"))
+
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+
+
+class ScoreBatcher:
+    def __init__(self, window: float = SCORE_BATCH_WINDOW, max_batch: int = SCORE_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._open_session: Optional[SessionFactory] = None
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._full = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.submissions = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+
+    def start(self, open_session: SessionFactory) -> None:
+        """Write batches through sessions from ``open_session``."""
+        self._open_session = open_session
+        # Bound to the running loop; a restarted app gets a fresh one
+        self._full = asyncio.Event()
+
+    async def stop(self) -> None:
+        """Write whatever is still queued."""
+        if self._writer is not None and not self._writer.done():
+            self._full.set()
+            await self._writer
+        self._open_session = None
+
+    async def submit(self, user_id: int, username: str, score: int, mode: str) -> db_models.LeaderboardEntry:
+        if not self.running:
+            raise RuntimeError("ScoreBatcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(({"user_id": user_id, "username": username, "score": score, "mode": mode}, future))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+        return await future
+
+    @property
+    def running(self) -> bool:
+        return self._open_session is not None and self.window > 0
+
+    async def _drain(self) -> None:
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        try:
+            async with self._open_session() as db:
+                entries = await crud.async_create_leaderboard_entries(db, [row for row, _ in batch])
+        except Exception:
+            self.failed_batches += 1
+            await self._write_one_by_one(batch)
+            return
+        self.batches += 1
+        self.submissions += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), entry in zip(batch, entries):
+            if not future.done():
+                future.set_result(entry)
+
+    async def _write_one_by_one(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        for row, future in batch:
+            try:
+                async with self._open_session() as db:
+                    entry = (await crud.async_create_leaderboard_entries(db, [row]))[0]
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.submissions += 1
+            if not future.done():
+                future.set_result(entry)
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window,
+            "max_batch": self.max_batch,
+            "queued": len(self._pending),
+            "batches": self.batches,
+            "submissions": self.submissions,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches,
+        }
+
+
+batcher = ScoreBatcher()
@@ -1,13 +1,14 @@
 """
 Seed initial data for development.
 """
-from database import SessionLocal, engine, Base
+from database import SessionLocal
 import crud
+import migrations
 from models import GameMode, Direction, GameStatus, Position
 
 def seed_database():
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade tables
+    migrations.upgrade()
     
     db = SessionLocal()
     
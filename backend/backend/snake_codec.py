@@ -0,0 +1,136 @@
+"""
+Compact binary encoding of live player state.
+
+Each grid cell is packed as a single unsigned 16-bit index ``y * GRID_SIZE + x``,
+so a snake body is one little-endian ``uint16`` array instead of a list of
+``{"x": .., "y": ..}`` objects. Used for the ``live_players.snake_cells`` column
+and for the ``application/octet-stream`` representation of ``/live-players``.
+
+Wire format (all integers little-endian)::
+
+    players   := u32 count, player * count
+    player    := u16 id_len, id (utf-8), u16 name_len, username (utf-8),
+                 i32 score, u8 mode, u8 direction, u8 status,
+                 u16 food_cell, u16 snake_len, u16 cell * snake_len
+
+``mode``, ``direction`` and ``status`` are indexes into ``MODES``,
+``DIRECTIONS`` and ``STATUSES``.
+"""
+import struct
+import sys
+from array import array
+from typing import Iterable, List, Tuple
+
+from models import GRID_SIZE
+
+Cell = Tuple[int, int]
+
+MEDIA_TYPE = "application/octet-stream"
+
+MODES = ("pass-through", "walls")
+DIRECTIONS = ("UP", "DOWN", "LEFT", "RIGHT")
+STATUSES = ("idle", "playing", "paused", "game-over")
+
+_MODE_CODES = {name: code for code, name in enumerate(MODES)}
+_DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+_STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+_COUNT = struct.Struct("<I")
+_LENGTH = struct.Struct("<H")
+_FIELDS = struct.Struct("<iBBBHH")
+
+_BIG_ENDIAN = sys.byteorder != "little"
+
+
+def pack_cell(cell: Cell) -> int:
+    x, y = cell
+    if not (0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE):
+        raise ValueError(f"Cell {cell} is outside the {GRID_SIZE}x{GRID_SIZE} grid")
+    return y * GRID_SIZE + x
+
+
+def unpack_cell(index: int) -> Cell:
+    y, x = divmod(index, GRID_SIZE)
+    return x, y
+
+
+def pack_cells(cells: Iterable[Cell]) -> bytes:
+    packed = array("H", [pack_cell(cell) for cell in cells])
+    if _BIG_ENDIAN:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_cells(data: bytes) -> List[Cell]:
+    packed = array("H")
+    packed.frombytes(data)
+    if _BIG_ENDIAN:
+        packed.byteswap()
+    return [unpack_cell(index) for index in packed]
+
+
+def _pack_string(value: str) -> bytes:
+    encoded = value.encode("utf-8")
+    return _LENGTH.pack(len(encoded)) + encoded
+
+
+def encode_player(player) -> bytes:
+    """Encode one ``LivePlayerState`` as a player record."""
+    snake = pack_cells(player.snake)
+    return b"".join((
+        _pack_string(player.id),
+        _pack_string(player.username),
+        _FIELDS.pack(
+            player.score,
+            _MODE_CODES[player.mode],
+            _DIRECTION_CODES[player.direction],
+            _STATUS_CODES[player.status],
+            pack_cell(player.food),
+            len(player.snake),
+        ),
+        snake,
+    ))
+
+
+def encode_players(players) -> bytes:
+    return _COUNT.pack(len(players)) + b"".join(encode_player(player) for player in players)
+
+
+def _read_string(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+
+def decode_player(data: bytes, offset: int = 0) -> Tuple[dict, int]:
+    """Decode a player record into the ``LivePlayer`` wire format.
+
+    Returns the player and the offset just past the record.
+    """
+    player_id, offset = _read_string(data, offset)
+    username, offset = _read_string(data, offset)
+    score, mode, direction, status, food, length = _FIELDS.unpack_from(data, offset)
+    offset += _FIELDS.size
+    end = offset + length * 2
+    snake = unpack_cells(data[offset:end])
+    food_x, food_y = unpack_cell(food)
+    return {
+        "id": player_id,
+        "username": username,
+        "score": score,
+        "mode": MODES[mode],
+        "snake": [{"x": x, "y": y} for x, y in snake],
+        "food": {"x": food_x, "y": food_y},
+        "direction": DIRECTIONS[direction],
+        "status": STATUSES[status],
+    }, end
+
+
+def decode_players(data: bytes) -> List[dict]:
+    (count,) = _COUNT.unpack_from(data, 0)
+    offset = _COUNT.size
+    players = []
+    for _ in range(count):
+        player, offset = decode_player(data, offset)
+        players.append(player)
+    return players
@@ -0,0 +1,181 @@
+"""
+Vectorized batch stepping of many snake games with NumPy.
+
+``game_engine.SnakeGame`` steps one game at a time in Python, which tops out
+at a few hundred games per core per tick. ``BatchSimulation`` keeps every game
+in struct-of-arrays buffers instead: one row per game slot for the head cell,
+a ring buffer of body cells, direction, food, score and an occupancy bitmap of
+the grid, and advances all running games with a handful of array operations.
+
+Cells are packed as ``y * grid_size + x``. Each body ring has room for the
+whole grid, and the head sits at ``head_idx`` with the rest of the body
+behind it, so a move writes the new head in front and clears the old tail's
+occupancy; nothing is shifted.
+
+The rules match ``SnakeGame`` (and the frontend): walls end the game unless
+the mode wraps, any occupied cell, the tail included, is a collision, and
+each food is worth ``FOOD_POINTS``.
+
+Run ``python benchmarks/snake_kernel.py`` to compare it with ``SnakeGame``.
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from game_engine import FOOD_POINTS
+from live_state import Cell
+from models import GRID_SIZE
+
+FREE, PLAYING, GAME_OVER = 0, 1, 2
+
+# Direction codes in clockwise order, so the reverse of d is (d + 2) % 4
+DIRECTIONS = ("UP", "RIGHT", "DOWN", "LEFT")
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+DX = np.array([0, 1, 0, -1], dtype=np.int16)
+DY = np.array([-1, 0, 1, 0], dtype=np.int16)
+
+# Random food draws per game before falling back to scanning the free cells
+FOOD_ATTEMPTS = 8
+
+
+class BatchSimulation:
+    """Many snake games advanced together, one slot per game."""
+
+    def __init__(self, capacity: int = 1024, grid_size: int = GRID_SIZE, seed: Optional[int] = None):
+        self.grid_size = grid_size
+        self.cells = grid_size * grid_size
+        self.capacity = 0
+        self.rng = np.random.default_rng(seed)
+        self.status = np.zeros(0, dtype=np.int8)
+        self.wrap = np.zeros(0, dtype=bool)
+        self.direction = np.zeros(0, dtype=np.int8)
+        self.heading = np.zeros(0, dtype=np.int8)  # Direction of the last move
+        self.head = np.zeros(0, dtype=np.int16)
+        self.head_idx = np.zeros(0, dtype=np.int16)
+        self.length = np.zeros(0, dtype=np.int16)
+        self.food = np.zeros(0, dtype=np.int16)
+        self.score = np.zeros(0, dtype=np.int32)
+        self.body = np.zeros((0, self.cells), dtype=np.int16)
+        self.occupancy = np.zeros((0, self.cells), dtype=bool)
+        self._free: List[int] = []
+        self._grow(capacity)
+
+    def _grow(self, capacity: int) -> None:
+        extra = capacity - self.capacity
+        for name in ("status", "wrap", "direction", "heading", "head", "head_idx", "length", "food", "score"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros(extra, dtype=column.dtype)]))
+        self.body = np.concatenate([self.body, np.zeros((extra, self.cells), dtype=np.int16)])
+        self.occupancy = np.concatenate([self.occupancy, np.zeros((extra, self.cells), dtype=bool)])
+        # Hand out low slots first
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def add(
+        self,
+        mode: str,
+        snake: Sequence[Cell],
+        direction: str,
+        food: Cell,
+        score: int = 0
+    ) -> int:
+        """Add a running game (snake head first) and return its slot."""
+        if not self._free:
+            self._grow(self.capacity * 2)
+        slot = self._free.pop()
+        cells = [y * self.grid_size + x for x, y in snake]
+        length = len(cells)
+        # Head at ring index length - 1, body running back towards index 0
+        self.body[slot, :length] = cells[::-1]
+        self.occupancy[slot] = False
+        self.occupancy[slot, cells] = True
+        self.head[slot] = cells[0]
+        self.head_idx[slot] = length - 1
+        self.length[slot] = length
+        self.direction[slot] = self.heading[slot] = DIRECTION_CODES[direction]
+        self.wrap[slot] = mode == "pass-through"
+        self.food[slot] = food[1] * self.grid_size + food[0]
+        self.score[slot] = score
+        self.status[slot] = PLAYING
+        return slot
+
+    def remove(self, slot: int) -> None:
+        if self.status[slot] != FREE:
+            self.status[slot] = FREE
+            self._free.append(slot)
+
+    def turn(self, slot: int, direction: str) -> bool:
+        """Set the direction for the next step; reversals are ignored."""
+        code = DIRECTION_CODES[direction]
+        if code == (self.heading[slot] + 2) % 4:
+            return False
+        self.direction[slot] = code
+        return True
+
+    def step(self) -> np.ndarray:
+        """Advance every running game one tick; returns the slots stepped."""
+        size = self.grid_size
+        active = np.flatnonzero(self.status == PLAYING)
+        if not active.size:
+            return active
+
+        direction = self.direction[active]
+        self.heading[active] = direction
+        head = self.head[active]
+        x = head % size + DX[direction]
+        y = head // size + DY[direction]
+        wrap = self.wrap[active]
+        x = np.where(wrap, x % size, x)
+        y = np.where(wrap, y % size, y)
+        inside = (x >= 0) & (x < size) & (y >= 0) & (y < size)
+        cell = np.where(inside, y * size + x, 0).astype(np.int16)
+
+        hit = ~inside | self.occupancy[active, cell]
+        self.status[active[hit]] = GAME_OVER
+        moving = ~hit
+        live, cell = active[moving], cell[moving]
+
+        ring = (self.head_idx[live] + 1) % self.cells
+        self.head_idx[live] = ring
+        self.body[live, ring] = cell
+        self.head[live] = cell
+        self.occupancy[live, cell] = True
+
+        eat = cell == self.food[live]
+        movers = live[~eat]
+        tail = (ring[~eat] - self.length[movers]) % self.cells
+        self.occupancy[movers, self.body[movers, tail]] = False
+
+        growers = live[eat]
+        self.length[growers] += 1
+        self.score[growers] += FOOD_POINTS
+        full = self.length[growers] >= self.cells
+        self.status[growers[full]] = GAME_OVER
+        self._place_food(growers[~full])
+        return active
+
+    def _place_food(self, slots: np.ndarray) -> None:
+        pending = slots
+        for _ in range(FOOD_ATTEMPTS):
+            if not pending.size:
+                return
+            cells = self.rng.integers(0, self.cells, size=pending.size, dtype=np.int16)
+            free = ~self.occupancy[pending, cells]
+            self.food[pending[free]] = cells[free]
+            pending = pending[~free]
+        # Nearly full boards: pick among the free cells directly
+        for slot in pending:
+            self.food[slot] = self.rng.choice(np.flatnonzero(~self.occupancy[slot]))
+
+    def snake(self, slot: int) -> List[Cell]:
+        """Body cells of a game, head first."""
+        ring = (self.head_idx[slot] - np.arange(self.length[slot])) % self.cells
+        return [(int(cell) % self.grid_size, int(cell) // self.grid_size) for cell in self.body[slot, ring]]
+
+    def food_cell(self, slot: int) -> Cell:
+        food = int(self.food[slot])
+        return (food % self.grid_size, food // self.grid_size)
+
+    @property
+    def running(self) -> int:
+        return int(np.count_nonzero(self.status == PLAYING))
@@ -1,7 +1,11 @@
 from fastapi.testclient import TestClient
 from main import app
+from database import Base, engine
 from models import GameMode
 
+# The app no longer creates tables itself (migrations do)
+Base.metadata.create_all(bind=engine)
+
 client = TestClient(app)
 
 def test_read_main():
@@ -0,0 +1,11 @@
+from database import async_database_url
+
+def test_async_database_url_sqlite():
+    assert async_database_url("sqlite:///./snake_showdown.db") == "sqlite+aiosqlite:///./snake_showdown.db"
+
+def test_async_database_url_postgres():
+    assert async_database_url("postgresql://u:p@db/snake") == "postgresql+asyncpg://u:p@db/snake"
+    assert async_database_url("postgres://u:p@db/snake") == "postgresql+asyncpg://u:p@db/snake"
+
+def test_async_database_url_keeps_explicit_async_driver():
+    assert async_database_url("postgresql+asyncpg://db/snake") == "postgresql+asyncpg://db/snake"
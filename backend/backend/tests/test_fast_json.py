@@ -0,0 +1,32 @@
+"""
+Unit tests for the fast JSON response path.
+"""
+import json
+
+from pydantic import TypeAdapter
+from typing import List
+
+import fast_json
+from live_state import LivePlayerState
+from models import LivePlayer
+
+
+def test_matches_standard_library_output():
+    value = [{"username": "Zoë 🐍", "score": 10, "time_seconds": 12.5, "tags": [], "ok": True, "none": None}]
+    assert fast_json.dumps(value) == json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def test_matches_response_model_encoding():
+    players = [
+        LivePlayerState("p1", "Zoë", 30, "walls", [(3, 4), (2, 4)], (9, 9), "RIGHT", "playing").to_dict(),
+        LivePlayerState("p2", "bob", 0, "pass-through", [(0, 0)], (1, 1), "UP", "paused").to_dict(),
+    ]
+    adapter = TypeAdapter(List[LivePlayer])
+    assert fast_json.dumps(players) == adapter.dump_json(adapter.validate_python(players))
+
+
+def test_json_response():
+    response = fast_json.json_response({"id": "a"}, headers={"ETag": '"x"'})
+    assert response.body == b'{"id":"a"}'
+    assert response.media_type == "application/json"
+    assert response.headers["etag"] == '"x"'
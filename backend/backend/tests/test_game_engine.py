@@ -0,0 +1,157 @@
+import random
+import pytest
+from game_engine import FOOD_POINTS, Board, SnakeGame
+from live_state import LivePlayerState
+from models import GRID_SIZE
+
+CELLS = [(x, y) for y in range(GRID_SIZE) for x in range(GRID_SIZE)]
+
+def make_game(mode="walls", seed=1):
+    return SnakeGame.new("game", user_id=1, username="alice", mode=mode, seed=seed)
+
+def game_with_snake(snake, direction="RIGHT", food=(0, 0), seed=1):
+    state = LivePlayerState("game", "alice", 0, "walls", snake, food, direction, "playing")
+    return SnakeGame(state, user_id=1, rng=random.Random(seed))
+
+def test_new_game_layout():
+    game = make_game()
+    center = GRID_SIZE // 2
+    assert list(game.state.snake) == [(center, center), (center - 1, center), (center - 2, center)]
+    assert game.state.food not in game.state.snake
+    assert game.state.status == "playing"
+
+def test_same_seed_same_food():
+    assert make_game(seed=7).state.food == make_game(seed=7).state.food
+
+def test_moves_and_turns():
+    game = make_game()
+    game.state.food = (0, 0)
+    head = game.state.snake[0]
+    assert game.step()
+    assert game.state.snake[0] == (head[0] + 1, head[1])
+    assert len(game.state.snake) == 3
+
+    assert not game.turn("LEFT")  # Reversal
+    assert game.turn("UP")
+    game.step()
+    assert game.state.direction == "UP"
+    assert game.state.snake[0] == (head[0] + 1, head[1] - 1)
+
+def test_turn_buffer():
+    game = make_game()
+    assert game.turn("UP")
+    assert not game.turn("DOWN")  # Reverses the queued turn
+    assert game.turn("LEFT")
+    assert not game.turn("DOWN")  # Buffer full
+
+def test_eating_grows_and_scores():
+    game = make_game()
+    head = game.state.snake[0]
+    game.state.food = (head[0] + 1, head[1])
+    game.step()
+    assert game.state.score == FOOD_POINTS
+    assert len(game.state.snake) == 4
+    assert game.state.food not in game.state.snake
+
+def test_walls_end_game():
+    game = make_game()
+    game.state.food = (0, 0)
+    for _ in range(GRID_SIZE):
+        game.step()
+    assert game.state.status == "game-over"
+    assert not game.step()
+
+def test_pass_through_wraps():
+    game = make_game(mode="pass-through")
+    game.state.food = (0, 0)
+    for _ in range(GRID_SIZE):
+        game.step()
+    assert game.state.status == "playing"
+    assert game.state.snake[0] == (GRID_SIZE // 2, GRID_SIZE // 2)
+
+def test_self_collision():
+    game = game_with_snake([(5, 5), (5, 6), (4, 6), (4, 5), (3, 5)], direction="LEFT")
+    game.step()
+    assert game.state.status == "game-over"
+
+@pytest.mark.parametrize("free", [1, 3])
+def test_food_on_crowded_board(free):
+    game = game_with_snake(CELLS[free:])
+    assert game.place_food() in CELLS[:free]
+
+def random_snake(rng):
+    """A random self-avoiding walk, head first."""
+    snake = [rng.choice(CELLS)]
+    for _ in range(rng.randrange(1, 300)):
+        x, y = snake[-1]
+        options = [
+            cell for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+            if cell in CELLS and cell not in snake
+        ]
+        if not options:
+            break
+        snake.append(rng.choice(options))
+    return snake
+
+@pytest.mark.parametrize("seed", range(20))
+def test_board_matches_naive_scan(seed):
+    """Board membership and free cells agree with scanning the snake."""
+    rng = random.Random(seed)
+    snake = random_snake(rng)
+    board = Board(snake)
+    # Churn the index the way moves do
+    for cell in rng.sample(snake, len(snake) // 2):
+        board.release(cell)
+        board.occupy(cell)
+    assert [cell in board for cell in CELLS] == [cell in snake for cell in CELLS]
+    assert board.free_cells == len(CELLS) - len(snake)
+    draws = {board.random_free(rng) for _ in range(2000)}
+    assert draws <= set(CELLS) - set(snake)
+
+def test_board_samples_uniformly():
+    board = Board(CELLS[4:])
+    rng = random.Random(0)
+    counts = {cell: 0 for cell in CELLS[:4]}
+    for _ in range(4000):
+        counts[board.random_free(rng)] += 1
+    assert all(800 < count < 1200 for count in counts.values())
+    assert Board(CELLS).random_free(rng) is None
+
+def naive_step(state):
+    """SnakeGame.step with list scans, as in the frontend; food is left as is."""
+    dx, dy = {"UP": (0, -1), "DOWN": (0, 1), "LEFT": (-1, 0), "RIGHT": (1, 0)}[state["direction"]]
+    x, y = state["snake"][0][0] + dx, state["snake"][0][1] + dy
+    if state["mode"] == "pass-through":
+        x, y = x % GRID_SIZE, y % GRID_SIZE
+    elif not (0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE):
+        state["status"] = "game-over"
+        return
+    if any(segment == (x, y) for segment in state["snake"]):
+        state["status"] = "game-over"
+        return
+    state["snake"].insert(0, (x, y))
+    if (x, y) == state["food"]:
+        state["score"] += FOOD_POINTS
+    else:
+        state["snake"].pop()
+
+@pytest.mark.parametrize("mode", ["walls", "pass-through"])
+@pytest.mark.parametrize("seed", range(10))
+def test_step_matches_naive(mode, seed):
+    """Games played with the Board end up exactly where list scans do."""
+    rng = random.Random(seed)
+    game = make_game(mode=mode, seed=seed)
+    naive = {
+        "snake": list(game.state.snake), "food": game.state.food, "score": 0,
+        "direction": "RIGHT", "status": "playing", "mode": mode,
+    }
+    while game.state.status == "playing":
+        direction = rng.choice(["UP", "DOWN", "LEFT", "RIGHT"])
+        if game.turn(direction):
+            naive["direction"] = direction
+        game.step()
+        naive_step(naive)
+        assert game.state.food not in game.state.snake or game.state.status != "playing"
+        naive["food"] = game.state.food
+        assert list(game.state.snake) == naive["snake"]
+        assert (game.state.score, game.state.status) == (naive["score"], naive["status"])
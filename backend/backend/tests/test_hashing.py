@@ -0,0 +1,50 @@
+import asyncio
+import time
+import pytest
+import crud
+from hashing import HasherBusy, PasswordHasher
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return hashed, await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, correct, wrong = asyncio.run(run())
+    assert hashed.startswith("$2b$%02d$" % crud.BCRYPT_ROUNDS)
+    assert correct and not wrong
+    stats = hasher.stats()
+    assert stats["completed"] == 3
+    assert stats["queue_depth"] == 0
+    assert stats["hash_seconds_max"] > 0
+
+def test_rejects_when_saturated():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(
+            *(hasher._submit(time.sleep, 0.2) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert [isinstance(result, HasherBusy) for result in results] == [False, False, True]
+    assert hasher.stats()["rejected"] == 1
+
+def test_cancelled_callers_still_count_until_done():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+
+    async def run():
+        waiting = asyncio.ensure_future(hasher._submit(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        # The sleep is still running on the worker, so the bound still holds
+        with pytest.raises(HasherBusy):
+            await hasher._submit(time.sleep, 0)
+        await asyncio.sleep(0.3)
+        await hasher._submit(time.sleep, 0)
+
+    asyncio.run(run())
+    assert hasher.stats()["queue_depth"] == 0
@@ -0,0 +1,55 @@
+"""
+Unit tests for the shared /live-players snapshots.
+"""
+import gzip
+
+from live_snapshot import SnapshotCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_snapshot_reused_while_store_unchanged():
+    clock = Clock()
+    cache = SnapshotCache(interval=0.1, clock=clock)
+    builds = []
+    build = lambda: builds.append(1) or b"[1]"
+
+    first = cache.get("all", 1, build)
+    clock.now += 60
+    assert cache.get("all", 1, build) is first
+    assert len(builds) == 1
+    assert cache.hits == 1
+
+
+def test_snapshot_rebuilt_at_most_once_per_interval():
+    clock = Clock()
+    cache = SnapshotCache(interval=0.1, clock=clock)
+    bodies = iter([b"[1]", b"[2]"])
+    build = lambda: next(bodies)
+
+    first = cache.get("all", 1, build)
+    clock.now += 0.05
+    assert cache.get("all", 2, build) is first  # Changed, but within the interval
+    clock.now += 0.1
+    second = cache.get("all", 2, build)
+    assert second.board.body == b"[2]"
+    assert second.board.etag != first.board.etag
+    assert cache.builds == 2
+
+
+def test_gzip_variant_built_once_and_stable():
+    cache = SnapshotCache(interval=0.1, clock=Clock())
+    snapshot = cache.get("all", 1, lambda: b'[{"id":"a"}]' * 100)
+
+    assert snapshot.gzipped is snapshot.gzipped
+    assert gzip.decompress(snapshot.gzipped.body) == snapshot.board.body
+    assert snapshot.gzipped.etag != snapshot.board.etag
+
+    rebuilt = SnapshotCache(interval=0.1, clock=Clock()).get("all", 1, lambda: b'[{"id":"a"}]' * 100)
+    assert rebuilt.gzipped.etag == snapshot.gzipped.etag
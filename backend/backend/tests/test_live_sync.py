@@ -0,0 +1,162 @@
+import asyncio
+
+from cluster import Cluster
+from live_hub import LivePlayerHub
+from live_state import LivePlayerState, LivePlayerStore
+from live_sync import LiveSync
+from pubsub import Broker, LocalBus, RedisBus
+
+
+class Worker:
+    """One API worker's live player state, synced through a cluster."""
+
+    def __init__(self):
+        self.store = LivePlayerStore()
+        self.hub = LivePlayerHub()
+        self.cluster = Cluster(prefix="test:")
+        self.sync = LiveSync(self.store, self.hub, self.cluster)
+
+
+def new_player(player_id: str = "p1") -> LivePlayerState:
+    return LivePlayerState(
+        id=player_id, username="Racer", score=0, mode="walls",
+        snake=[(5, 5), (4, 5)], food=(9, 9), direction="right", status="playing"
+    )
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_changes_replicate_to_other_workers():
+    async def run():
+        bus = LocalBus()
+        first, second = Worker(), Worker()
+        await first.cluster.start(bus=bus)
+        await second.cluster.start(bus=bus)
+        subscriber = second.hub.subscribe()
+
+        player = new_player()
+        first.store.create(player)
+        first.hub.publish(player.to_dict())
+        first.store.apply_delta("p1", seq=1, heads=[(6, 5)], dropped=1, food=(9, 9), score=10)
+        first.hub.publish(first.store.get("p1").to_dict())
+        await settle()
+
+        replica = second.store.get("p1")
+        assert replica.to_dict() == first.store.get("p1").to_dict()
+        assert replica.replica and not first.store.get("p1").replica
+        # One broadcast carrying the latest state, not one per change
+        assert first.cluster.sent == 1
+        # The worker that made the change writes it; replicas don't
+        assert second.store.pending_writes == 0
+        updated, removed = await second.hub.next_batch(subscriber)
+        assert [state["score"] for state in updated] == [10]
+
+        # Deltas continue on the other worker
+        second.store.apply_delta("p1", seq=2, heads=[(7, 5)], dropped=1, food=(9, 9))
+        second.hub.publish(second.store.get("p1").to_dict())
+        assert not second.store.get("p1").replica
+        await settle()
+        assert list(first.store.get("p1").snake) == [(7, 5), (6, 5)]
+        assert first.store.get("p1").seq == 2
+
+        first.store.delete("p1")
+        first.hub.remove("p1")
+        await settle()
+        assert second.store.get("p1") is None
+        assert second.store.pending_writes == 0
+        updated, removed = await second.hub.next_batch(subscriber)
+        assert removed == ["p1"]
+
+    asyncio.run(run())
+
+
+def test_nothing_sent_until_started():
+    worker = Worker()
+    player = new_player()
+    worker.store.create(player)
+    worker.hub.publish(player.to_dict())
+    assert worker.cluster.sent == 0
+
+
+def test_replicate_through_broker(tmp_path):
+    url = f"unix://{tmp_path}/bus.sock"
+
+    async def run():
+        broker = Broker()
+        await broker.start(url)
+        first, second = Worker(), Worker()
+        await first.cluster.start(bus=RedisBus(url))
+        await second.cluster.start(bus=RedisBus(url))
+        channel = second.hub.watch("p1")
+
+        player = new_player()
+        first.store.create(player)
+        first.hub.publish(player.to_dict())
+        version, frame = await asyncio.wait_for(channel.next_frame(0), 2)
+        assert '"username":"Racer"' in frame
+        assert second.store.get("p1") is not None
+        assert (first.cluster.received, second.cluster.received) == (0, 1)
+
+        await first.cluster.stop()
+        await second.cluster.stop()
+        await broker.close()
+
+    asyncio.run(run())
+
+
+def test_replica_is_not_written_by_a_previous_owner():
+    async def run():
+        bus = LocalBus()
+        first, second = Worker(), Worker()
+        await first.cluster.start(bus=bus)
+        await second.cluster.start(bus=bus)
+        player = new_player()
+        second.store.create(player)
+        assert second.store.pending_writes == 1
+
+        first.store.replicate(new_player(), 0)
+        first.store.apply_delta("p1", seq=1, heads=[(6, 5)], dropped=1, food=(9, 9))
+        first.hub.publish(first.store.get("p1").to_dict())
+        await settle()
+        # The change made here is superseded, and first writes the player now
+        assert second.store.get("p1").replica
+        assert second.store.pending_writes == 0
+        assert first.store.pending_writes == 1
+
+    asyncio.run(run())
+
+
+def test_resync_after_reconnect():
+    async def run():
+        bus = LocalBus()
+        first, second = Worker(), Worker()
+        await first.cluster.start(bus=bus)
+        await second.cluster.start(bus=bus)
+        first.store.create(new_player("kept"))
+        first.hub.publish(first.store.get("kept").to_dict())
+        first.store.create(new_player("removed"))
+        first.hub.publish(first.store.get("removed").to_dict())
+        await settle()
+        assert second.store.get("removed") is not None
+
+        # Changes second missed while disconnected from the bus
+        first.cluster._loop, loop = None, first.cluster._loop
+        first.store.delete("removed")
+        first.hub.remove("removed")
+        first.store.create(new_player("added"))
+        first.hub.publish(first.store.get("added").to_dict())
+        first.cluster._loop = loop
+        second.store.create(new_player("local"))
+        assert first.store.get("local") is None
+
+        bus.on_reconnect()  # second's connection came back
+        await settle()
+        assert sorted(player.id for player in second.store.all()) == ["added", "kept", "local"]
+        assert sorted(player.id for player in first.store.all()) == ["added", "kept", "local"]
+        assert second.store.get("added").replica and first.store.get("local").replica
+        assert (first.sync.resyncs, second.sync.resyncs) == (0, 1)
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+"""
+Unit tests for the metrics registry and text exposition.
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+import metrics
+from metrics import Registry
+
+
+def test_counter_and_gauge_render():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    in_flight = registry.gauge("in_flight", "In flight")
+    requests.inc("/a")
+    requests.inc("/a", amount=2)
+    requests.inc('/b"')
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'requests_total{route="/b\\""} 1' in text
+    assert "# TYPE in_flight gauge" in text
+    assert "in_flight 1" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, "/a")
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 2.65' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+    assert latency.count("/a") == 4
+
+
+def test_callback_read_when_rendered():
+    registry = Registry()
+    state = {"players": 1}
+    registry.callback("players", "Players", lambda: state["players"])
+    registry.callback("by_mode", "By mode", lambda: {("walls",): 2}, labels=("mode",), kind="counter")
+    state["players"] = 5
+
+    text = registry.render()
+    assert "players 5" in text.splitlines()
+    assert "# TYPE by_mode counter" in text
+    assert 'by_mode{mode="walls"} 2' in text
+
+
+def test_instrumented_engine_times_queries_and_checkouts():
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=1, max_overflow=1)
+    metrics.instrument_engine(engine, "test")
+
+    with engine.connect() as first:
+        first.execute(text("SELECT 1"))
+        with pytest.raises(OperationalError):
+            first.execute(text("SELECT * FROM missing"))
+        first.execute(text("SELECT 2"))
+        with engine.connect() as second:
+            second.execute(text("SELECT 3"))
+
+    assert metrics.db_query_duration.count("test") == 3
+    assert metrics.db_pool_checkouts.value("test") == 2
+    assert metrics.db_pool_overflow_checkouts.value("test") == 1
+
+
+def test_metric_must_define_samples():
+    class Incomplete(metrics.Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Not a metric")
@@ -0,0 +1,83 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+import db_models
+import migrations
+from database import Base
+
+@pytest.fixture
+def migrated(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    migrations.upgrade(url)
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+def query_plan(engine, sql, **params):
+    with engine.connect() as connection:
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)
+        return " | ".join(row[-1] for row in rows)
+
+def test_migrations_match_models(migrated):
+    with migrated.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+def test_rpg_board_read_in_index_order(migrated):
+    plan = query_plan(
+        migrated,
+        "SELECT * FROM rpg_leaderboard WHERE level_id = :level "
+        "ORDER BY score DESC, time_seconds ASC LIMIT 10",
+        level=1
+    )
+    assert "ix_rpg_leaderboard_level_score_time" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_leaderboard_page_read_in_index_order(migrated):
+    plan = query_plan(
+        migrated,
+        "SELECT * FROM leaderboard WHERE mode = 'WALLS' AND (score < :score OR (score = :score AND id > :id)) "
+        "ORDER BY score DESC, id LIMIT 100",
+        score=500, id=10
+    )
+    assert "ix_leaderboard_mode_score_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_leaderboard_window_uses_date_index(migrated):
+    plan = query_plan(
+        migrated,
+        "SELECT * FROM leaderboard WHERE mode = 'WALLS' AND date >= :since",
+        since="2024-01-01"
+    )
+    assert "ix_leaderboard_mode_date_score" in plan
+
+def test_stale_live_players_use_index(migrated):
+    plan = query_plan(
+        migrated, "SELECT id FROM live_players WHERE last_updated < :cutoff", cutoff="2024-01-01"
+    )
+    assert "ix_live_players_last_updated" in plan
+
+def test_upgrades_database_created_without_migrations(tmp_path):
+    """A database from create_all at the baseline schema is upgraded in place."""
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    migrations.upgrade(url, "0001")
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE alembic_version"))
+        connection.execute(
+            text(
+                "INSERT INTO live_players (id, username, score, mode, snake, food, direction, status) "
+                "VALUES ('p1', 'alice', 10, 'WALLS', :snake, :food, 'UP', 'PLAYING')"
+            ),
+            {"snake": '[{"x": 1, "y": 1}]', "food": '{"x": 2, "y": 2}'}
+        )
+
+    migrations.upgrade(url)
+    inspector = inspect(engine)
+    assert {"snake_cells", "food_cell"} <= {c["name"] for c in inspector.get_columns("live_players")}
+    assert inspector.has_table("leaderboard_best")
+    assert "ix_rpg_leaderboard_level_score_time" in {i["name"] for i in inspector.get_indexes("rpg_leaderboard")}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT username FROM live_players")).scalar() == "alice"
+    engine.dispose()
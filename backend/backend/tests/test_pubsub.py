@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from pubsub import Broker, Bus, LocalBus, RedisBus, create_bus, encode_command, read_reply
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"unix://{tmp_path}/bus.sock"
+
+
+def test_local_bus_delivers_to_subscribers():
+    bus = LocalBus()
+    received = []
+    bus.subscribe("scores", received.append)
+    bus.publish("scores", b"one")
+    bus.publish("other", b"two")
+    assert received == [b"one"]
+    assert (bus.published, bus.received) == (2, 2)
+
+
+def test_bus_must_define_publish():
+    class Incomplete(Bus):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_create_bus():
+    assert isinstance(create_bus(""), LocalBus)
+    assert isinstance(create_bus("redis://localhost:6379"), RedisBus)
+
+
+def test_reply_parsing():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"+OK\r\n-ERR nope\r\n:3\r\n$-1\r\n" + encode_command("message", "ch", b"\x00\r\n"))
+        reader.feed_eof()
+        return [await read_reply(reader) for _ in range(5)]
+
+    ok, error, count, null, message = asyncio.run(run())
+    assert (ok, str(error), count, null) == ("OK", "ERR nope", 3, None)
+    assert message == [b"message", b"ch", b"\x00\r\n"]
+
+
+def test_redis_bus_through_broker(url):
+    async def run():
+        broker = Broker()
+        await broker.start(url)
+        first, second = RedisBus(url), RedisBus(url)
+        seen_first, seen_second = [], []
+        first.subscribe("players", seen_first.append)
+        second.subscribe("players", seen_second.append)
+        second.subscribe("scores", seen_second.append)
+        await first.start()
+        await second.start()
+        assert first.connected and second.connected
+
+        first.publish("players", b"moved")
+        first.publish("scores", b"\x00binary\r\n")
+        await wait_for(lambda: len(seen_second) == 2)
+        # Publishers hear their own messages; skipping them is up to the caller
+        await wait_for(lambda: seen_first == [b"moved"])
+
+        await first.close()
+        await second.close()
+        await broker.close()
+        return seen_second, broker.published
+
+    seen, published = asyncio.run(run())
+    assert seen == [b"moved", b"\x00binary\r\n"]
+    assert published == 2
+
+
+def test_redis_bus_reconnects(url, monkeypatch):
+    monkeypatch.setattr("pubsub.RECONNECT_DELAY", 0.01)
+
+    async def run():
+        broker = Broker()
+        await broker.start(url)
+        bus = RedisBus(url)
+        received, reconnects = [], []
+        bus.subscribe("players", received.append)
+        bus.on_reconnect = lambda: reconnects.append(True)
+        await bus.start()
+
+        await broker.close()
+        await wait_for(lambda: not bus.connected)
+        bus.publish("players", b"lost")
+        assert bus.dropped == 1
+
+        broker = Broker()
+        await broker.start(url)
+        await wait_for(lambda: bus.connected)
+        bus.publish("players", b"delivered")
+        await wait_for(lambda: received == [b"delivered"])
+
+        await bus.close()
+        await broker.close()
+        return reconnects
+
+    assert asyncio.run(run()) == [True]
+
+
+def test_start_does_not_wait_for_missing_broker(url, monkeypatch):
+    monkeypatch.setattr("pubsub.RECONNECT_DELAY", 0.01)
+
+    async def run():
+        bus = RedisBus(url)
+        reconnects = []
+        bus.on_reconnect = lambda: reconnects.append(True)
+        await bus.start()
+        connected = bus.connected
+        bus.publish("players", b"nobody")
+
+        # Connecting late means messages were missed, like a reconnect
+        broker = Broker()
+        await broker.start(url)
+        await wait_for(lambda: bus.connected)
+        await bus.close()
+        await broker.close()
+        return connected, bus.dropped, reconnects
+
+    assert asyncio.run(run()) == (False, 1, [True])
@@ -0,0 +1,111 @@
+from datetime import datetime
+import random
+from types import SimpleNamespace
+import rank_index
+from rank_index import RankIndex, RankedBoard, RankedEntry, window_start
+
+def _entry(entry_id, user_id, score, time_seconds=None):
+    return RankedEntry(entry_id, user_id, f"user{user_id}", score, "walls", time_seconds, datetime(2024, 1, 1))
+
+def test_top_orders_by_score_then_insertion():
+    board = RankedBoard()
+    for entry in [_entry(1, 1, 100), _entry(2, 2, 300), _entry(3, 3, 100), _entry(4, 4, 200)]:
+        board.add(entry)
+    assert [entry.id for entry in board.top(10)] == [2, 4, 1, 3]
+    assert [entry.id for entry in board.top(2)] == [2, 4]
+
+def test_time_breaks_ties():
+    board = RankedBoard()
+    board.add(_entry(1, 1, 500, time_seconds=90.0))
+    board.add(_entry(2, 2, 500, time_seconds=60.0))
+    board.add(_entry(3, 3, 400, time_seconds=10.0))
+    assert [entry.id for entry in board.top(3)] == [2, 1, 3]
+
+def test_rank_uses_best_entry():
+    board = RankedBoard()
+    board.add(_entry(1, 1, 100))
+    board.add(_entry(2, 2, 200))
+    board.add(_entry(3, 1, 300))
+    assert board.rank_of(1) == 1
+    assert board.rank_of(2) == 2
+    assert board.rank_of(99) is None
+
+def test_around_is_clamped_to_board():
+    board = RankedBoard()
+    for user_id in range(10):
+        board.add(_entry(user_id, user_id, 1000 - user_id))
+    rank, first_rank, entries = board.around(0, 2)
+    assert (rank, first_rank) == (1, 1)
+    assert [entry.user_id for entry in entries] == [0, 1, 2]
+    rank, first_rank, entries = board.around(5, 2)
+    assert (rank, first_rank) == (6, 4)
+    assert [entry.user_id for entry in entries] == [3, 4, 5, 6, 7]
+
+def test_duplicate_add_is_ignored():
+    board = RankedBoard()
+    board.add(_entry(1, 1, 100))
+    board.add(_entry(1, 1, 100))
+    assert len(board) == 1
+
+def test_page_after_cursor():
+    board = RankedBoard()
+    for n, score in enumerate([500, 400, 400, 400, 300, 200], start=1):
+        board.add(_entry(n, n, score))
+    first = board.page(None, 3)
+    assert [entry.id for entry in first] == [1, 2, 3]
+    second = board.page((first[-1].score, first[-1].id), 3)
+    assert [entry.id for entry in second] == [4, 5, 6]
+    assert board.page((200, 6), 3) == []
+
+def test_window_start():
+    now = datetime(2024, 5, 16, 13, 45)  # A Thursday
+    assert window_start("day", now) == datetime(2024, 5, 16)
+    assert window_start("week", now) == datetime(2024, 5, 13)
+
+def test_window_rollups_roll_over(monkeypatch):
+    clock = SimpleNamespace(now=datetime(2024, 5, 16, 23, 0))
+    monkeypatch.setattr(rank_index, "datetime", SimpleNamespace(utcnow=lambda: clock.now))
+
+    index = RankIndex()
+    index.load(SimpleNamespace(execute=lambda statement: []))
+    for n, (date, score) in enumerate([
+        (datetime(2024, 5, 12, 12), 900),  # Last week
+        (datetime(2024, 5, 14, 12), 800),  # This week
+        (datetime(2024, 5, 16, 12), 100),  # Today
+        (datetime(2024, 5, 16, 22), 200),  # Today, just before midnight
+    ], start=1):
+        index.add_leaderboard_entry(SimpleNamespace(
+            id=n, user_id=n, username="u", score=score, mode="walls", date=date
+        ))
+    assert [e.score for e in index.leaderboard_page(None, None, 10, "day")] == [200, 100]
+    assert [e.score for e in index.leaderboard_page("walls", None, 10, "week")] == [800, 200, 100]
+    assert len(index.leaderboard_page(None, None, 10)) == 4
+
+    clock.now = datetime(2024, 5, 17, 0, 30)
+    assert index.leaderboard_page(None, None, 10, "day") == []
+    index.add_leaderboard_entry(SimpleNamespace(
+        id=5, user_id=5, username="u", score=50, mode="walls", date=clock.now
+    ))
+    assert [e.score for e in index.leaderboard_page(None, None, 10, "day")] == [50]
+    assert len(index.leaderboard_page(None, None, 10, "week")) == 4
+
+def test_blocks_match_sorted_list(monkeypatch):
+    monkeypatch.setattr(rank_index, "BLOCK_SIZE", 4)
+    generator = random.Random(6)
+    board = RankedBoard()
+    expected = []
+    for entry_id in range(300):
+        entry = _entry(entry_id, generator.randrange(40), generator.randrange(50))
+        board.add(entry)
+        expected.append(entry)
+    expected.sort(key=RankedBoard.key)
+    assert len(board) == 300
+    assert board.top(300) == expected
+    for position in (0, 1, 7, 150, 298):
+        cursor = (expected[position].score, expected[position].id)
+        assert board.page(cursor, 5) == expected[position + 1:position + 6]
+    for user_id in range(40):
+        best = next((n for n, entry in enumerate(expected) if entry.user_id == user_id), None)
+        assert board.rank_of(user_id) == (None if best is None else best + 1)
+    odd = board.filtered(lambda entry: entry.id % 2)
+    assert odd.top(300) == [entry for entry in expected if entry.id % 2]
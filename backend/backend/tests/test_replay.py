@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import replay
+from game_engine import SnakeGame
+from replay import ReplayRejected, ReplayVerifier, VerifierBusy, replay_hash
+
+def play_greedy(seed, ticks, mode="pass-through"):
+    """Steer towards the food, recording the turns made."""
+    game = SnakeGame.new("game", user_id=1, username="bot", mode=mode, seed=seed)
+    inputs = []
+    for tick in range(ticks):
+        (x, y), (fx, fy) = game.state.snake[0], game.state.food
+        wanted = "RIGHT" if fx > x else "LEFT" if fx < x else "DOWN" if fy > y else "UP"
+        if game.turn(wanted):
+            inputs.append((tick, wanted))
+        game.step()
+        if game.state.status != "playing":
+            break
+    return inputs, game.state.score
+
+def test_replay_reproduces_game():
+    inputs, score = play_greedy(seed=5, ticks=400)
+    assert score > 0
+    result = replay.replay("pass-through", 5, 400, inputs)
+    assert result.score == score
+    assert replay.replay("pass-through", 6, 400, inputs).score != score
+
+def test_replay_stops_at_game_over():
+    result = replay.replay("walls", 1, 1000, [])
+    assert result.status == "game-over"
+    assert result.ticks < 30
+
+@pytest.mark.parametrize("inputs", [[(5, "UP"), (3, "LEFT")], [(100, "UP")]])
+def test_rejects_bad_input_ticks(inputs):
+    with pytest.raises(ReplayRejected):
+        replay.replay("walls", 1, 100, inputs)
+
+def test_cpu_limit(monkeypatch):
+    monkeypatch.setattr(replay, "CPU_CHECK_INTERVAL", 1)
+    with pytest.raises(ReplayRejected):
+        replay.replay("pass-through", 1, 100, [], cpu_seconds=-1)
+
+def test_hash_depends_on_every_field():
+    base = replay_hash("walls", 1, 10, [(1, "UP")])
+    assert base == replay_hash("walls", 1, 10, [(1, "UP")])
+    assert len({
+        base,
+        replay_hash("pass-through", 1, 10, [(1, "UP")]),
+        replay_hash("walls", 2, 10, [(1, "UP")]),
+        replay_hash("walls", 1, 11, [(1, "UP")]),
+        replay_hash("walls", 1, 10, [(2, "UP")]),
+    }) == 5
+
+def test_verifier_runs_in_pool_and_caches():
+    verifier = ReplayVerifier(workers=1, max_queue=1)
+    inputs, score = play_greedy(seed=3, ticks=300)
+
+    async def run():
+        first = await verifier.verify("pass-through", 3, 300, inputs)
+        second = await verifier.verify("pass-through", 3, 300, inputs)
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        verifier.shutdown()
+    assert first == second
+    assert first.score == score
+    stats = verifier.stats()
+    assert (stats["completed"], stats["cache_hits"], stats["outstanding"]) == (1, 1, 0)
+    assert stats["ticks_total"] == first.ticks
+
+def test_cancelled_verify_holds_its_slot_until_the_replay_ends(monkeypatch):
+    release = threading.Event()
+    real_replay = replay.replay
+
+    def slow_replay(*args):
+        release.wait(2)
+        return real_replay(*args)
+
+    monkeypatch.setattr(replay, "replay", slow_replay)
+    verifier = ReplayVerifier(workers=1, max_queue=0)
+    verifier._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        caller = asyncio.ensure_future(verifier.verify("walls", 1, 10, []))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        await asyncio.sleep(0)
+        # The replay is still running, so the pool is still full
+        assert verifier.stats()["outstanding"] == 1
+        with pytest.raises(VerifierBusy):
+            await verifier.verify("walls", 2, 10, [])
+        release.set()
+        while verifier.stats()["outstanding"]:
+            await asyncio.sleep(0.01)
+        return await verifier.verify("walls", 2, 10, [])
+
+    try:
+        assert asyncio.run(run()).ticks > 0
+    finally:
+        verifier.shutdown()
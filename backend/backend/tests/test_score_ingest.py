@@ -0,0 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+import crud
+from score_ingest import ScoreBatcher
+
+@asynccontextmanager
+async def fake_session():
+    yield None
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Record the batches written instead of touching a database."""
+    batches = []
+
+    async def create(db, submissions):
+        batches.append(submissions)
+        if any(row["score"] < 0 for row in submissions):
+            raise ValueError("negative score")
+        return [dict(row, id=n) for n, row in enumerate(submissions)]
+
+    monkeypatch.setattr(crud, "async_create_leaderboard_entries", create)
+    return batches
+
+def run_submissions(batcher, scores):
+    async def run():
+        batcher.start(fake_session)
+        results = await asyncio.gather(
+            *(batcher.submit(1, "alice", score, "walls") for score in scores),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+    return asyncio.run(run())
+
+def test_concurrent_submissions_share_a_commit(writes):
+    batcher = ScoreBatcher(window=0.01, max_batch=100)
+    results = run_submissions(batcher, range(10))
+    assert len(writes) == 1
+    assert [result["score"] for result in results] == list(range(10))
+    assert batcher.stats()["largest_batch"] == 10
+
+def test_full_batches_are_written_immediately(writes):
+    batcher = ScoreBatcher(window=0.05, max_batch=4)
+    run_submissions(batcher, range(10))
+    assert [len(batch) for batch in writes] == [4, 4, 2]
+
+def test_failed_batch_retried_one_by_one(writes):
+    batcher = ScoreBatcher(window=0.01, max_batch=100)
+    results = run_submissions(batcher, [10, -1, 20])
+    assert isinstance(results[1], ValueError)
+    assert [results[0]["score"], results[2]["score"]] == [10, 20]
+    assert batcher.stats()["failed_batches"] == 1
+
+def test_not_running_until_started():
+    batcher = ScoreBatcher()
+    assert not batcher.running
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.submit(1, "alice", 10, "walls"))
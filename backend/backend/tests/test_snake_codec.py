@@ -0,0 +1,28 @@
+import pytest
+from live_state import LivePlayerState
+from models import GRID_SIZE
+import snake_codec
+
+def test_pack_cells_round_trip():
+    cells = [(0, 0), (24, 0), (0, 24), (24, 24), (12, 7)]
+    packed = snake_codec.pack_cells(cells)
+    assert len(packed) == 2 * len(cells)
+    assert snake_codec.unpack_cells(packed) == cells
+
+def test_pack_cell_is_grid_index():
+    assert snake_codec.pack_cell((3, 2)) == 2 * GRID_SIZE + 3
+    assert snake_codec.unpack_cell(2 * GRID_SIZE + 3) == (3, 2)
+
+def test_pack_cell_outside_grid():
+    with pytest.raises(ValueError):
+        snake_codec.pack_cell((GRID_SIZE, 0))
+    with pytest.raises(ValueError):
+        snake_codec.pack_cell((0, -1))
+
+def test_encode_players_round_trip():
+    players = [
+        LivePlayerState("a", "Ånaconda", 120, "walls", [(5, 5), (4, 5)], (9, 9), "RIGHT", "playing"),
+        LivePlayerState("b", "Mamba", -1, "pass-through", [(0, 0)], (1, 1), "UP", "game-over"),
+    ]
+    decoded = snake_codec.decode_players(snake_codec.encode_players(players))
+    assert decoded == [player.to_dict() for player in players]
@@ -0,0 +1,54 @@
+import random
+import pytest
+from game_engine import SnakeGame
+from models import GRID_SIZE
+from snake_kernel import GAME_OVER, PLAYING, BatchSimulation
+
+@pytest.mark.parametrize("mode", ["walls", "pass-through"])
+def test_matches_reference(mode):
+    """Random games step identically in the kernel and in SnakeGame."""
+    rng = random.Random(42)
+    sim = BatchSimulation(capacity=4, seed=42)  # Grows while adding
+    games = {}
+    for n in range(50):
+        game = SnakeGame.new(str(n), user_id=n, username="u", mode=mode, seed=n)
+        slot = sim.add(mode, list(game.state.snake), game.state.direction, game.state.food)
+        games[slot] = game
+
+    for _ in range(200):
+        for slot, game in games.items():
+            if rng.random() < 0.3:
+                direction = rng.choice(["UP", "DOWN", "LEFT", "RIGHT"])
+                game.turn(direction)
+                sim.turn(slot, direction)
+        sim.step()
+        for slot, game in games.items():
+            game.step()
+            # Food is random in both; keep the reference on the kernel's cell
+            game.state.food = sim.food_cell(slot)
+            assert sim.snake(slot) == list(game.state.snake)
+            assert sim.score[slot] == game.state.score
+            assert sim.status[slot] == (PLAYING if game.state.status == "playing" else GAME_OVER)
+
+def test_food_avoids_snake():
+    sim = BatchSimulation(capacity=1, seed=3)
+    cells = [(x, y) for y in range(GRID_SIZE) for x in range(GRID_SIZE)]
+    # A serpentine snake covering all but two cells, about to eat one of them
+    snake = []
+    for y in range(GRID_SIZE):
+        row = [(x, y) for x in range(GRID_SIZE)]
+        snake.extend(row if y % 2 else row[::-1])
+    slot = sim.add("walls", snake[2:], "RIGHT", snake[1])
+    sim.step()
+    assert sim.status[slot] == PLAYING
+    assert sim.food_cell(slot) == snake[0]
+    assert set(sim.snake(slot)) | {snake[0]} == set(cells)
+
+def test_remove_frees_slot():
+    sim = BatchSimulation(capacity=2)
+    first = sim.add("walls", [(5, 5), (4, 5)], "RIGHT", (0, 0))
+    sim.add("walls", [(5, 6), (4, 6)], "RIGHT", (0, 0))
+    sim.remove(first)
+    assert sim.running == 1
+    assert sim.add("walls", [(5, 7), (4, 7)], "RIGHT", (0, 0)) == first
+    assert sim.capacity == 2
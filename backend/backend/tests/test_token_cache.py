@@ -0,0 +1,31 @@
+import time
+from token_cache import VerifiedTokenCache
+
+def test_caches_until_expiry():
+    cache = VerifiedTokenCache(max_size=10, ttl=300)
+    claims = {"sub": "1", "exp": time.time() + 60}
+    assert cache.get("token") is None
+    cache.put("token", claims)
+    assert cache.get("token") == claims
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.put("expired", {"sub": "1", "exp": time.time() - 1})
+    assert cache.get("expired") is None
+
+def test_evicts_when_full():
+    cache = VerifiedTokenCache(max_size=10, ttl=300)
+    exp = time.time() + 60
+    for n in range(25):
+        cache.put(f"token-{n}", {"sub": str(n), "exp": exp})
+    assert len(cache._verified) <= 10
+    assert cache.get("token-24") is not None
+
+def test_revoke_by_jti():
+    cache = VerifiedTokenCache()
+    claims = {"sub": "1", "exp": time.time() + 60, "jti": "abc"}
+    cache.put("token", claims)
+    cache.revoke("token", claims)
+    assert cache.get("token") is None
+    assert cache.is_revoked("token", claims)
+    assert cache.is_revoked("other-encoding", claims)
+    assert not cache.is_revoked("token", {"sub": "1", "jti": "def"})
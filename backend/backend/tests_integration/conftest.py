@@ -5,14 +5,24 @@ Sets up test database and fixtures.
 import os
 import pytest
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 
 # Set test database URL
 os.environ["DATABASE_URL"] = "sqlite:///./test_db.db"
+# Tests drive server-side games by calling engine.tick() themselves
+os.environ["GAME_TICK_INTERVAL"] = "3600"
+# Rebuild /live-players snapshots as soon as anything changes
+os.environ["LIVE_SNAPSHOT_INTERVAL"] = "0"
 
-from database import Base, get_db
+from database import Base, get_db, get_async_db
 from main import app
+from leaderboard_cache import cache as leaderboard_cache
+from rank_index import index as rank_index
+from token_cache import token_cache
+from game_engine import engine as game_engine
 import crud
 from models import GameMode
 
@@ -20,6 +30,8 @@ from models import GameMode
 TEST_DATABASE_URL = "sqlite:///./test_db.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test_db.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 @pytest.fixture(scope="function")
 def db_session():
@@ -41,7 +53,17 @@ def client(db_session):
         finally:
             pass
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # Cached boards belong to whichever database the previous test used
+    leaderboard_cache.clear()
+    rank_index.reset()
+    token_cache.clear()
+    game_engine.reset()
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
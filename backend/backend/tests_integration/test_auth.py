@@ -2,8 +2,12 @@
 Integration tests for authentication endpoints.
 """
 import pytest
+from unittest.mock import patch
 from fastapi import status
 
+import crud
+from main import create_access_token
+
 def test_signup_success(client):
     """Test successful user registration."""
     response = client.post(
@@ -86,3 +90,37 @@ def test_logout(client, auth_headers):
     """Test logout."""
     response = client.post("/auth/logout", headers=auth_headers)
     assert response.status_code == status.HTTP_200_OK
+
+def test_logout_revokes_token(client, auth_headers):
+    """Test a token stops working once it has been logged out."""
+    assert client.get("/auth/me", headers=auth_headers).status_code == status.HTTP_200_OK
+    client.post("/auth/logout", headers=auth_headers)
+    response = client.get("/auth/me", headers=auth_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_token_carries_profile(client, auth_headers):
+    """Test score submission works from token claims without loading the user."""
+    with patch.object(crud, "async_get_user_by_id", side_effect=AssertionError("user lookup")):
+        response = client.post(
+            "/leaderboard",
+            json={"score": 120, "mode": "walls"},
+            headers=auth_headers
+        )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["username"] == "testuser"
+
+def test_token_without_profile_loads_user(client, test_user):
+    """Test tokens carrying only the user id still authenticate."""
+    token = create_access_token(data={"sub": str(test_user.id)})
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == "testuser"
+
+def test_stats_report_password_hashing(client, test_user):
+    """Test hashing metrics are exposed after a login."""
+    client.post("/auth/login", json={"email": "test@example.com", "password": "testpass123"})
+    response = client.get("/stats")
+    assert response.status_code == status.HTTP_200_OK
+    hashing = response.json()["password_hashing"]
+    assert hashing["completed"] >= 1
+    assert hashing["rejected"] == 0
@@ -0,0 +1,152 @@
+"""
+Integration tests for changes broadcast between API workers.
+"""
+import time
+from datetime import datetime
+
+from fastapi import status
+from jose import jwt
+
+import db_models
+import fast_json
+from cluster import cluster
+from game_engine import engine as game_engine
+from main import ALGORITHM, SECRET_KEY
+
+def broadcast_from_other_worker(channel: str, payload: dict):
+    """Deliver a message as if another worker had broadcast it."""
+    message = fast_json.dumps({"worker": "other-worker", "payload": payload})
+    cluster.bus.publish(cluster.prefix + channel, message)
+
+def sent_on(channel: str) -> list:
+    """Messages this worker publishes on ``channel`` from now on."""
+    sent = []
+    cluster.bus.subscribe(cluster.prefix + channel, lambda data: sent.append(fast_json.loads(data)))
+    return sent
+
+def wait_for_sent(sent: list, field: str) -> dict:
+    """The first payload with ``field`` this worker broadcast; broadcasts go
+    out on the bus' loop, and other ones may be in flight."""
+    deadline = time.monotonic() + 2
+    while True:
+        for message in sent:
+            if message["worker"] == cluster.worker_id and field in message["payload"]:
+                return message["payload"]
+        assert time.monotonic() < deadline, "nothing broadcast"
+        time.sleep(0.01)
+
+def test_leaderboard_entry_from_other_worker(client, db_session):
+    """Test an entry another worker wrote invalidates the cached board."""
+    assert client.get("/leaderboard").json() == []
+    entry = db_models.LeaderboardEntry(
+        user_id=7, username="Elsewhere", score=900, mode="walls", date=datetime.utcnow()
+    )
+    db_session.add(entry)
+    db_session.commit()
+    # Still the cached board: this worker hasn't heard about it yet
+    assert client.get("/leaderboard").json() == []
+
+    broadcast_from_other_worker("leaderboard", {"entries": [
+        [entry.id, 7, "Elsewhere", 900, "walls", entry.date.isoformat()]
+    ]})
+    data = client.get("/leaderboard").json()
+    assert [(row["username"], row["score"]) for row in data] == [("Elsewhere", 900)]
+    rank = client.get("/leaderboard/users/7").json()
+    assert rank["rank"] == 1
+
+def test_live_player_from_other_worker(client):
+    """Test players changed on another worker are served here."""
+    player = {
+        "id": "remote-1", "username": "Elsewhere", "score": 30, "mode": "walls",
+        "snake": [{"x": 3, "y": 3}, {"x": 2, "y": 3}], "food": {"x": 8, "y": 8},
+        "direction": "RIGHT", "status": "playing",
+    }
+    broadcast_from_other_worker("live-players", {"players": [["remote-1", player, 4, False]]})
+    response = client.get("/live-players/remote-1")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == player
+    assert client.get("/stats").json()["cluster"]["live_players_applied"] >= 1
+
+    broadcast_from_other_worker("live-players", {"players": [["remote-1", None, 0, False]]})
+    assert client.get("/live-players/remote-1").status_code == status.HTTP_404_NOT_FOUND
+
+def test_token_revoked_on_other_worker(client, auth_headers):
+    """Test a logout handled by another worker revokes the token here too."""
+    assert client.get("/auth/me", headers=auth_headers).status_code == status.HTTP_200_OK
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    broadcast_from_other_worker("revoked-tokens", {"key": claims["jti"], "expires": claims["exp"]})
+    assert client.get("/auth/me", headers=auth_headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_own_changes_are_broadcast(client):
+    """Test changes made here are sent to the other workers, not applied twice."""
+    before = client.get("/stats").json()["cluster"]
+    response = client.post("/live-players", json={
+        "id": "local-1", "username": "Here", "score": 0, "mode": "walls",
+        "snake": [{"x": 1, "y": 1}], "food": {"x": 5, "y": 5},
+        "direction": "UP", "status": "playing",
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    after = client.get("/stats").json()["cluster"]
+    assert after["sent"] == before["sent"] + 1
+    assert after["received"] == before["received"]
+    client.delete("/live-players/local-1")
+
+def test_game_commands_forwarded_to_owner(client, auth_headers):
+    """Test turns for a game another worker simulates are sent to that worker."""
+    player = {
+        "id": "remote-game", "username": "testuser", "score": 0, "mode": "walls",
+        "snake": [{"x": 3, "y": 3}], "food": {"x": 8, "y": 8},
+        "direction": "RIGHT", "status": "playing",
+    }
+    broadcast_from_other_worker("live-players", {"players": [["remote-game", player, 0, True]]})
+    sent = cluster.sent
+    response = client.post("/games/remote-game/direction", json={"direction": "UP"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert cluster.sent == sent + 1
+    # The other worker simulates it, so clients can't change it here either
+    response = client.put("/live-players/remote-game", json={**player, "score": 10})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    # Players this worker changed itself are never forwarded
+    broadcast_from_other_worker("live-players", {"players": [["remote-client", {**player, "id": "remote-client"}, 0, False]]})
+    client.put("/live-players/remote-client", json={**player, "id": "remote-client", "score": 10})
+    response = client.post("/games/remote-client/direction", json={"direction": "UP"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_game_commands_from_other_worker(client, auth_headers, test_user):
+    """Test the owning worker applies turns and stops forwarded to it."""
+    game = client.post("/games", json={"mode": "walls"}, headers=auth_headers).json()
+    broadcast_from_other_worker("games", {"game_id": game["id"], "user_id": test_user.id + 1, "direction": None})
+    assert game_engine.owns(game["id"])
+
+    broadcast_from_other_worker("games", {"game_id": game["id"], "user_id": test_user.id, "direction": "UP"})
+    game_engine.tick()
+    assert client.get(f"/live-players/{game['id']}").json()["direction"] == "UP"
+
+    broadcast_from_other_worker("games", {"game_id": game["id"], "user_id": test_user.id, "direction": None})
+    assert not game_engine.owns(game["id"])
+    assert client.get(f"/live-players/{game['id']}").status_code == status.HTTP_404_NOT_FOUND
+
+def test_revocation_missed_during_outage(client, auth_headers):
+    """Test a logout this worker missed is picked up when it resyncs."""
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    assert client.get("/auth/me", headers=auth_headers).status_code == status.HTTP_200_OK
+    sent = sent_on("revoked-tokens")
+
+    # Back on the bus, this worker asks the others for their deny-lists...
+    cluster.bus.on_reconnect()
+    assert wait_for_sent(sent, "resync") == {"revoked": [], "resync": True}
+    # ...and one of them answers with the revocation it missed
+    broadcast_from_other_worker("revoked-tokens", {"revoked": [[claims["jti"], claims["exp"]]]})
+    assert client.get("/auth/me", headers=auth_headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_revocations_sent_to_resyncing_worker(client, auth_headers):
+    """Test this worker answers another worker's resync with its deny-list."""
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    client.post("/auth/logout", headers=auth_headers)
+    sent = sent_on("revoked-tokens")
+
+    broadcast_from_other_worker("revoked-tokens", {"revoked": [], "resync": True})
+    assert wait_for_sent(sent, "revoked") == {"revoked": [[claims["jti"], claims["exp"]]]}
@@ -0,0 +1,143 @@
+"""
+Integration tests for server-simulated games.
+"""
+import asyncio
+from datetime import timedelta
+
+from fastapi import status
+
+import crud
+import main
+from game_engine import GAME_IDLE_TIMEOUT, MAX_GAMES_PER_USER, engine as game_engine
+from live_state import store
+from main import flush_live_players
+
+def start_game(client, auth_headers, mode="walls"):
+    response = client.post("/games", json={"mode": mode}, headers=auth_headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+def test_start_game_requires_auth(client):
+    """Test starting a game without authentication fails."""
+    response = client.post("/games", json={"mode": "walls"})
+    assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+def test_start_game_is_live(client, auth_headers):
+    """Test a started game shows up as a live player."""
+    game = start_game(client, auth_headers)
+    assert game["username"] == "testuser"
+    assert game["status"] == "playing"
+    assert len(game["snake"]) == 3
+
+    response = client.get(f"/live-players/{game['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["snake"] == game["snake"]
+
+def test_tick_applies_direction(client, auth_headers):
+    """Test direction changes take effect on the next tick."""
+    game = start_game(client, auth_headers)
+    head = game["snake"][0]
+    response = client.post(
+        f"/games/{game['id']}/direction", json={"direction": "UP"}, headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    game_engine.tick()
+    player = client.get(f"/live-players/{game['id']}").json()
+    assert player["direction"] == "UP"
+    assert player["snake"][0] == {"x": head["x"], "y": head["y"] - 1}
+
+def test_tick_reaches_spectators(client, auth_headers):
+    """Test spectators receive server-driven moves."""
+    game = start_game(client, auth_headers)
+    with client.websocket_connect("/ws/live-players") as websocket:
+        snapshot = websocket.receive_json()
+        assert [player["id"] for player in snapshot["players"]] == [game["id"]]
+        game_engine.tick()
+        update = websocket.receive_json()
+    assert update["type"] == "update"
+    assert update["players"][0]["snake"][0]["x"] == game["snake"][0]["x"] + 1
+
+def test_client_updates_rejected_for_server_games(client, auth_headers):
+    """Test clients cannot overwrite the state of a server-driven game."""
+    game = start_game(client, auth_headers)
+    response = client.put(f"/live-players/{game['id']}", json=game)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+def test_other_users_cannot_steer(client, auth_headers):
+    """Test only the owner can change a game's direction."""
+    game = start_game(client, auth_headers)
+    client.post(
+        "/auth/signup",
+        json={"username": "other", "email": "other@example.com", "password": "otherpass123"}
+    )
+    token = client.post(
+        "/auth/login", json={"email": "other@example.com", "password": "otherpass123"}
+    ).json()["token"]
+    response = client.post(
+        f"/games/{game['id']}/direction",
+        json={"direction": "UP"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_stop_game(client, auth_headers):
+    """Test abandoning a game removes it."""
+    game = start_game(client, auth_headers)
+    response = client.delete(f"/games/{game['id']}", headers=auth_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert client.get(f"/live-players/{game['id']}").status_code == status.HTTP_404_NOT_FOUND
+    assert client.delete(f"/games/{game['id']}", headers=auth_headers).status_code == status.HTTP_404_NOT_FOUND
+
+def test_game_over_stops_ticking(client, auth_headers):
+    """Test a game that hits the wall is finished and kept for spectators."""
+    game = start_game(client, auth_headers)
+    for _ in range(30):
+        game_engine.tick()
+    player = client.get(f"/live-players/{game['id']}").json()
+    assert player["status"] == "game-over"
+    assert game_engine.get(game["id"]) is None
+    # Still the server's result until it is removed
+    assert game_engine.owns(game["id"])
+    response = client.put(f"/live-players/{game['id']}", json={**player, "status": "playing"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = client.patch(f"/live-players/{game['id']}", json={"seq": 1, "food": [0, 0], "status": "playing"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+def test_recovered_games_are_finished(client, auth_headers, db_session):
+    """Test games running when the API restarted come back finished and server-owned."""
+    game = start_game(client, auth_headers)
+    flush_live_players()
+    store.load(crud.get_live_players(db_session))
+    game_engine.reset()
+    assert game_engine.end_orphaned() == [game["id"]]
+    player = client.get(f"/live-players/{game['id']}").json()
+    assert player["status"] == "game-over"
+    response = client.put(f"/live-players/{game['id']}", json={**player, "status": "playing"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+def test_idle_game_is_ended_then_reaped(client, auth_headers, monkeypatch):
+    """Test an abandoned game stops ticking and is reaped like any idle player."""
+    idle = start_game(client, auth_headers, mode="pass-through")
+    active = start_game(client, auth_headers, mode="pass-through")
+    game_engine.get(idle["id"]).last_input -= GAME_IDLE_TIMEOUT + 1
+    game_engine.tick()
+    assert client.get(f"/live-players/{idle['id']}").json()["status"] == "game-over"
+    assert game_engine.get(idle["id"]) is None
+    assert client.get(f"/live-players/{active['id']}").json()["status"] == "playing"
+    assert client.get("/stats").json()["game_engine"]["idle_ended"] == 1
+
+    # Ticks keep the running game fresh, but no longer the ended one
+    store.get(idle["id"]).last_updated -= timedelta(seconds=main.LIVE_PLAYERS_TTL + 1)
+    game_engine.tick()
+    assert asyncio.run(main.reap_live_players()) == [idle["id"]]
+    assert client.get(f"/live-players/{idle['id']}").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(f"/live-players/{active['id']}").status_code == status.HTTP_200_OK
+
+def test_games_per_user_are_capped(client, auth_headers):
+    """Test a user can't start unlimited server games."""
+    games = [start_game(client, auth_headers) for _ in range(MAX_GAMES_PER_USER)]
+    response = client.post("/games", json={"mode": "walls"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    client.delete(f"/games/{games[0]['id']}", headers=auth_headers)
+    start_game(client, auth_headers)
@@ -2,9 +2,14 @@
 Integration tests for leaderboard endpoints.
 """
 import pytest
+from datetime import datetime, timedelta
 from fastapi import status
 from models import GameMode
 import crud
+import db_models
+import replay
+from game_engine import SnakeGame
+from rank_index import index as rank_index
 
 def test_get_empty_leaderboard(client):
     """Test getting empty leaderboard."""
@@ -84,3 +89,293 @@ def test_submit_multiple_scores(client, auth_headers):
     response3 = client.get("/leaderboard")
     data = response3.json()
     assert len(data) == 2
+
+def test_leaderboard_etag_not_modified(client, db_session):
+    """Test repeat readers with a matching ETag get 304."""
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1000, GameMode.WALLS)
+
+    response = client.get("/leaderboard")
+    etag = response.headers["etag"]
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/leaderboard", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+
+def test_leaderboard_cache_invalidated_on_submit(client, auth_headers):
+    """Test a new score is visible and changes the ETag of affected boards."""
+    client.post("/leaderboard", headers=auth_headers, json={"score": 1000, "mode": "walls"})
+    walls = client.get("/leaderboard?mode=walls")
+    everything = client.get("/leaderboard")
+    pass_through = client.get("/leaderboard?mode=pass-through")
+
+    client.post("/leaderboard", headers=auth_headers, json={"score": 2000, "mode": "walls"})
+
+    response = client.get("/leaderboard?mode=walls", headers={"If-None-Match": walls.headers["etag"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert [entry["score"] for entry in response.json()] == [2000, 1000]
+
+    response = client.get("/leaderboard", headers={"If-None-Match": everything.headers["etag"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 2
+
+    response = client.get("/leaderboard?mode=pass-through", headers={"If-None-Match": pass_through.headers["etag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+def test_leaderboard_user_rank(client, db_session):
+    """Test looking up a user's rank and neighbours."""
+    for user_id, score in enumerate([500, 400, 300, 200, 100], start=1):
+        crud.create_leaderboard_entry(db_session, user_id, f"Player{user_id}", score, GameMode.WALLS)
+    crud.create_leaderboard_entry(db_session, 6, "Player6", 450, GameMode.PASS_THROUGH)
+
+    response = client.get("/leaderboard/users/3?mode=walls&radius=1")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["rank"] == 3
+    assert [(entry["rank"], entry["username"]) for entry in data["entries"]] == [
+        (2, "Player2"), (3, "Player3"), (4, "Player4")
+    ]
+
+    assert client.get("/leaderboard/users/3").json()["rank"] == 4
+
+def test_leaderboard_user_rank_unranked(client):
+    """Test rank lookup for a user without entries returns 404."""
+    response = client.get("/leaderboard/users/42")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_personal_best_leaderboard(client, db_session):
+    """Test best=true keeps only each user's best score per mode."""
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1000, GameMode.WALLS)
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1500, GameMode.WALLS)
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1200, GameMode.WALLS)
+    crud.create_leaderboard_entry(db_session, 2, "Player2", 1300, GameMode.WALLS)
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 900, GameMode.PASS_THROUGH)
+
+    response = client.get("/leaderboard?mode=walls&best=true")
+    assert response.status_code == status.HTTP_200_OK
+    assert [(entry["username"], entry["score"]) for entry in response.json()] == [
+        ("Player1", 1500), ("Player2", 1300)
+    ]
+    assert len(client.get("/leaderboard?best=true").json()) == 3
+    assert len(client.get("/leaderboard?mode=walls").json()) == 4
+
+def test_personal_best_rebuilt_from_history(client, db_session):
+    """Test the personal-best table can be backfilled from the history."""
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1000, GameMode.WALLS)
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1500, GameMode.WALLS)
+    db_session.query(db_models.LeaderboardBest).delete()
+    db_session.commit()
+    assert crud.personal_bests_missing(db_session)
+
+    crud.rebuild_personal_bests(db_session)
+    assert not crud.personal_bests_missing(db_session)
+    bests = crud.get_leaderboard_bests(db_session)
+    assert [(best.user_id, best.score) for best in bests] == [(1, 1500)]
+
+def test_submit_score_batch(client, auth_headers):
+    """Test several games are written by one batch request."""
+    response = client.post(
+        "/leaderboard/batch",
+        json=[
+            {"score": 100, "mode": "walls"},
+            {"score": 300, "mode": "walls"},
+            {"score": 200, "mode": "pass-through"},
+        ],
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [entry["score"] for entry in response.json()] == [100, 300, 200]
+    assert len({entry["id"] for entry in response.json()}) == 3
+
+    assert [entry["score"] for entry in client.get("/leaderboard").json()] == [300, 200, 100]
+    bests = client.get("/leaderboard", params={"mode": "walls", "best": True}).json()
+    assert [entry["score"] for entry in bests] == [300]
+
+def test_submit_score_batch_limits(client, auth_headers):
+    """Test empty and oversized batches are rejected."""
+    response = client.post("/leaderboard/batch", json=[], headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = client.post(
+        "/leaderboard/batch",
+        json=[{"score": 1, "mode": "walls"}] * 101,
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_single_submissions_are_group_committed(client, auth_headers):
+    """Test single submissions go through the group-commit queue."""
+    for score in (10, 20):
+        client.post("/leaderboard", json={"score": score, "mode": "walls"}, headers=auth_headers)
+    stats = client.get("/stats").json()["score_ingest"]
+    assert stats["submissions"] >= 2
+    assert stats["queued"] == 0
+
+def test_leaderboard_keyset_pages(client, db_session):
+    """Test following X-Next-Cursor walks the whole board exactly once."""
+    for n in range(25):
+        crud.create_leaderboard_entry(db_session, n, f"Player{n}", (n % 5) * 100, GameMode.WALLS)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/leaderboard", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert len(seen) == 25
+    assert len({entry["id"] for entry in seen}) == 25
+    assert [entry["score"] for entry in seen] == sorted((entry["score"] for entry in seen), reverse=True)
+
+def test_leaderboard_first_page_cursor(client, db_session):
+    """Test the cached default page still reports where the next page starts."""
+    for n in range(101):
+        crud.create_leaderboard_entry(db_session, n, f"Player{n}", n, GameMode.WALLS)
+    for _ in range(2):  # Built, then served from the cache
+        response = client.get("/leaderboard")
+        assert len(response.json()) == 100
+        cursor = response.headers["x-next-cursor"]
+    response = client.get("/leaderboard", params={"cursor": cursor})
+    assert [entry["score"] for entry in response.json()] == [0]
+    assert "x-next-cursor" not in response.headers
+
+def test_leaderboard_best_pages(client, db_session):
+    """Test personal-best boards page by cursor too."""
+    for n in range(5):
+        crud.create_leaderboard_entry(db_session, n, f"Player{n}", 100 * n, GameMode.WALLS)
+    first = client.get("/leaderboard", params={"best": True, "limit": 3})
+    assert [entry["score"] for entry in first.json()] == [400, 300, 200]
+    second = client.get(
+        "/leaderboard",
+        params={"best": True, "limit": 3, "cursor": first.headers["x-next-cursor"]}
+    )
+    assert [entry["score"] for entry in second.json()] == [100, 0]
+
+def test_leaderboard_invalid_cursor(client):
+    """Test a malformed cursor is rejected."""
+    response = client.get("/leaderboard", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_leaderboard_windows(client, db_session):
+    """Test day and week boards only include recent games."""
+    now = datetime.utcnow()
+    for days_ago, score in [(0, 100), (8, 900), (40, 1000)]:
+        db_session.add(db_models.LeaderboardEntry(
+            user_id=1, username="Player1", score=score, mode="walls",
+            date=now - timedelta(days=days_ago)
+        ))
+    db_session.commit()
+    rank_index.load(db_session)  # As on startup
+
+    day = client.get("/leaderboard", params={"window": "day"}).json()
+    assert [entry["score"] for entry in day] == [100]
+    week = client.get("/leaderboard", params={"window": "week", "mode": "walls"}).json()
+    assert [entry["score"] for entry in week] == [100]
+    everything = client.get("/leaderboard", params={"window": "all"}).json()
+    assert [entry["score"] for entry in everything] == [1000, 900, 100]
+
+    response = client.get("/leaderboard", params={"window": "day", "best": True})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def greedy_replay(seed, ticks):
+    """Inputs of a game steered straight at the food, and its replayed score."""
+    game = SnakeGame.new("game", user_id=1, username="bot", mode="pass-through", seed=seed)
+    inputs = []
+    for tick in range(ticks):
+        (x, y), (fx, fy) = game.state.snake[0], game.state.food
+        wanted = "RIGHT" if fx > x else "LEFT" if fx < x else "DOWN" if fy > y else "UP"
+        if game.turn(wanted):
+            inputs.append([tick, wanted])
+        game.step()
+    return inputs, replay.replay("pass-through", seed, ticks, inputs).score
+
+def issue_seed(client, auth_headers):
+    response = client.post("/leaderboard/verified/seeds", headers=auth_headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()["seed"]
+
+def test_submit_verified_score(client, auth_headers):
+    """Test a verified submission is scored by replaying it."""
+    seed = issue_seed(client, auth_headers)
+    inputs, score = greedy_replay(seed=seed, ticks=300)
+    assert score > 0
+    response = client.post(
+        "/leaderboard/verified",
+        json={"mode": "pass-through", "seed": seed, "ticks": 300, "inputs": inputs, "score": score},
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["score"] == score
+    assert client.get("/leaderboard").json()[0]["score"] == score
+
+    stats = client.get("/stats").json()["replay_verification"]
+    assert stats["completed"] >= 1
+
+def test_submit_verified_score_mismatch(client, auth_headers):
+    """Test a claimed score that the replay doesn't reach is rejected."""
+    seed = issue_seed(client, auth_headers)
+    inputs, score = greedy_replay(seed=seed, ticks=300)
+    response = client.post(
+        "/leaderboard/verified",
+        json={"mode": "pass-through", "seed": seed, "ticks": 300, "inputs": inputs, "score": score + 10},
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json()["detail"]["score"] == score
+    assert client.get("/leaderboard").json() == []
+
+def test_submit_verified_score_bad_log(client, auth_headers):
+    """Test malformed input logs are rejected."""
+    seed = issue_seed(client, auth_headers)
+    response = client.post(
+        "/leaderboard/verified",
+        json={"mode": "walls", "seed": seed, "ticks": 10, "inputs": [[20, "UP"]]},
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_verified_seed_is_single_use(client, auth_headers):
+    """Test the same game can't be submitted twice."""
+    seed = issue_seed(client, auth_headers)
+    inputs, score = greedy_replay(seed=seed, ticks=300)
+    submission = {"mode": "pass-through", "seed": seed, "ticks": 300, "inputs": inputs}
+    first = client.post("/leaderboard/verified", json=submission, headers=auth_headers)
+    assert first.status_code == status.HTTP_201_CREATED
+    again = client.post("/leaderboard/verified", json=submission, headers=auth_headers)
+    assert again.status_code == status.HTTP_409_CONFLICT
+    assert len(client.get("/leaderboard").json()) == 1
+
+def test_verified_seed_must_be_issued(client, auth_headers, db_session):
+    """Test seeds the client picked, or that expired, are refused before replaying."""
+    inputs, score = greedy_replay(seed=9, ticks=300)
+    submission = {"mode": "pass-through", "seed": 9, "ticks": 300, "inputs": inputs}
+    response = client.post("/leaderboard/verified", json=submission, headers=auth_headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    seed = issue_seed(client, auth_headers)
+    db_session.query(db_models.ReplaySeed).update({"issued_at": datetime.utcnow() - timedelta(days=1)})
+    db_session.commit()
+    inputs, score = greedy_replay(seed=seed, ticks=300)
+    response = client.post(
+        "/leaderboard/verified", json={**submission, "seed": seed, "inputs": inputs}, headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert client.get("/leaderboard").json() == []
+
+def test_read_paths_return_plain_rows(client, db_session):
+    """Test leaderboard reads return tuples without loading ORM instances."""
+    crud.create_leaderboard_entry(db_session, 1, "Player1", 1000, GameMode.WALLS)
+    crud.create_rpg_leaderboard_entry(db_session, 1, "Player1", 3, 500, 42.5)
+    db_session.expunge_all()
+
+    rows = crud.get_leaderboard(db_session, GameMode.WALLS)
+    bests = crud.get_leaderboard_bests(db_session, GameMode.WALLS)
+    rpg = crud.get_rpg_leaderboard(db_session, 3)
+    rpg_bests = crud.get_rpg_leaderboard_bests(db_session, 3)
+
+    assert rows == [crud.LeaderboardRow(rows[0].id, 1, "Player1", 1000, db_models.GameModeEnum.WALLS, rows[0].date)]
+    assert bests[0].entry_id == rows[0].id
+    assert (rpg[0].score, rpg[0].time_seconds, rpg[0].level_id) == (500, 42.5, 3)
+    assert rpg_bests[0].entry_id == rpg[0].id
+    assert len(db_session.identity_map) == 0
@@ -1,10 +1,19 @@
 """
 Integration tests for live players endpoints.
 """
+import asyncio
+import json
+from datetime import datetime, timedelta
+
 import pytest
 from fastapi import status
+from fastapi.testclient import TestClient
+from main import app
 from models import GameMode
 import crud
+import db_models
+import main
+import snake_codec
 
 def test_get_empty_live_players(client):
     """Test getting empty live players list."""
@@ -12,31 +21,29 @@ def test_get_empty_live_players(client):
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == []
 
-def test_get_live_players_with_data(client, db_session):
+def test_get_live_players_with_data(client):
     """Test getting live players."""
     # Create test live players
-    crud.create_live_player(
-        db_session,
-        player_id="player-1",
-        username="LivePlayer1",
-        score=100,
-        mode=GameMode.WALLS,
-        snake=[{"x": 10, "y": 10}, {"x": 9, "y": 10}],
-        food={"x": 15, "y": 15},
-        direction="RIGHT",
-        status="playing"
-    )
-    crud.create_live_player(
-        db_session,
-        player_id="player-2",
-        username="LivePlayer2",
-        score=200,
-        mode=GameMode.PASS_THROUGH,
-        snake=[{"x": 5, "y": 5}, {"x": 4, "y": 5}],
-        food={"x": 10, "y": 10},
-        direction="LEFT",
-        status="playing"
-    )
+    client.post("/live-players", json={
+        "id": "player-1",
+        "username": "LivePlayer1",
+        "score": 100,
+        "mode": "walls",
+        "snake": [{"x": 10, "y": 10}, {"x": 9, "y": 10}],
+        "food": {"x": 15, "y": 15},
+        "direction": "RIGHT",
+        "status": "playing"
+    })
+    client.post("/live-players", json={
+        "id": "player-2",
+        "username": "LivePlayer2",
+        "score": 200,
+        "mode": "pass-through",
+        "snake": [{"x": 5, "y": 5}, {"x": 4, "y": 5}],
+        "food": {"x": 10, "y": 10},
+        "direction": "LEFT",
+        "status": "playing"
+    })
     
     response = client.get("/live-players")
     assert response.status_code == status.HTTP_200_OK
@@ -45,19 +52,18 @@ def test_get_live_players_with_data(client, db_session):
     assert data[0]["username"] == "LivePlayer1"
     assert data[1]["username"] == "LivePlayer2"
 
-def test_get_live_player_by_id(client, db_session):
+def test_get_live_player_by_id(client):
     """Test getting specific live player by ID."""
-    crud.create_live_player(
-        db_session,
-        player_id="player-123",
-        username="TestPlayer",
-        score=500,
-        mode=GameMode.WALLS,
-        snake=[{"x": 10, "y": 10}],
-        food={"x": 5, "y": 5},
-        direction="UP",
-        status="playing"
-    )
+    client.post("/live-players", json={
+        "id": "player-123",
+        "username": "TestPlayer",
+        "score": 500,
+        "mode": "walls",
+        "snake": [{"x": 10, "y": 10}],
+        "food": {"x": 5, "y": 5},
+        "direction": "UP",
+        "status": "playing"
+    })
     
     response = client.get("/live-players/player-123")
     assert response.status_code == status.HTTP_200_OK
@@ -73,19 +79,18 @@ def test_get_nonexistent_live_player(client):
     response = client.get("/live-players/nonexistent-id")
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
-def test_live_player_data_structure(client, db_session):
+def test_live_player_data_structure(client):
     """Test that live player has correct data structure."""
-    crud.create_live_player(
-        db_session,
-        player_id="test-player",
-        username="StructureTest",
-        score=150,
-        mode=GameMode.PASS_THROUGH,
-        snake=[{"x": 1, "y": 2}, {"x": 1, "y": 1}],
-        food={"x": 5, "y": 5},
-        direction="DOWN",
-        status="playing"
-    )
+    client.post("/live-players", json={
+        "id": "test-player",
+        "username": "StructureTest",
+        "score": 150,
+        "mode": "pass-through",
+        "snake": [{"x": 1, "y": 2}, {"x": 1, "y": 1}],
+        "food": {"x": 5, "y": 5},
+        "direction": "DOWN",
+        "status": "playing"
+    })
     
     response = client.get("/live-players/test-player")
     assert response.status_code == status.HTTP_200_OK
@@ -105,3 +110,395 @@ def test_live_player_data_structure(client, db_session):
     assert isinstance(data["snake"], list)
     assert isinstance(data["food"], dict)
     assert data["mode"] in ["pass-through", "walls"]
+
+def _live_player_payload(player_id, score=0):
+    return {
+        "id": player_id,
+        "username": "Streamer",
+        "score": score,
+        "mode": "walls",
+        "snake": [{"x": 10, "y": 10}, {"x": 9, "y": 10}],
+        "food": {"x": 15, "y": 15},
+        "direction": "RIGHT",
+        "status": "playing"
+    }
+
+def test_create_and_update_live_player(client):
+    """Test creating and updating a live player through the API."""
+    response = client.post("/live-players", json=_live_player_payload("api-player"))
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.put("/live-players/api-player", json=_live_player_payload("api-player", score=30))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["score"] == 30
+    assert response.json()["snake"] == [{"x": 10, "y": 10}, {"x": 9, "y": 10}]
+
+def test_create_duplicate_live_player(client):
+    """Test creating a player with a taken id fails."""
+    client.post("/live-players", json=_live_player_payload("dup"))
+    response = client.post("/live-players", json=_live_player_payload("dup"))
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+def test_live_players_written_behind(client, db_session):
+    """Test live player changes reach the table only when flushed."""
+    client.post("/live-players", json=_live_player_payload("flushed"))
+    client.post("/live-players", json=_live_player_payload("removed"))
+    assert crud.get_live_players(db_session) == []
+
+    assert main.flush_live_players() == 2
+    client.put("/live-players/flushed", json=_live_player_payload("flushed", score=70))
+    client.delete("/live-players/removed")
+    assert main.flush_live_players() == 2
+
+    db_session.expire_all()
+    players = crud.get_live_players(db_session)
+    assert [player.id for player in players] == ["flushed"]
+    assert players[0].score == 70
+    assert snake_codec.unpack_cells(players[0].snake_cells) == [(10, 10), (9, 10)]
+    assert snake_codec.unpack_cell(players[0].food_cell) == (15, 15)
+
+def test_live_players_recovered_on_startup(client, db_session):
+    """Test live players in the table are loaded when the app starts."""
+    crud.create_live_player(
+        db_session,
+        player_id="recovered",
+        username="Recovered",
+        score=40,
+        mode=GameMode.PASS_THROUGH,
+        snake=[{"x": 3, "y": 3}],
+        food={"x": 4, "y": 4},
+        direction="LEFT",
+        status="playing"
+    )
+
+    with TestClient(app) as restarted:
+        response = restarted.get("/live-players/recovered")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["score"] == 40
+    assert response.json()["mode"] == "pass-through"
+
+def test_live_player_outside_grid_clamped(client):
+    """Test cells past the walls (invincible snakes) are pinned to the edge."""
+    payload = _live_player_payload("off-grid")
+    payload["snake"] = [{"x": 25, "y": 0}, {"x": 24, "y": -1}]
+    response = client.post("/live-players", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["snake"] == [{"x": 24, "y": 0}, {"x": 24, "y": 0}]
+
+def test_live_player_fields_fit_binary_encoding(client):
+    """Test values the packed encoding can't hold are rejected, not served as 500s."""
+    too_big = [
+        {"score": 2**31},
+        {"score": -1},
+        {"username": "x" * 65},
+        {"id": "x" * 129},
+        {"snake": [{"x": 1, "y": 1}] * 626},
+    ]
+    for fields in too_big:
+        response = client.post("/live-players", json={**_live_player_payload("bounded"), **fields})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY, fields
+    client.post("/live-players", json=_live_player_payload("bounded", score=2**31 - 1))
+    response = client.get("/live-players", headers={"Accept": "application/octet-stream"})
+    assert response.status_code == status.HTTP_200_OK
+
+def test_get_live_players_binary(client):
+    """Test the packed binary representation matches the JSON one."""
+    client.post("/live-players", json=_live_player_payload("binary-1"))
+    client.post("/live-players", json=_live_player_payload("binary-2", score=20))
+
+    response = client.get("/live-players", headers={"Accept": "application/octet-stream"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert snake_codec.decode_players(response.content) == client.get("/live-players").json()
+
+    response = client.get("/live-players/binary-2", headers={"Accept": "application/octet-stream"})
+    player, _ = snake_codec.decode_player(response.content)
+    assert player == client.get("/live-players/binary-2").json()
+
+def test_live_players_ws_snapshot(client, db_session):
+    """Test the WebSocket snapshot comes from memory, not a per-connection query."""
+    crud.create_live_player(
+        db_session,
+        player_id="existing",
+        username="Existing",
+        score=10,
+        mode=GameMode.WALLS,
+        snake=[{"x": 1, "y": 1}],
+        food={"x": 2, "y": 2},
+        direction="UP",
+        status="playing"
+    )
+    client.post("/live-players", json=_live_player_payload("ws-player"))
+
+    with client.websocket_connect("/ws/live-players") as websocket:
+        message = websocket.receive_json()
+        assert message["type"] == "snapshot"
+        assert [player["id"] for player in message["players"]] == ["ws-player"]
+
+def test_live_players_ws_pushes_changes(client):
+    """Test the WebSocket pushes only changed and removed players."""
+    client.post("/live-players", json=_live_player_payload("quiet"))
+    client.post("/live-players", json=_live_player_payload("busy"))
+
+    with client.websocket_connect("/ws/live-players") as websocket:
+        assert len(websocket.receive_json()["players"]) == 2
+
+        client.put("/live-players/busy", json=_live_player_payload("busy", score=50))
+        message = websocket.receive_json()
+        assert message["type"] == "update"
+        assert [player["id"] for player in message["players"]] == ["busy"]
+        assert message["players"][0]["score"] == 50
+
+        client.delete("/live-players/busy")
+        message = websocket.receive_json()
+        assert message["players"] == []
+        assert message["removed"] == ["busy"]
+
+def test_apply_live_player_delta(client):
+    """Test a delta moves the stored snake without re-sending the body."""
+    client.post("/live-players", json=_live_player_payload("delta"))
+
+    response = client.patch("/live-players/delta", json={
+        "seq": 1,
+        "heads": [[11, 10], [12, 10]],
+        "dropped": 1,
+        "food": [3, 3],
+        "score": 10
+    })
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    data = client.get("/live-players/delta").json()
+    assert data["snake"] == [{"x": 12, "y": 10}, {"x": 11, "y": 10}, {"x": 10, "y": 10}]
+    assert data["food"] == {"x": 3, "y": 3}
+    assert data["score"] == 10
+    assert data["direction"] == "RIGHT"
+
+def test_out_of_order_delta_rejected(client):
+    """Test replayed or skipped deltas are rejected with the expected seq."""
+    client.post("/live-players", json=_live_player_payload("ordered"))
+    delta = {"seq": 1, "heads": [[11, 10]], "dropped": 1, "food": [3, 3]}
+    assert client.patch("/live-players/ordered", json=delta).status_code == status.HTTP_204_NO_CONTENT
+
+    response = client.patch("/live-players/ordered", json=delta)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"]["expected"] == 2
+
+    response = client.patch("/live-players/ordered", json={**delta, "seq": 3})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert client.get("/live-players/ordered").json()["snake"][0] == {"x": 11, "y": 10}
+
+def test_full_update_resyncs_deltas(client):
+    """Test a client whose delta was stale resyncs with a full PUT."""
+    client.post("/live-players", json=_live_player_payload("resync"))
+    delta = {"seq": 1, "heads": [[11, 10]], "dropped": 1, "food": [3, 3]}
+    client.patch("/live-players/resync", json=delta)
+    response = client.patch("/live-players/resync", json={**delta, "seq": 5})
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    payload = _live_player_payload("resync", score=20)
+    payload["snake"] = [{"x": 4, "y": 4}, {"x": 3, "y": 4}]
+    response = client.put("/live-players/resync", params={"seq": 5}, json=payload)
+    assert response.status_code == status.HTTP_200_OK
+    response = client.patch("/live-players/resync", json={**delta, "seq": 6, "heads": [[5, 4]]})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert client.get("/live-players/resync").json()["snake"] == [{"x": 5, "y": 4}, {"x": 4, "y": 4}]
+
+    # Without a seq, deltas start over from 1
+    client.put("/live-players/resync", json=payload)
+    assert client.patch("/live-players/resync", json=delta).status_code == status.HTTP_204_NO_CONTENT
+
+def test_delta_cannot_empty_snake(client):
+    """Test a delta dropping every cell is rejected."""
+    client.post("/live-players", json=_live_player_payload("short"))
+    response = client.patch("/live-players/short", json={"seq": 1, "dropped": 2, "food": [3, 3]})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_delta_for_unknown_player(client):
+    """Test a delta for a missing player returns 404."""
+    response = client.patch("/live-players/missing", json={"seq": 1, "food": [3, 3]})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_stale_live_players_reaped(client, db_session):
+    """Test players idle past the TTL are removed from memory and the table."""
+    client.post("/live-players", json=_live_player_payload("abandoned"))
+    client.post("/live-players", json=_live_player_payload("active"))
+    main.flush_live_players()
+    idle_since = datetime.utcnow() - timedelta(seconds=main.LIVE_PLAYERS_TTL + 1)
+    main.store.get("abandoned").last_updated = idle_since
+    # A row no worker holds any more, e.g. from a crashed process
+    crud.create_live_player(
+        db_session,
+        player_id="orphan",
+        username="Orphan",
+        score=0,
+        mode=GameMode.WALLS,
+        snake=[{"x": 3, "y": 3}],
+        food={"x": 4, "y": 4},
+        direction="LEFT",
+        status="playing"
+    )
+    db_session.query(db_models.LivePlayer).filter_by(id="orphan").update({"last_updated": idle_since})
+    db_session.commit()
+
+    assert asyncio.run(main.reap_live_players()) == ["abandoned"]
+    assert client.get("/live-players/abandoned").status_code == status.HTTP_404_NOT_FOUND
+    assert [player["id"] for player in client.get("/live-players").json()] == ["active"]
+
+    main.flush_live_players()
+    db_session.expire_all()
+    assert [player.id for player in crud.get_live_players(db_session)] == ["active"]
+
+    stats = client.get("/stats").json()["live_players"]
+    assert stats["active"] == 1
+    assert stats["reaped"] >= 1
+    assert stats["stale_rows_deleted"] >= 1
+
+def test_live_players_summary(client):
+    """Test the summary projection leaves out the board."""
+    client.post("/live-players", json=_live_player_payload("summary", score=30))
+
+    response = client.get("/live-players", params={"fields": "summary"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [
+        {"id": "summary", "username": "Streamer", "score": 30, "mode": "walls", "status": "playing"}
+    ]
+
+def test_live_players_filtered_and_sorted(client):
+    """Test filtering by mode and ordering by score."""
+    for player_id, score, mode in [("a", 10, "walls"), ("b", 30, "walls"), ("c", 20, "pass-through"), ("d", 30, "walls")]:
+        payload = _live_player_payload(player_id, score=score)
+        payload["mode"] = mode
+        client.post("/live-players", json=payload)
+
+    ids = lambda response: [player["id"] for player in response.json()]
+    assert ids(client.get("/live-players")) == ["a", "b", "c", "d"]
+    assert ids(client.get("/live-players", params={"sort": "score"})) == ["b", "d", "c", "a"]
+    assert ids(client.get("/live-players", params={"mode": "walls", "sort": "score"})) == ["b", "d", "a"]
+
+def test_live_players_paginated(client):
+    """Test cursor pages cover every player once, in order."""
+    for i in range(7):
+        client.post("/live-players", json=_live_player_payload(f"page-{i}", score=(i % 3) * 10))
+
+    for sort in ("id", "score"):
+        expected = [player["id"] for player in client.get("/live-players", params={"sort": sort}).json()]
+        seen = []
+        params = {"sort": sort, "fields": "summary", "limit": 3}
+        while True:
+            response = client.get("/live-players", params=params)
+            seen += [player["id"] for player in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        assert seen == expected
+
+    response = client.get("/live-players", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_stream_unknown_player(client):
+    """Test streaming a missing player returns 404."""
+    response = client.get("/live-players/missing/stream")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_stream_sends_updates_until_removed(client):
+    """Test a spectator stream relays real updates, then the removal."""
+    client.post("/live-players", json=_live_player_payload("streamed"))
+    player = main.store.get("streamed")
+
+    async def watch():
+        channel = main.hub.watch("streamed")
+        events = main.live_player_events(player.id, channel)
+        try:
+            first = await events.__anext__()
+            main.hub.publish({**player.to_dict(), "score": 10})
+            second = await events.__anext__()
+            main.hub.remove("streamed")
+            third = await events.__anext__()
+            remaining = [event async for event in events]
+        finally:
+            main.hub.unwatch("streamed", channel)
+        return first, second, third, remaining
+
+    first, second, third, remaining = asyncio.run(watch())
+    assert first.startswith("event: player\ndata: ")
+    assert json.loads(first.split("data: ", 1)[1])["score"] == 0
+    assert json.loads(second.split("data: ", 1)[1])["score"] == 10
+    assert third == 'event: removed\ndata: "streamed"\n\n'
+    assert remaining == []
+    assert main.hub.watcher_count == 0
+
+def test_stream_of_player_removed_before_joining(client):
+    """Test a player removed between the 404 check and joining its channel
+    ends the stream rather than leaving it waiting for changes forever."""
+    client.post("/live-players", json=_live_player_payload("gone"))
+
+    async def watch():
+        main.store.delete("gone")
+        main.hub.remove("gone")
+        channel = main.hub.watch("gone")
+        try:
+            return [event async for event in main.live_player_events("gone", channel)]
+        finally:
+            main.hub.unwatch("gone", channel)
+
+    assert asyncio.run(watch()) == ['event: removed\ndata: "gone"\n\n']
+
+def test_slow_stream_gets_latest_frame_only(client):
+    """Test a watcher that falls behind skips straight to the newest frame."""
+    client.post("/live-players", json=_live_player_payload("busy"))
+    player = main.store.get("busy")
+
+    async def watch():
+        channel = main.hub.watch("busy")
+        events = main.live_player_events(player.id, channel)
+        try:
+            await events.__anext__()
+            for score in range(1, 101):
+                main.hub.publish({**player.to_dict(), "score": score})
+            latest = await events.__anext__()
+            pending = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0.05)
+            stalled = not pending.done()
+            pending.cancel()
+        finally:
+            main.hub.unwatch("busy", channel)
+        return latest, stalled, channel.frame
+
+    latest, stalled, frame = asyncio.run(watch())
+    assert json.loads(latest.split("data: ", 1)[1])["score"] == 100
+    assert stalled
+    assert json.loads(frame)["score"] == 100
+
+def test_live_players_snapshot_etag(client):
+    """Test polls share one encoded snapshot and revalidate with its ETag."""
+    client.post("/live-players", json=_live_player_payload("polled"))
+
+    first = client.get("/live-players")
+    etag = first.headers["ETag"]
+    builds = main.live_snapshots.builds
+    second = client.get("/live-players")
+    assert second.headers["ETag"] == etag
+    assert second.content == first.content
+    assert main.live_snapshots.builds == builds
+
+    response = client.get("/live-players", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.put("/live-players/polled", json=_live_player_payload("polled", score=50))
+    response = client.get("/live-players", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["score"] == 50
+
+def test_live_players_gzip(client):
+    """Test gzip-accepting pollers get the compressed snapshot."""
+    for i in range(20):
+        client.post("/live-players", json=_live_player_payload(f"gz-{i}"))
+
+    plain = client.get("/live-players", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/live-players", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+    # httpx decompresses transparently
+    assert compressed.json() == plain.json()
+    assert int(compressed.headers["Content-Length"]) < len(plain.content)
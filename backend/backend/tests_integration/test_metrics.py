@@ -0,0 +1,57 @@
+"""
+Integration tests for the Prometheus metrics endpoint.
+"""
+from fastapi import status
+
+import metrics
+
+
+def test_metrics_exposition(client):
+    """Test /metrics serves the text format with the built-in metrics."""
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert "# TYPE live_players_active gauge" in response.text
+    assert "# TYPE token_cache_hits_total counter" in response.text
+
+def test_request_latency_labelled_by_route_template(client):
+    """Test requests are labelled with the route template, not the raw path."""
+    labels = ("GET", "/live-players/{player_id}", "404")
+    before = metrics.http_request_duration.count(*labels)
+    client.get("/live-players/missing-1")
+    client.get("/live-players/missing-2")
+    client.get("/no-such-route")
+
+    assert metrics.http_request_duration.count(*labels) == before + 2
+    text = client.get("/metrics").text
+    assert 'route="/live-players/{player_id}",status="404"' in text
+    assert 'route="unmatched",status="404"' in text
+    assert "/live-players/missing-1" not in text
+
+def test_submission_metrics(client, auth_headers):
+    """Test leaderboard submissions are counted by mode."""
+    submitted = metrics.scores_submitted.value("walls")
+
+    response = client.post("/leaderboard", json={"score": 50, "mode": "walls"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    assert metrics.scores_submitted.value("walls") == submitted + 1
+    text = client.get("/metrics").text
+    assert 'scores_submitted_total{mode="walls"}' in text
+
+def test_live_player_gauge(client):
+    """Test business gauges are read when scraped."""
+    client.post("/live-players", json={
+        "id": "metrics-player",
+        "username": "Gauge",
+        "score": 0,
+        "mode": "walls",
+        "snake": [{"x": 1, "y": 1}],
+        "food": {"x": 2, "y": 2},
+        "direction": "RIGHT",
+        "status": "playing"
+    })
+    lines = client.get("/metrics").text.splitlines()
+    active = [line for line in lines if line.startswith("live_players_active ")]
+    assert active and int(active[0].split()[1]) >= 1
@@ -0,0 +1,65 @@
+"""
+Integration tests for RPG leaderboard endpoints.
+"""
+import pytest
+from fastapi import status
+import crud
+
+def test_rpg_leaderboard_ordering(client, db_session):
+    """Test RPG entries rank by score, then by completion time."""
+    crud.create_rpg_leaderboard_entry(db_session, 1, "Slow", 1, 500, 90.0)
+    crud.create_rpg_leaderboard_entry(db_session, 2, "Fast", 1, 500, 45.5)
+    crud.create_rpg_leaderboard_entry(db_session, 3, "Low", 1, 300, 10.0)
+    crud.create_rpg_leaderboard_entry(db_session, 4, "OtherLevel", 2, 900, 10.0)
+
+    response = client.get("/rpg/leaderboard/1")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [(entry["rank"], entry["username"]) for entry in data] == [
+        (1, "Fast"), (2, "Slow"), (3, "Low")
+    ]
+
+    assert len(client.get("/rpg/leaderboard/1?limit=2").json()) == 2
+
+def test_submit_rpg_score(client, auth_headers):
+    """Test a submitted RPG score shows up on the level board."""
+    response = client.post(
+        "/rpg/leaderboard?level_id=3&score=750&time_seconds=42.5",
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["level_id"] == 3
+
+    data = client.get("/rpg/leaderboard/3").json()
+    assert data[0]["username"] == "testuser"
+    assert data[0]["score"] == 750
+
+def test_rpg_leaderboard_user_rank(client, db_session):
+    """Test looking up a user's rank on a level."""
+    for user_id, score in enumerate([900, 800, 700], start=1):
+        crud.create_rpg_leaderboard_entry(db_session, user_id, f"Player{user_id}", 5, score, 60.0)
+
+    response = client.get("/rpg/leaderboard/5/users/2?radius=0")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["rank"] == 2
+    assert [entry["username"] for entry in data["entries"]] == ["Player2"]
+
+    assert client.get("/rpg/leaderboard/5/users/9").status_code == status.HTTP_404_NOT_FOUND
+
+def test_rpg_leaderboard_invalid_level(client):
+    """Test level ids outside 1-20 are rejected."""
+    assert client.get("/rpg/leaderboard/21").status_code == status.HTTP_400_BAD_REQUEST
+
+def test_rpg_personal_best_leaderboard(client, db_session):
+    """Test best=true keeps each user's best run, faster time breaking ties."""
+    crud.create_rpg_leaderboard_entry(db_session, 1, "Player1", 4, 500, 80.0)
+    crud.create_rpg_leaderboard_entry(db_session, 1, "Player1", 4, 500, 60.0)
+    crud.create_rpg_leaderboard_entry(db_session, 1, "Player1", 4, 400, 30.0)
+    crud.create_rpg_leaderboard_entry(db_session, 2, "Player2", 4, 450, 50.0)
+
+    response = client.get("/rpg/leaderboard/4?best=true")
+    assert response.status_code == status.HTTP_200_OK
+    assert [(entry["username"], entry["score"], entry["time_seconds"]) for entry in response.json()] == [
+        ("Player1", 500, 60.0), ("Player2", 450, 50.0)
+    ]
@@ -0,0 +1,126 @@
+"""
+Cache of verified JWT claims and a deny-list of revoked tokens.
+
+Verifying a token's signature on every authenticated request is cheap but not
+free, and looking the user up afterwards is a database round-trip. Verified
+claims are cached by token until the token expires (capped by ``ttl``), and
+tokens carrying the username let callers skip the user lookup entirely.
+
+``/auth/logout`` revokes a token by adding its ``jti`` (or the token itself for
+tokens issued without one) to the deny-list until the token would have expired.
+Revocations are broadcast to the other workers, which add them to their own
+deny-lists. A worker that (re)starts, or reconnects to the bus after missing
+broadcasts, asks the others for their deny-lists (``resync``) and merges
+them, so a revoked token isn't accepted there until it expires.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cluster import cluster
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "300"))  # seconds
+
+CHANNEL = "revoked-tokens"
+
+
+class TokenUser(NamedTuple):
+    """The authenticated user, built from token claims without a DB lookup."""
+    id: int
+    username: str
+    email: str
+
+
+def revocation_key(token: str, claims: dict) -> str:
+    return claims.get("jti") or token
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: int = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # token -> (claims, cached until); insertion order doubles as age order
+        self._verified: Dict[str, Tuple[dict, float]] = {}
+        # jti (or token) -> token expiry
+        self._revoked: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        """Claims of a previously verified, unexpired and unrevoked token."""
+        cached = self._verified.get(token)
+        if cached is None or cached[1] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached[0]
+
+    def put(self, token: str, claims: dict) -> None:
+        now = time.time()
+        until = min(float(claims.get("exp", now)), now + self.ttl)
+        with self._lock:
+            if len(self._verified) >= self.max_size:
+                self._evict(now)
+            self._verified[token] = (claims, until)
+
+    def _evict(self, now: float) -> None:
+        expired = [token for token, (_, until) in self._verified.items() if until <= now]
+        for token in expired:
+            del self._verified[token]
+        # Still full: drop the oldest tenth rather than evicting on every put
+        if len(self._verified) >= self.max_size:
+            for token in list(self._verified)[:max(self.max_size // 10, 1)]:
+                del self._verified[token]
+
+    def revoke(self, token: str, claims: dict) -> None:
+        key, expires = revocation_key(token, claims), float(claims.get("exp", time.time()))
+        with self._lock:
+            self._verified.pop(token, None)
+        self.deny(key, expires)
+        cluster.broadcast(CHANNEL, {"key": key, "expires": expires})
+
+    def deny(self, key: str, expires: float) -> None:
+        """Add a revocation key to the deny-list until ``expires``."""
+        self.deny_all([(key, expires)])
+
+    def deny_all(self, revoked: Iterable[Tuple[str, float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._revoked = {key: exp for key, exp in self._revoked.items() if exp > now}
+            self._revoked.update((key, exp) for key, exp in revoked if exp > now)
+
+    def revoked(self) -> List[Tuple[str, float]]:
+        """Unexpired revocations: (key, expiry) pairs."""
+        now = time.time()
+        with self._lock:
+            return [(key, exp) for key, exp in self._revoked.items() if exp > now]
+
+    def resync(self) -> None:
+        """Send this worker's deny-list and ask the others for theirs."""
+        cluster.broadcast(CHANNEL, {"revoked": self.revoked(), "resync": True})
+
+    def apply(self, payload: dict) -> None:
+        """Apply revocations another worker broadcast."""
+        if "key" in payload:
+            self.deny(payload["key"], payload["expires"])
+        else:
+            self.deny_all(payload["revoked"])
+        if payload.get("resync"):
+            # The sender missed our revocations too
+            cluster.broadcast(CHANNEL, {"revoked": self.revoked()})
+
+    def is_revoked(self, token: str, claims: dict) -> bool:
+        return revocation_key(token, claims) in self._revoked
+
+    def clear(self) -> None:
+        with self._lock:
+            self._verified.clear()
+            self._revoked.clear()
+
+
+token_cache = VerifiedTokenCache()
+cluster.on(CHANNEL, token_cache.apply)
+cluster.on_resync(token_cache.resync)
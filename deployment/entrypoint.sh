@@ -50,7 +50,7 @@ echo "✅ Database is ready!"
 # Run migrations
 echo "📊 Running database migrations..."
 cd /app/backend
-uv run python -c "from database import Base, engine; Base.metadata.create_all(bind=engine)"
+uv run python migrations.py
 
 # Seed database (only if empty)
 echo "🌱 Seeding database..."
@@ -58,5 +58,23 @@ uv run python seed.py || echo "Database already seeded"
 
 echo "✅ Setup complete!"
 
-# Start supervisord (nginx + uvicorn)
+# API worker processes, and the pub/sub bus they share live state through:
+# the local broker by default, or a Redis server to scale across containers
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-1}
+export PUBSUB_URL=${PUBSUB_URL:-unix:///tmp/snake-showdown-pubsub.sock}
+echo "⚙️  Starting $WEB_CONCURRENCY API worker(s)"
+
+# Each worker opens a sync and an async connection pool, so split one budget
+# of database connections between them rather than giving every pool the
+# single-worker defaults (kept under PostgreSQL's max_connections of 100)
+export DB_MAX_CONNECTIONS=${DB_MAX_CONNECTIONS:-60}
+PER_POOL=$(( DB_MAX_CONNECTIONS / (2 * WEB_CONCURRENCY) ))
+if [ "$PER_POOL" -lt 2 ]; then
+    PER_POOL=2
+fi
+export DB_POOL_SIZE=${DB_POOL_SIZE:-$(( (PER_POOL + 2) / 3 ))}
+export DB_MAX_OVERFLOW=${DB_MAX_OVERFLOW:-$(( PER_POOL - DB_POOL_SIZE ))}
+echo "🔌 Database pools per worker: $DB_POOL_SIZE + $DB_MAX_OVERFLOW overflow (x2)"
+
+# Start supervisord (nginx + pub/sub broker + uvicorn)
 exec /usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf
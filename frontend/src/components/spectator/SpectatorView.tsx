@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
@@ -6,7 +6,7 @@ import { GameCanvas } from '@/components/game/GameCanvas';
 import { LivePlayer, GameState } from '@/types/game';
 import { Eye, X, Radio } from 'lucide-react';
 import { cn } from '@/lib/utils';
-import { simulatePlayerMove } from '@/lib/simulation';
+import { livePlayersApi } from '@/services/api';
 
 interface SpectatorViewProps {
   player: LivePlayer;
@@ -16,21 +16,13 @@ interface SpectatorViewProps {
 
 export function SpectatorView({ player, onClose, className }: SpectatorViewProps) {
   const [currentPlayer, setCurrentPlayer] = useState<LivePlayer>(player);
-  const intervalRef = useRef<number | null>(null);
+  const [ended, setEnded] = useState(false);
 
   useEffect(() => {
-    // Simulate the player's game locally
-    const simulateGame = () => {
-      setCurrentPlayer(prev => simulatePlayerMove(prev));
-    };
-
-    intervalRef.current = window.setInterval(simulateGame, 150);
-
-    return () => {
-      if (intervalRef.current) {
-        clearInterval(intervalRef.current);
-      }
-    };
+    // Follow the real game as the server receives it
+    setCurrentPlayer(player);
+    setEnded(false);
+    return livePlayersApi.streamPlayer(player.id, setCurrentPlayer, () => setEnded(true));
   }, [player.id]);
 
   const gameState: GameState = {
@@ -51,8 +43,8 @@ export function SpectatorView({ player, onClose, className }: SpectatorViewProps
             <Eye className="w-5 h-5 text-primary" />
             Watching: {currentPlayer.username}
             <Badge variant="outline" className="ml-2">
-              <Radio className="w-3 h-3 mr-1 text-destructive animate-pulse" />
-              LIVE
+              <Radio className={cn("w-3 h-3 mr-1", ended ? "text-muted-foreground" : "text-destructive animate-pulse")} />
+              {ended ? 'ENDED' : 'LIVE'}
             </Badge>
           </CardTitle>
           <Button variant="ghost" size="icon" onClick={onClose}>
@@ -174,6 +174,23 @@ export const livePlayersApi = {
       console.error('Failed to remove player:', error);
     }
   },
+
+  // Server-sent events for one game: its state on connect, then every change
+  streamPlayer(
+    playerId: string,
+    onUpdate: (player: LivePlayer) => void,
+    onRemoved: () => void
+  ): () => void {
+    const source = new EventSource(`${API_URL}/live-players/${encodeURIComponent(playerId)}/stream`);
+    source.addEventListener('player', (event) => {
+      onUpdate(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('removed', () => {
+      source.close();
+      onRemoved();
+    });
+    return () => source.close();
+  },
 };
 
 // Game API (for future multiplayer)